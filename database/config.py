@@ -1,22 +1,56 @@
 import os
-from typing import Annotated
+from contextlib import asynccontextmanager
+from typing import Annotated, AsyncIterator
 from fastapi import Depends
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
 from sqlalchemy.orm import declarative_base
 from dotenv import load_dotenv
-from redis import Redis
+from redis.asyncio import Redis, BlockingConnectionPool
+from redis.asyncio.client import Pipeline
+from redis.exceptions import RedisError
+from database.pool import InstrumentedQueuePool
+from utils.logger import get_logger
 
 load_dotenv()
+
+logger = get_logger("database")
+
 DB_URL = os.getenv("DEV_DB_URL")
+DB_REPLICA_URL = os.getenv("DEV_DB_REPLICA_URL")
 DEV_REDIS_HOST = os.getenv("DEV_REDIS_HOST")
 DEV_REDIS_PORT = os.getenv("DEV_REDIS_PORT")
 DEV_REDIS_DB = os.getenv("DEV_REDIS_DB")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+DB_READ_STICKY_SECONDS = int(os.getenv("DB_READ_STICKY_SECONDS", "5"))
+RECENT_WRITE_KEY_PREFIX = "recent-write:"
 
 Base = declarative_base()
 
-engine = create_async_engine(url=DB_URL)
+def _create_engine(url: str) -> AsyncEngine:
+    return create_async_engine(url=url,
+                               poolclass= InstrumentedQueuePool,
+                               pool_size= DB_POOL_SIZE,
+                               max_overflow= DB_MAX_OVERFLOW,
+                               pool_timeout= DB_POOL_TIMEOUT,
+                               pool_recycle= DB_POOL_RECYCLE,
+                               pool_pre_ping= DB_POOL_PRE_PING,
+                               #asyncpg prepared statement cache per connection, 0 disables it (needed behind pgbouncer)
+                               connect_args= {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE})
+
+engine = _create_engine(DB_URL)
+#without a replica url, reads simply go to the primary
+replica_engine = _create_engine(DB_REPLICA_URL) if DB_REPLICA_URL else engine
 
 Session = async_sessionmaker(engine, expire_on_commit= False)
+ReadSession = async_sessionmaker(replica_engine, expire_on_commit= False)
 
 async def get_db():
     async with Session() as session:
@@ -27,9 +61,56 @@ async def get_db():
 
 db_dependency = Annotated[AsyncSession, Depends(get_db)]
 
-redis_client = Redis(host= DEV_REDIS_HOST, port= DEV_REDIS_PORT, db= DEV_REDIS_DB)
+#callers beyond max_connections wait up to REDIS_POOL_TIMEOUT for a free connection instead of failing
+redis_pool = BlockingConnectionPool(host= DEV_REDIS_HOST,
+                                    port= int(DEV_REDIS_PORT or 6379),
+                                    db= int(DEV_REDIS_DB or 0),
+                                    max_connections= REDIS_MAX_CONNECTIONS,
+                                    timeout= REDIS_POOL_TIMEOUT,
+                                    socket_timeout= REDIS_SOCKET_TIMEOUT,
+                                    socket_connect_timeout= REDIS_SOCKET_TIMEOUT,
+                                    health_check_interval= 30)
+redis_client = Redis(connection_pool= redis_pool)
 
 async def get_redis():
     yield redis_client
 
-redis_dependency = Annotated[Redis, Depends(get_redis)]
\ No newline at end of file
+redis_dependency = Annotated[Redis, Depends(get_redis)]
+
+@asynccontextmanager
+async def redis_pipeline(transaction: bool = False) -> AsyncIterator[Pipeline]:
+    #queue commands on the yielded pipeline and `await pipe.execute()` to send them in one round trip
+    async with redis_client.pipeline(transaction= transaction) as pipe:
+        yield pipe
+
+async def init_redis() -> None:
+    try:
+        await redis_client.ping()
+        logger.info("redis connected")
+    except RedisError as e:
+        #redis backed features fall back or fail per call, the app can still start
+        logger.error(f"Redis Error: {e.__class__.__name__}: {e}")
+
+async def close_redis() -> None:
+    await redis_client.aclose()
+    await redis_pool.aclose()
+    logger.info("redis connections closed")
+
+async def mark_recent_write(user_id: str) -> None:
+    #reads by this user go to the primary for a short while so they see their own writes despite replica lag
+    if replica_engine is engine:
+        return
+    try:
+        await redis_client.set(RECENT_WRITE_KEY_PREFIX + user_id, 1, ex= DB_READ_STICKY_SECONDS)
+    except RedisError as e:
+        logger.error(f"Redis Error: {e.__class__.__name__}: {e}")
+
+async def has_recent_write(user_id: str) -> bool:
+    if replica_engine is engine:
+        return False
+    try:
+        return bool(await redis_client.exists(RECENT_WRITE_KEY_PREFIX + user_id))
+    except RedisError as e:
+        #when in doubt read from the primary
+        logger.error(f"Redis Error: {e.__class__.__name__}: {e}")
+        return True
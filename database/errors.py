@@ -0,0 +1,17 @@
+from typing import Optional
+from sqlalchemy.exc import DBAPIError
+
+#postgres sqlstate codes the app maps to http errors
+UNIQUE_VIOLATION = "23505"
+EXCLUSION_VIOLATION = "23P01"
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+def get_sqlstate(e: Exception) -> Optional[str]:
+    #sqlalchemy wraps the driver error, asyncpg exposes the code as `sqlstate` on the wrapped one
+    if isinstance(e, DBAPIError):
+        return getattr(e.orig, "sqlstate", None)
+    return None
+
+def is_booking_overlap(e: Exception) -> bool:
+    return get_sqlstate(e) == EXCLUSION_VIOLATION
@@ -1,6 +1,8 @@
 import uuid
 from datetime import datetime, timezone
-from sqlalchemy import Column, INTEGER, UUID, VARCHAR, ForeignKey, Enum, DateTime, DECIMAL, CheckConstraint, Text
+from sqlalchemy import Column, INTEGER, UUID, VARCHAR, ForeignKey, Enum, DateTime, DECIMAL, CheckConstraint, Text, Index, Computed, func, text
+from sqlalchemy.dialects.postgresql import ExcludeConstraint, TSVECTOR
+from sqlalchemy.orm import deferred
 from database.config import Base
 from shared import RoleEnum, IsActiveEnum, StatusEnum
 
@@ -26,6 +28,25 @@ class Services(Base):
     duration_mins = Column(INTEGER(), nullable= False)
     is_active = Column(Enum(IsActiveEnum, name = "is_active_enum", create_type = True), nullable= False, default= IsActiveEnum.TRUE)
     created_at = Column(DateTime(timezone= True), nullable= False, default= lambda: datetime.now(tz= timezone.utc))
+    #review aggregates, kept in step by the review endpoints (src/reviews/ratings.py)
+    rating_count = Column(INTEGER(), nullable= False, default= 0, server_default= "0")
+    rating_sum = Column(INTEGER(), nullable= False, default= 0, server_default= "0")
+    rating_1 = Column(INTEGER(), nullable= False, default= 0, server_default= "0")
+    rating_2 = Column(INTEGER(), nullable= False, default= 0, server_default= "0")
+    rating_3 = Column(INTEGER(), nullable= False, default= 0, server_default= "0")
+    rating_4 = Column(INTEGER(), nullable= False, default= 0, server_default= "0")
+    rating_5 = Column(INTEGER(), nullable= False, default= 0, server_default= "0")
+    #maintained by postgres for GET /services/search, title matches weigh more than description ones.
+    #deferred so regular service reads do not load it
+    search_vector = deferred(Column(TSVECTOR(), Computed("setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+                                                         "setweight(to_tsvector('english', coalesce(description, '')), 'B')", persisted= True)))
+
+    #trigram indexes for GET /services?q= (needs pg_trgm)
+    __table_args__ = (
+        Index("ix_services_title_trgm", title, postgresql_using= "gin", postgresql_ops= {"title": "gin_trgm_ops"}),
+        Index("ix_services_description_trgm", description, postgresql_using= "gin", postgresql_ops= {"description": "gin_trgm_ops"}),
+        Index("ix_services_search_vector", "search_vector", postgresql_using= "gin"),
+    )
 
 class Bookings(Base):
     __tablename__ = "bookings"
@@ -38,15 +59,34 @@ class Bookings(Base):
     status = Column(Enum(StatusEnum, name = "status_enum", create_type = True), nullable= False, default= StatusEnum.CONFIRMED)
     created_at = Column(DateTime(timezone= True), nullable= False, default= lambda: datetime.now(tz= timezone.utc))
 
+    #no two non-cancelled bookings of a service may overlap in time, enforced by postgres (needs btree_gist)
+    __table_args__ = (
+        ExcludeConstraint((service_id, "="), (func.tstzrange(start_time, end_time), "&&"),
+                          name= "bookings_no_overlap",
+                          using= "gist",
+                          where= text("status <> 'CANCELLED'")),
+        #only bookings still waiting for a terminal status, scanned by the expiry job
+        Index("ix_bookings_active_end_time", end_time, postgresql_where= text("status IN ('PENDING', 'CONFIRMED')")),
+        #keyset pagination of GET /bookings, per user and across all bookings
+        Index("ix_bookings_user_id_created_at_id", user_id, created_at, id),
+        Index("ix_bookings_created_at_id", created_at, id),
+    )
+
 class Reviews(Base):
     __tablename__ = "reviews"
 
     id = Column(UUID(as_uuid= True), primary_key= True, default= lambda: uuid.uuid4())
     booking_id = Column(UUID(as_uuid= True), ForeignKey("bookings.id", onupdate= "CASCADE", ondelete= "CASCADE"), index= True)
+    #copied from the booking (which never changes service) so a service's reviews are one index range
+    service_id = Column(UUID(as_uuid= True), ForeignKey("services.id", onupdate= "CASCADE", ondelete= "CASCADE"), nullable= False)
     rating = Column(INTEGER(), nullable= False)
     comment = Column(VARCHAR(250))
     created_at = Column(DateTime(timezone= True), nullable= False, default= lambda: datetime.now(tz= timezone.utc))
 
+    __table_args__ = (
+        #keyset pagination of GET /services/{id}/reviews in index order, rating included for the min_rating filter
+        Index("ix_reviews_service_id_created_at_id", service_id, created_at.desc(), id.desc(), postgresql_include= ["rating"]),
+    )
 
     __table_agrs__ = (
         CheckConstraint('rating > 1 AND rating < 6', name= "rating_between_1_to_5")
@@ -56,3 +96,4 @@ class Blacklists(Base):
     __tablename__ = "blacklists"
 
     token = Column(VARCHAR(250), primary_key= True, nullable= False, unique= True)
+    expires_at = Column(DateTime(timezone= True), nullable= False, index= True)
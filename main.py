@@ -1,16 +1,62 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from routes.auth.auth import auth_router
 from routes.services.services import service_router
 from routes.bookings.bookings import bookings_router
 from routes.reviews.reviews import reviews_router
+from routes.admin.admin import admin_router
+from utils.password import password_manager
+from utils.blacklist import token_blacklist, BLACKLIST_PURGE_INTERVAL_SECONDS, BLACKLIST_FILTER_ENABLED, BLACKLIST_FILTER_REBUILD_SECONDS, BLACKLIST_FILTER_SYNC_SECONDS, BLACKLIST_RESTORE_INTERVAL_SECONDS
+from utils.tasks import start_periodic, stop_periodic
+from utils.idempotency import idempotency_store
+from src.bookings.expiry import expire_bookings, BOOKING_EXPIRY_INTERVAL_SECONDS
+from src.admin.analytics import refresh_booking_stats, ANALYTICS_REFRESH_SECONDS
+from database.config import mark_recent_write, init_redis, close_redis
 
-app = FastAPI(title="BookIt", description= "A production-ready simple bookings API", version="0.0.1")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_redis()
+    tasks = []
+    if BLACKLIST_PURGE_INTERVAL_SECONDS > 0:
+        tasks.append(start_periodic("blacklist purge", BLACKLIST_PURGE_INTERVAL_SECONDS, token_blacklist.purge_expired))
+    if BLACKLIST_RESTORE_INTERVAL_SECONDS > 0:
+        tasks.append(start_periodic("blacklist restore", BLACKLIST_RESTORE_INTERVAL_SECONDS, token_blacklist.restore_pg_revocations))
+    if BLACKLIST_FILTER_ENABLED:
+        await token_blacklist.rebuild_filter()
+        tasks.append(start_periodic("blacklist filter sync", BLACKLIST_FILTER_SYNC_SECONDS, token_blacklist.sync_filter))
+        tasks.append(start_periodic("blacklist filter rebuild", BLACKLIST_FILTER_REBUILD_SECONDS, token_blacklist.rebuild_filter))
+    if BOOKING_EXPIRY_INTERVAL_SECONDS > 0:
+        #set it to 0 when the expiry runs as a separate worker (python -m src.bookings.expiry)
+        tasks.append(start_periodic("booking expiry", BOOKING_EXPIRY_INTERVAL_SECONDS, expire_bookings))
+    if ANALYTICS_REFRESH_SECONDS > 0:
+        tasks.append(start_periodic("booking stats refresh", ANALYTICS_REFRESH_SECONDS, refresh_booking_stats))
+    yield
+    await stop_periodic(tasks)
+    password_manager.shutdown()
+    await close_redis()
+
+app = FastAPI(title="BookIt", description= "A production-ready simple bookings API", version="0.0.1", lifespan= lifespan)
+
+
+@app.middleware("http")
+async def track_recent_writes(request: Request, call_next):
+    response = await call_next(request)
+    #get_auth_context stores the caller on request.state for authenticated routes
+    auth = getattr(request.state, "auth", None)
+    if auth is not None and request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        await mark_recent_write(auth.sub)
+    return response
+
+#registered last so it is the outermost middleware, replays skip everything below it
+app.middleware("http")(idempotency_store.middleware)
 
 
 app.include_router(auth_router)
 app.include_router(service_router)
 app.include_router(bookings_router)
 app.include_router(reviews_router)
+app.include_router(admin_router)
 
 
 @app.get("/", status_code= 200)
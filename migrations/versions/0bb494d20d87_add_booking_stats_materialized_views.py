@@ -0,0 +1,48 @@
+"""add booking stats materialized views
+
+Revision ID: 0bb494d20d87
+Revises: 16020b714ebe
+Create Date: 2026-10-17 12:02:45.118734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0bb494d20d87'
+down_revision: Union[str, Sequence[str], None] = '16020b714ebe'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+#one row per service and utc hour/day a booking starts in
+VIEW_QUERY = """
+SELECT date_trunc('{granularity}', b.start_time, 'UTC') AS bucket,
+       b.service_id AS service_id,
+       count(*) AS bookings,
+       count(*) FILTER (WHERE b.status = 'PENDING') AS pending,
+       count(*) FILTER (WHERE b.status = 'CONFIRMED') AS confirmed,
+       count(*) FILTER (WHERE b.status = 'CANCELLED') AS cancelled,
+       count(*) FILTER (WHERE b.status = 'COMPLETED') AS completed,
+       coalesce(sum(extract(epoch FROM b.end_time - b.start_time) / 60) FILTER (WHERE b.status <> 'CANCELLED'), 0)::bigint AS booked_minutes,
+       coalesce(sum(s.price) FILTER (WHERE b.status <> 'CANCELLED'), 0)::numeric(14, 2) AS revenue
+FROM bookings b
+JOIN services s ON s.id = b.service_id
+GROUP BY 1, 2
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, granularity in (('booking_stats_hourly', 'hour'), ('booking_stats_daily', 'day')):
+        op.execute(f"CREATE MATERIALIZED VIEW {name} AS {VIEW_QUERY.format(granularity=granularity)}")
+        #REFRESH ... CONCURRENTLY needs a unique index
+        op.execute(f"CREATE UNIQUE INDEX ux_{name}_bucket_service_id ON {name} (bucket, service_id)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS booking_stats_daily")
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS booking_stats_hourly")
@@ -0,0 +1,30 @@
+"""add bookings pagination indexes
+
+Revision ID: 16020b714ebe
+Revises: c5dc95f0644c
+Create Date: 2026-10-17 11:08:13.472960
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '16020b714ebe'
+down_revision: Union[str, Sequence[str], None] = 'c5dc95f0644c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_bookings_user_id_created_at_id', 'bookings', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_bookings_created_at_id', 'bookings', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_bookings_created_at_id', table_name='bookings')
+    op.drop_index('ix_bookings_user_id_created_at_id', table_name='bookings')
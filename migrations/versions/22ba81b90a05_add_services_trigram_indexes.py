@@ -0,0 +1,33 @@
+"""add services trigram indexes
+
+Revision ID: 22ba81b90a05
+Revises: 0bb494d20d87
+Create Date: 2026-10-17 12:37:09.650281
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '22ba81b90a05'
+down_revision: Union[str, Sequence[str], None] = '0bb494d20d87'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index('ix_services_title_trgm', 'services', ['title'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'})
+    op.create_index('ix_services_description_trgm', 'services', ['description'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'description': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_services_description_trgm', table_name='services')
+    op.drop_index('ix_services_title_trgm', table_name='services')
@@ -0,0 +1,35 @@
+"""add reviews service_id
+
+Revision ID: 6263e04b518d
+Revises: dcf4cb1f61f8
+Create Date: 2026-10-17 14:02:37.915408
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6263e04b518d'
+down_revision: Union[str, Sequence[str], None] = 'dcf4cb1f61f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('reviews', sa.Column('service_id', sa.UUID(), nullable=True))
+    #backfill from the reviewed booking in one statement
+    op.execute("UPDATE reviews SET service_id = bookings.service_id FROM bookings WHERE bookings.id = reviews.booking_id")
+    op.alter_column('reviews', 'service_id', existing_type=sa.UUID(), nullable=False)
+    op.create_foreign_key('reviews_service_id_fkey', 'reviews', 'services', ['service_id'], ['id'], onupdate='CASCADE', ondelete='CASCADE')
+    op.create_index('ix_reviews_service_id_created_at_id', 'reviews', ['service_id', sa.text('created_at DESC'), sa.text('id DESC')], unique=False, postgresql_include=['rating'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_reviews_service_id_created_at_id', table_name='reviews')
+    op.drop_constraint('reviews_service_id_fkey', 'reviews', type_='foreignkey')
+    op.drop_column('reviews', 'service_id')
@@ -0,0 +1,63 @@
+"""add blacklists.expires_at
+
+Revision ID: ad2c8ce96887
+Revises: ae952417e87e
+Create Date: 2026-10-17 09:12:04.512390
+
+"""
+from typing import Sequence, Union
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+from jose import jwt
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ad2c8ce96887'
+down_revision: Union[str, Sequence[str], None] = 'ae952417e87e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('blacklists', sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True))
+
+    #backfill from the exp claim of the stored tokens, rows that cannot be decoded expire now.
+    #the claim lives inside the jwt so it is decoded here, the rows are walked in primary key
+    #order and written back with one executemany per batch
+    conn = op.get_bind()
+    blacklists = sa.table('blacklists', sa.column('token', sa.VARCHAR(length=250)), sa.column('expires_at', sa.DateTime(timezone=True)))
+    backfill = (blacklists.update()
+                .where(blacklists.c.token == sa.bindparam('b_token'))
+                .values(expires_at=sa.bindparam('b_expires_at')))
+    now = datetime.now(tz=timezone.utc)
+    last_token = None
+    while True:
+        stmt = sa.select(blacklists.c.token).order_by(blacklists.c.token).limit(BACKFILL_BATCH_SIZE)
+        if last_token is not None:
+            stmt = stmt.where(blacklists.c.token > last_token)
+        tokens = conn.execute(stmt).scalars().all()
+        if not tokens:
+            break
+        rows = []
+        for token in tokens:
+            try:
+                expires_at = datetime.fromtimestamp(int(jwt.get_unverified_claims(token)["exp"]), tz=timezone.utc)
+            except Exception:
+                expires_at = now
+            rows.append({'b_token': token, 'b_expires_at': expires_at})
+        conn.execute(backfill, rows)
+        last_token = tokens[-1]
+
+    op.alter_column('blacklists', 'expires_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+    op.create_index(op.f('ix_blacklists_expires_at'), 'blacklists', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_blacklists_expires_at'), table_name='blacklists')
+    op.drop_column('blacklists', 'expires_at')
@@ -0,0 +1,45 @@
+"""add bookings no overlap exclusion constraint
+
+Revision ID: c18a25640f5c
+Revises: ad2c8ce96887
+Create Date: 2026-10-17 10:04:51.338207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c18a25640f5c'
+down_revision: Union[str, Sequence[str], None] = 'ad2c8ce96887'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    #btree_gist lets the uuid equality and the range overlap share one gist index
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+
+    conn = op.get_bind()
+    overlaps = conn.execute(sa.text(
+        "SELECT count(*) FROM bookings a JOIN bookings b "
+        "ON a.service_id = b.service_id AND a.id < b.id "
+        "AND tstzrange(a.start_time, a.end_time) && tstzrange(b.start_time, b.end_time) "
+        "WHERE a.status <> 'CANCELLED' AND b.status <> 'CANCELLED'"
+    )).scalar()
+    if overlaps:
+        raise RuntimeError(f"{overlaps} pairs of overlapping non-cancelled bookings exist, cancel or reschedule them before upgrading")
+
+    op.execute(
+        "ALTER TABLE bookings ADD CONSTRAINT bookings_no_overlap "
+        "EXCLUDE USING gist (service_id WITH =, tstzrange(start_time, end_time) WITH &&) "
+        "WHERE (status <> 'CANCELLED')"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE bookings DROP CONSTRAINT bookings_no_overlap")
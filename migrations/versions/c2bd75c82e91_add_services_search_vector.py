@@ -0,0 +1,34 @@
+"""add services search_vector
+
+Revision ID: c2bd75c82e91
+Revises: 22ba81b90a05
+Create Date: 2026-10-17 13:05:52.287413
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2bd75c82e91'
+down_revision: Union[str, Sequence[str], None] = '22ba81b90a05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('services', sa.Column('search_vector', postgresql.TSVECTOR(),
+                                        sa.Computed("setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+                                                    "setweight(to_tsvector('english', coalesce(description, '')), 'B')", persisted=True),
+                                        nullable=True))
+    op.create_index('ix_services_search_vector', 'services', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_services_search_vector', table_name='services')
+    op.drop_column('services', 'search_vector')
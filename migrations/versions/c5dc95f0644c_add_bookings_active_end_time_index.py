@@ -0,0 +1,29 @@
+"""add bookings active end_time index
+
+Revision ID: c5dc95f0644c
+Revises: c18a25640f5c
+Create Date: 2026-10-17 10:41:27.904615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5dc95f0644c'
+down_revision: Union[str, Sequence[str], None] = 'c18a25640f5c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_bookings_active_end_time', 'bookings', ['end_time'], unique=False,
+                    postgresql_where=sa.text("status IN ('PENDING', 'CONFIRMED')"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_bookings_active_end_time', table_name='bookings')
@@ -0,0 +1,57 @@
+"""add services rating aggregates
+
+Revision ID: dcf4cb1f61f8
+Revises: c2bd75c82e91
+Create Date: 2026-10-17 13:41:08.604219
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'dcf4cb1f61f8'
+down_revision: Union[str, Sequence[str], None] = 'c2bd75c82e91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+RATING_COLUMNS = ['rating_count', 'rating_sum', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for column in RATING_COLUMNS:
+        op.add_column('services', sa.Column(column, sa.INTEGER(), server_default='0', nullable=False))
+    #backfill from the existing reviews, services without reviews keep the zero defaults
+    op.execute("""
+        UPDATE services
+        SET rating_count = agg.rating_count,
+            rating_sum = agg.rating_sum,
+            rating_1 = agg.rating_1,
+            rating_2 = agg.rating_2,
+            rating_3 = agg.rating_3,
+            rating_4 = agg.rating_4,
+            rating_5 = agg.rating_5
+        FROM (
+            SELECT b.service_id,
+                   count(*) AS rating_count,
+                   sum(r.rating) AS rating_sum,
+                   count(*) FILTER (WHERE r.rating = 1) AS rating_1,
+                   count(*) FILTER (WHERE r.rating = 2) AS rating_2,
+                   count(*) FILTER (WHERE r.rating = 3) AS rating_3,
+                   count(*) FILTER (WHERE r.rating = 4) AS rating_4,
+                   count(*) FILTER (WHERE r.rating = 5) AS rating_5
+            FROM reviews r
+            JOIN bookings b ON b.id = r.booking_id
+            GROUP BY b.service_id
+        ) AS agg
+        WHERE services.id = agg.service_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for column in reversed(RATING_COLUMNS):
+        op.drop_column('services', column)
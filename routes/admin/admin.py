@@ -0,0 +1,36 @@
+from fastapi import APIRouter, status, Query
+from typing import Optional
+from datetime import datetime
+from uuid import UUID
+from utils.manager import auth_dependency, db_read_dependency
+from src.admin.analytics import get_booking_analytics
+from shared import AnalyticsGranularity
+from src.admin.diagnostics import get_token_cache_stats, get_blacklist_filter_stats, get_db_pool_stats, get_booking_lock_stats
+
+admin_router = APIRouter(prefix="/admin", tags= ["admin"])
+
+
+@admin_router.get("/diagnostics/token-cache", status_code= status.HTTP_200_OK)
+async def get_token_cache_stats_router(auth: auth_dependency):
+    return await get_token_cache_stats(auth= auth)
+
+@admin_router.get("/diagnostics/blacklist-filter", status_code= status.HTTP_200_OK)
+async def get_blacklist_filter_stats_router(auth: auth_dependency):
+    return await get_blacklist_filter_stats(auth= auth)
+
+@admin_router.get("/diagnostics/db-pool", status_code= status.HTTP_200_OK)
+async def get_db_pool_stats_router(auth: auth_dependency):
+    return await get_db_pool_stats(auth= auth)
+
+@admin_router.get("/diagnostics/booking-locks", status_code= status.HTTP_200_OK)
+async def get_booking_lock_stats_router(auth: auth_dependency):
+    return await get_booking_lock_stats(auth= auth)
+
+@admin_router.get("/analytics", status_code= status.HTTP_200_OK)
+async def get_booking_analytics_router(db: db_read_dependency,
+                                       auth: auth_dependency,
+                                       granularity: AnalyticsGranularity = Query(AnalyticsGranularity.DAY),
+                                       window_start: Optional[datetime] = Query(None, alias= "from"),
+                                       window_end: Optional[datetime] = Query(None, alias= "to"),
+                                       service_id: Optional[UUID] = Query(None)):
+    return await get_booking_analytics(db= db, auth= auth, granularity= granularity, window_start= window_start, window_end= window_end, service_id= service_id)
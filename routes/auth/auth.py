@@ -2,7 +2,8 @@ from fastapi import APIRouter, status
 from database.config import db_dependency
 from schemas.auth.auth import SignUp, SignUpResponseModel, GetAccountResponse, UpdateAccount, UpdateAccountResponse, SignIn, SignInResponseModel, RefreshToken
 from src.auth.auth import create_account, get_account_details, update_account, delete_account, sign_in, sign_out, refresh_access
-from utils.manager import token_dependency, jwt_manager
+from utils.manager import auth_dependency, db_read_dependency
+from src.services.services import invalidate_service_cache
 
 auth_router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -14,19 +15,23 @@ async def sign_up(db: db_dependency, user_details: SignUp):
     return result
 
 @auth_router.get("/me",response_model= GetAccountResponse)
-async def my_account(db: db_dependency, token: token_dependency):
-    return await get_account_details(db= db, token= token)
+async def my_account(db: db_read_dependency, auth: auth_dependency):
+    return await get_account_details(db= db, auth= auth)
 
 @auth_router.patch("/me", response_model= UpdateAccountResponse)
-async def update_account_route(db: db_dependency, token: token_dependency, user_details: UpdateAccount):
-    result = await update_account(db=db, token=token, user_details=user_details)
+async def update_account_route(db: db_dependency, auth: auth_dependency, user_details: UpdateAccount):
+    result = await update_account(db=db, auth=auth, user_details=user_details)
     await db.commit()
     return result
 
 @auth_router.post("/me/delete")
-async def delete_account_route(db: db_dependency, token: token_dependency):
-    result = await delete_account(db= db, token= token)
+async def delete_account_route(db: db_dependency, auth: auth_dependency):
+    result = await delete_account(db= db, auth= auth)
     await db.commit()
+    #the account's reviews went with it, their services' rating aggregates changed
+    service_ids = result.pop("service_ids")
+    if service_ids:
+        await invalidate_service_cache(*service_ids, availability= False)
     return result
 
 @auth_router.post("/login", response_model= SignInResponseModel)
@@ -34,8 +39,8 @@ async def sign_in_route(db: db_dependency, user_details: SignIn):
     return await sign_in(db=db, details= user_details)
 
 @auth_router.post("/logout")
-async def sign_out_route(db: db_dependency, token: token_dependency, refresh: RefreshToken):
-    result = await sign_out(db= db, access_token= token, refresh_token=refresh)
+async def sign_out_route(db: db_dependency, auth: auth_dependency, refresh: RefreshToken):
+    result = await sign_out(db= db, auth= auth, refresh_token=refresh)
     await db.commit()
     return result
 
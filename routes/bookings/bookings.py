@@ -1,39 +1,83 @@
-from fastapi import APIRouter, status, Query
+from fastapi import APIRouter, status, Query, Body
+from fastapi.responses import StreamingResponse
 from datetime import datetime
-from typing import List
-from utils.manager import db_dependency, token_dependency
-from src.bookings.bookings import create_booking, get_bookings, get_bookings_by_id, update_booking, delete_booking
-from schemas.bookings.bookings import CreateBooking, CreateBookingResponseModel, GetBookingResponseModel, UpdateBooking
-from shared import StatusEnum
+from typing import Optional, List
+from utils.manager import db_dependency, db_read_dependency, auth_dependency
+from src.bookings.bookings import create_booking, create_bookings_bulk, hold_booking, get_bookings, get_bookings_by_id, update_booking, delete_booking, BOOKINGS_PAGE_SIZE, BOOKINGS_PAGE_MAX, BOOKINGS_BULK_MAX
+from schemas.bookings.bookings import CreateBooking, CreateBookingResponseModel, BulkCreateBookingResponseModel, HoldBooking, HoldBookingResponseModel, GetBookingResponseModel, GetBookingsPageResponseModel, UpdateBooking
+from src.bookings.export import export_bookings, EXPORT_MEDIA_TYPES
+from src.bookings.holds import slot_holds
+from src.services.services import invalidate_service_cache, invalidate_availability_cache
+from shared import StatusEnum, ExportFormat
 
 bookings_router = APIRouter(prefix="/bookings", tags= ["bookings"])
 
 @bookings_router.post("", status_code= status.HTTP_201_CREATED, response_model= CreateBookingResponseModel)
-async def create_booking_router(db: db_dependency, token: token_dependency, details: CreateBooking):
-    result = await create_booking(db= db, token= token, booking_details= details)
+async def create_booking_router(db: db_dependency, auth: auth_dependency, details: CreateBooking):
+    result = await create_booking(db= db, auth= auth, booking_details= details)
     await db.commit()
+    hold_id = result.pop("hold_id")
+    if hold_id is not None:
+        await slot_holds.release(result["service_id"], hold_id)
+    await invalidate_availability_cache(result["service_id"])
     return result
 
+@bookings_router.post("/hold", status_code= status.HTTP_201_CREATED, response_model= HoldBookingResponseModel)
+async def hold_booking_router(db: db_dependency, auth: auth_dependency, details: HoldBooking):
+    return await hold_booking(db= db, auth= auth, details= details)
+
+@bookings_router.post("/bulk", status_code= status.HTTP_200_OK, response_model= BulkCreateBookingResponseModel)
+async def create_bookings_bulk_router(db: db_dependency, auth: auth_dependency, details: List[CreateBooking] = Body(..., min_length= 1, max_length= BOOKINGS_BULK_MAX)):
+    result = await create_bookings_bulk(db= db, auth= auth, bookings_details= details)
+    await db.commit()
+    service_ids = {booking["service_id"] for booking in result["created"]}
+    if service_ids:
+        await invalidate_availability_cache(*service_ids)
+    return result
+
+#declared before /{id} so "export" is not taken for a booking id
+@bookings_router.get("/export", status_code= status.HTTP_200_OK)
+async def export_bookings_router(auth: auth_dependency,
+                                 format: ExportFormat = Query(ExportFormat.NDJSON),
+                                 bookings_status: StatusEnum = Query(None),
+                                 bookings_from: datetime = Query(None),
+                                 bookings_to: datetime = Query(None)):
+    rows = await export_bookings(auth= auth, export_format= format, bookings_status= bookings_status, bookings_from= bookings_from, bookings_to= bookings_to)
+    return StreamingResponse(rows,
+                             media_type= EXPORT_MEDIA_TYPES[format],
+                             headers= {"Content-Disposition": f"attachment; filename=bookings.{format.value}"})
+
 @bookings_router.get("/{id}", status_code= status.HTTP_200_OK, response_model=GetBookingResponseModel)
-async def get_bookings_by_id_router(db: db_dependency, token: token_dependency, id: str):
-    return await get_bookings_by_id(db= db, token= token, id= id)
+async def get_bookings_by_id_router(db: db_read_dependency, auth: auth_dependency, id: str):
+    return await get_bookings_by_id(db= db, auth= auth, id= id)
 
-@bookings_router.get("", status_code= status.HTTP_200_OK, response_model=List[GetBookingResponseModel])
-async def get_bookings_router(db: db_dependency,
-                              token: token_dependency,
+@bookings_router.get("", status_code= status.HTTP_200_OK, response_model=GetBookingsPageResponseModel)
+async def get_bookings_router(db: db_read_dependency,
+                              auth: auth_dependency,
                               bookings_status: StatusEnum = Query(None),
                               bookings_from: datetime = Query(None),
-                              bookings_to: datetime = Query(None)):
-    return await get_bookings(db= db, token= token, bookings_status= bookings_status, bookings_from= bookings_from, bookings_to= bookings_to)
+                              bookings_to: datetime = Query(None),
+                              limit: int = Query(BOOKINGS_PAGE_SIZE, ge= 1, le= BOOKINGS_PAGE_MAX),
+                              cursor: Optional[str] = Query(None)):
+    return await get_bookings(db= db, auth= auth, bookings_status= bookings_status, bookings_from= bookings_from, bookings_to= bookings_to, limit= limit, cursor= cursor)
 
 @bookings_router.patch("/{id}", status_code= status.HTTP_200_OK)
-async def update_booking_router(db: db_dependency, token: token_dependency, id: str, preferences: UpdateBooking):
-    result = await update_booking(db= db, token= token, id= id, preferences= preferences)
+async def update_booking_router(db: db_dependency, auth: auth_dependency, id: str, preferences: UpdateBooking):
+    result = await update_booking(db= db, auth= auth, id= id, preferences= preferences)
     await db.commit()
+    #cancelling, rescheduling and status changes all move which slots are free
+    await invalidate_availability_cache(result.pop("service_id"))
     return result
 
 @bookings_router.delete("/{id}")
-async def delete_booking_router(db: db_dependency, token: token_dependency, id: str):
-    result = await delete_booking(db = db, token= token, id= id)
+async def delete_booking_router(db: db_dependency, auth: auth_dependency, id: str):
+    result = await delete_booking(db = db, auth= auth, id= id)
     await db.commit()
+    service_id = result.pop("service_id")
+    if service_id is not None:
+        await invalidate_availability_cache(service_id)
+    #an admin delete takes the booking's review with it, the service's rating aggregates changed
+    service_ids = result.pop("service_ids", [])
+    if service_ids:
+        await invalidate_service_cache(*service_ids, availability= False)
     return result
\ No newline at end of file
@@ -1,11 +1,13 @@
-from fastapi import APIRouter, status, Query
+from fastapi import APIRouter, status, Query, Response
 from typing import Optional, Union, List
 from decimal import Decimal
+from datetime import datetime
 from uuid import UUID
-from utils.manager import db_dependency, token_dependency
-from src.services.services import create_service, get_service_by_id, get_services_by_query, update_service, delete_service
-from schemas.services.services import CreateService,UpdateService, CreateServiceResponseModel, UpdateServiceResponseModel, GetServiceResponseModel
-from src.reviews.reviews import get_reviews_for_service
+from utils.manager import db_dependency, db_read_dependency, auth_dependency
+from src.services.services import create_service, get_service_by_id, get_services_by_query, update_service, delete_service, get_service_availability, invalidate_service_cache, search_services, AVAILABILITY_CACHE_SECONDS, SEARCH_SIMILARITY_THRESHOLD, SEARCH_PAGE_SIZE, SEARCH_PAGE_MAX
+from schemas.services.services import CreateService,UpdateService, CreateServiceResponseModel, UpdateServiceResponseModel, GetServiceResponseModel, ServiceAvailabilityResponseModel, SearchServicesResponseModel
+from src.reviews.reviews import get_reviews_for_service, REVIEWS_PAGE_SIZE, REVIEWS_PAGE_MAX
+from schemas.reviews.reviews import GetReviewsPageResponseModel
 from shared import IsActiveEnum
 
 service_router = APIRouter(prefix="/services", tags= ["services"])
@@ -13,38 +15,67 @@ service_router = APIRouter(prefix="/services", tags= ["services"])
 
 
 @service_router.post("", status_code= status.HTTP_201_CREATED, response_model= CreateServiceResponseModel)
-async def create_service_router(db: db_dependency, token: token_dependency, details: CreateService):
-    result = await create_service(db= db, token= token, details= details)
+async def create_service_router(db: db_dependency, auth: auth_dependency, details: CreateService):
+    result = await create_service(db= db, auth= auth, details= details)
     await db.commit()
+    await invalidate_service_cache()
     return result
 
-@service_router.get("/{id}/reviews", status_code= status.HTTP_200_OK)
-async def get_reviews_for_service_router(db: db_dependency, token: token_dependency, id: str):
-    result = await get_reviews_for_service(db= db, token= token, id= id)
-    await db.commit()
-    return result
+#declared before /{id} so "search" is not taken for a service id
+@service_router.get("/search", status_code= status.HTTP_200_OK, response_model= SearchServicesResponseModel)
+async def search_services_router(db: db_read_dependency,
+                                 auth: auth_dependency,
+                                 q: str = Query(..., min_length= 1, max_length= 200),
+                                 price_min: Optional[Decimal] = Query(None),
+                                 price_max: Optional[Decimal] = Query(None),
+                                 active: Optional[IsActiveEnum] = Query(None),
+                                 limit: int = Query(SEARCH_PAGE_SIZE, ge= 1, le= SEARCH_PAGE_MAX),
+                                 cursor: Optional[str] = Query(None)):
+    return await search_services(db= db, auth= auth, q= q, price_min= price_min, price_max= price_max, active= active, limit= limit, cursor= cursor)
+
+@service_router.get("/{id}/reviews", status_code= status.HTTP_200_OK, response_model= GetReviewsPageResponseModel)
+async def get_reviews_for_service_router(db: db_read_dependency,
+                                         auth: auth_dependency,
+                                         id: str,
+                                         min_rating: Optional[int] = Query(None, ge= 1, le= 5),
+                                         limit: int = Query(REVIEWS_PAGE_SIZE, ge= 1, le= REVIEWS_PAGE_MAX),
+                                         cursor: Optional[str] = Query(None)):
+    return await get_reviews_for_service(db= db, auth= auth, id= id, min_rating= min_rating, limit= limit, cursor= cursor)
+
+@service_router.get("/{id}/availability", status_code= status.HTTP_200_OK, response_model= ServiceAvailabilityResponseModel)
+async def get_service_availability_router(db: db_read_dependency,
+                                          auth: auth_dependency,
+                                          response: Response,
+                                          id: UUID,
+                                          window_start: Optional[datetime] = Query(None, alias= "from"),
+                                          window_end: Optional[datetime] = Query(None, alias= "to")):
+    response.headers["Cache-Control"] = f"private, max-age={AVAILABILITY_CACHE_SECONDS}"
+    return await get_service_availability(db= db, auth= auth, id= id, window_start= window_start, window_end= window_end)
 
 @service_router.get("/{id}", status_code= status.HTTP_200_OK, response_model= GetServiceResponseModel)
-async def get_service_by_id_router(db: db_dependency, token: token_dependency, id: Union[UUID, str]):
-    return await get_service_by_id(db= db, token= token, id = id)
+async def get_service_by_id_router(db: db_read_dependency, auth: auth_dependency, id: Union[UUID, str]):
+    return await get_service_by_id(db= db, auth= auth, id = id)
 
 @service_router.get("", status_code= status.HTTP_200_OK, response_model= List[GetServiceResponseModel])
 async def get_services_by_query_router(
-                                db: db_dependency, token: token_dependency,
+                                db: db_read_dependency, auth: auth_dependency,
                                 q: Optional[str] = Query(None),
                                 price_min: Optional[Decimal] = Query(None),
                                 price_max: Optional[Decimal] = Query(None),
-                                active: Optional[IsActiveEnum] = Query(None)):
-    return await get_services_by_query(db = db, token = token, q = q, price_min= price_min, price_max= price_max, active= active)
+                                active: Optional[IsActiveEnum] = Query(None),
+                                threshold: float = Query(SEARCH_SIMILARITY_THRESHOLD, ge= 0, le= 1, description= "Minimum trigram similarity for `q` matches")):
+    return await get_services_by_query(db = db, auth = auth, q = q, price_min= price_min, price_max= price_max, active= active, threshold= threshold)
 
 @service_router.patch("/{id}", status_code= status.HTTP_200_OK, response_model= UpdateServiceResponseModel)
-async def update_service_router(db: db_dependency, token: token_dependency, id: str, details: UpdateService):
-    result = await update_service(db= db, token= token, id= id, details= details)
+async def update_service_router(db: db_dependency, auth: auth_dependency, id: str, details: UpdateService):
+    result = await update_service(db= db, auth= auth, id= id, details= details)
     await db.commit()
+    await invalidate_service_cache(id)
     return result
 
 @service_router.delete("/{id}")
-async def delete_service_router(db: db_dependency, token: token_dependency, id: str):
-    result = await delete_service(db= db, token= token, id= id)
+async def delete_service_router(db: db_dependency, auth: auth_dependency, id: str):
+    result = await delete_service(db= db, auth= auth, id= id)
     await db.commit()
+    await invalidate_service_cache(id)
     return result
\ No newline at end of file
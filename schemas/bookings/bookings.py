@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_validator, model_validator
-from typing import Optional
+from typing import Optional, List
 from uuid import UUID
 from datetime import datetime, timezone
 from shared import StatusEnum, UpdateBookingAction
@@ -11,6 +11,7 @@ class CreateBooking(BaseModel):
     start_time: Optional[datetime] = Field(default_factory= lambda: datetime.now(tz= timezone.utc))
     end_time: datetime = Field(...)
     status: StatusEnum = Field(...)
+    hold_id: Optional[UUID] = Field(None, description="Id from POST /bookings/hold, books the held slot without another conflict check")
 
     @field_validator("start_time")
     @classmethod
@@ -48,6 +49,42 @@ class CreateBookingResponseModel(BaseModel):
     class Config:
         from_attributes = True
 
+class HoldBooking(BaseModel):
+    service_id: UUID = Field(...)
+    start_time: datetime = Field(...)
+    end_time: datetime = Field(...)
+    ttl_seconds: Optional[int] = Field(None, ge= 1, description="How long the slot is held, defaults to HOLD_DEFAULT_SECONDS")
+
+    @field_validator("start_time")
+    @classmethod
+    def check_start_time(cls, v: datetime)-> datetime:
+        now = datetime.now(tz= timezone.utc)
+        if v < now:
+            raise ValueError("start_time must not be in the past")
+        return v
+
+    @model_validator(mode="after")
+    def check_times(self):
+        if self.start_time >= self.end_time:
+            raise ValueError("end_time must be after start_time")
+        return self
+
+class HoldBookingResponseModel(BaseModel):
+    message: Optional[str] = None
+    hold_id: UUID
+    service_id: UUID
+    start_time: datetime
+    end_time: datetime
+    expires_at: datetime
+
+class BulkBookingError(BaseModel):
+    index: int = Field(..., description="Position of the rejected booking in the request")
+    detail: str
+
+class BulkCreateBookingResponseModel(BaseModel):
+    created: List[CreateBookingResponseModel]
+    errors: List[BulkBookingError]
+
 class GetBookingResponseModel(BaseModel):
     message: Optional[str] = None
     id: UUID
@@ -58,6 +95,13 @@ class GetBookingResponseModel(BaseModel):
     status: StatusEnum
     created_at: datetime
 
+class GetBookingsPageResponseModel(BaseModel):
+    items: List[GetBookingResponseModel]
+    next_cursor: Optional[str] = Field(None, description="Pass as `cursor` to get the next page, null on the last page")
+
+    class Config:
+        from_attributes = True
+
 class UpdateBooking(BaseModel):
     action: Optional[UpdateBookingAction] = Field(None, description="(user only) You can only reschedule or cancel if your booking is pending or confirmed")
     start_time: Optional[datetime] = Field(None, description="(user only) If you intend to reschedule, set the new start_time otherwise leave blank")
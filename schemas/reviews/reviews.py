@@ -1,5 +1,5 @@
 from pydantic import BaseModel, field_validator, Field
-from typing import Optional
+from typing import Optional, List
 from uuid import UUID
 from datetime import datetime
 
@@ -38,3 +38,18 @@ class UpdateReview(BaseModel):
     
 class UpdateReviewResponseModel(CreateReviewResponseModel):
     pass
+
+
+class GetReviewResponseModel(BaseModel):
+    id: UUID
+    booking_id: UUID
+    rating: int
+    comment: Optional[str]
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class GetReviewsPageResponseModel(BaseModel):
+    items: List[GetReviewResponseModel]
+    next_cursor: Optional[str] = Field(None, description="Pass as `cursor` to get the next page, null on the last page")
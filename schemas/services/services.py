@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List, Dict
 from decimal import Decimal
 from uuid import UUID
 from shared import IsActiveEnum
@@ -29,5 +29,29 @@ class UpdateServiceResponseModel(CreateServiceResponseModel):
         from_attributes = True
 
 class GetServiceResponseModel(CreateServiceResponseModel):
+    rating_count: int = 0
+    rating_sum: int = 0
+    rating_average: Optional[float] = None
+    rating_histogram: Dict[str, int] = Field(default_factory= dict, description="Number of reviews per star, keyed \"1\" to \"5\"")
+
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class SearchServiceResult(GetServiceResponseModel):
+    rank: float
+
+class SearchServicesResponseModel(BaseModel):
+    items: List[SearchServiceResult]
+    next_cursor: Optional[str] = Field(None, description="Pass as `cursor` to get the next page, null on the last page")
+
+
+class AvailabilitySlot(BaseModel):
+    start_time: datetime
+    end_time: datetime
+
+class ServiceAvailabilityResponseModel(BaseModel):
+    service_id: UUID
+    duration_mins: int
+    window_start: datetime
+    window_end: datetime
+    slots: List[AvailabilitySlot]
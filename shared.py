@@ -16,4 +16,12 @@ class StatusEnum(enum.Enum):
 
 class UpdateBookingAction(enum.Enum):
     RESCHEDULE = "reschedule"
-    CANCEL = "cancel"
\ No newline at end of file
+    CANCEL = "cancel"
+
+class ExportFormat(enum.Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+class AnalyticsGranularity(enum.Enum):
+    HOUR = "hour"
+    DAY = "day"
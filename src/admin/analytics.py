@@ -0,0 +1,91 @@
+import os
+from typing import Optional
+from uuid import UUID
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException, status
+from sqlalchemy import select, func, table, column, text, BIGINT, DECIMAL, DateTime
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from dotenv import load_dotenv
+from database.config import Session, db_dependency
+from shared import AnalyticsGranularity
+from utils.manager import AuthContext, check_if_admin
+from utils.logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("analytics")
+
+ANALYTICS_REFRESH_SECONDS = int(os.getenv("ANALYTICS_REFRESH_SECONDS", "300"))   #0 disables the in-app refresh
+ANALYTICS_MAX_ROWS = int(os.getenv("ANALYTICS_MAX_ROWS", "10000"))
+#any constant works, it only has to be the same on every node
+ANALYTICS_REFRESH_LOCK_KEY = 720_020
+
+def _stats_view(name: str):
+    #materialized views from migration 0bb494d20d87, not part of the orm metadata
+    return table(name,
+                 column("bucket", DateTime(timezone= True)),
+                 column("service_id", PG_UUID(as_uuid= True)),
+                 column("bookings", BIGINT()),
+                 column("pending", BIGINT()),
+                 column("confirmed", BIGINT()),
+                 column("cancelled", BIGINT()),
+                 column("completed", BIGINT()),
+                 column("booked_minutes", BIGINT()),
+                 column("revenue", DECIMAL(14, 2)))
+
+STATS_VIEWS = {
+    AnalyticsGranularity.HOUR: _stats_view("booking_stats_hourly"),
+    AnalyticsGranularity.DAY: _stats_view("booking_stats_daily")
+}
+
+
+async def get_booking_analytics(db: db_dependency,
+                                auth: AuthContext,
+                                granularity: AnalyticsGranularity = AnalyticsGranularity.DAY,
+                                window_start: Optional[datetime] = None,
+                                window_end: Optional[datetime] = None,
+                                service_id: Optional[UUID] = None):
+    logger.info("get booking analytics")
+    await check_if_admin(auth)
+    window_end = window_end or datetime.now(tz= timezone.utc)
+    window_start = window_start or window_end - timedelta(days= 30)
+    if window_end <= window_start:
+        logger.error("invalid request parameter")
+        raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, detail="`to` must be after `from`")
+
+    view = STATS_VIEWS[granularity]
+    filters = [view.c.bucket >= window_start, view.c.bucket < window_end]
+    if service_id is not None:
+        filters.append(view.c.service_id == service_id)
+    try:
+        stmt = select(view).where(*filters).order_by(view.c.bucket, view.c.service_id).limit(ANALYTICS_MAX_ROWS + 1)
+        result_obj = await db.execute(stmt)
+        rows = result_obj.mappings().all()
+    except Exception as e:
+        logger.error(f"Db Error: {e.__class__.__name__}: {e}")
+        raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+    if len(rows) > ANALYTICS_MAX_ROWS:
+        logger.error("analytics window too large")
+        raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, detail=f"more than {ANALYTICS_MAX_ROWS} rows, narrow the window or filter by service_id")
+
+    logger.info("get booking analytics request successful")
+    return {
+        "granularity": granularity,
+        "window_start": window_start,
+        "window_end": window_end,
+        "rows": [dict(row) for row in rows]
+    }
+
+async def refresh_booking_stats() -> None:
+    """Refresh the stats views without blocking readers, on one node at a time."""
+    logger.info("refresh booking stats")
+    async with Session() as db:
+        #the xact lock is released on commit, nodes that miss it skip this round
+        result_obj = await db.execute(select(func.pg_try_advisory_xact_lock(ANALYTICS_REFRESH_LOCK_KEY)))
+        if not result_obj.scalar_one():
+            logger.info("booking stats refresh already running on another node")
+            return
+        for view in STATS_VIEWS.values():
+            await db.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view.name}"))
+        await db.commit()
+    logger.info("booking stats refreshed")
@@ -0,0 +1,41 @@
+from database.config import engine, replica_engine
+from utils.manager import AuthContext, check_if_admin
+from utils.token_cache import token_cache
+from utils.blacklist import token_blacklist
+from src.bookings.locks import service_locks
+from utils.logger import get_logger
+
+logger = get_logger("diagnostics")
+
+
+async def get_token_cache_stats(auth: AuthContext) -> dict:
+    logger.info("get token cache stats")
+    await check_if_admin(auth)
+    #stats are per worker process
+    stats = token_cache.stats()
+    logger.info("get token cache stats request successful")
+    return stats
+
+async def get_blacklist_filter_stats(auth: AuthContext) -> dict:
+    logger.info("get blacklist filter stats")
+    await check_if_admin(auth)
+    stats = token_blacklist.filter_stats()
+    logger.info("get blacklist filter stats request successful")
+    return stats
+
+async def get_db_pool_stats(auth: AuthContext) -> dict:
+    logger.info("get db pool stats")
+    await check_if_admin(auth)
+    stats = {
+        "primary": engine.pool.stats(),
+        "replica": replica_engine.pool.stats() if replica_engine is not engine else None
+    }
+    logger.info("get db pool stats request successful")
+    return stats
+
+async def get_booking_lock_stats(auth: AuthContext) -> dict:
+    logger.info("get booking lock stats")
+    await check_if_admin(auth)
+    stats = service_locks.stats()
+    logger.info("get booking lock stats request successful")
+    return stats
@@ -1,10 +1,13 @@
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, status
 from sqlalchemy import select, update, delete
-from sqlalchemy.exc import IntegrityError
-from database.config import db_dependency
+from sqlalchemy.dialects.postgresql import insert
+from database.config import db_dependency, mark_recent_write
 from schemas.auth.auth import SignIn, SignUp, UpdateAccount, RefreshToken
-from database.models import Users, Blacklists
-from utils.manager import pwd_context, jwt_manager
+from database.models import Users, Bookings, Reviews
+from utils.manager import jwt_manager, AuthContext
+from utils.password import password_manager
+from utils.blacklist import token_blacklist
+from src.reviews.ratings import remove_reviews
 from utils.logger import get_logger
 
 logger = get_logger("auth")
@@ -14,39 +17,27 @@ async def create_account(user_details: SignUp, db: db_dependency)-> dict:
     logger.info("create account")
     full_name = user_details.full_name
     email = user_details.email
-    password_hash = pwd_context.hash(user_details.password)
+    password_hash = await password_manager.hash(user_details.password)
     role = user_details.role
 
-    #check if user already exist
+    #insert and read back the id in one statement, an existing email makes the insert a no-op
     try:
-        stmt = select(Users).where(Users.email == email)
+        stmt = (insert(Users)
+                .values(full_name= full_name, email= email, password_hash= password_hash, role= role)
+                .on_conflict_do_nothing(index_elements= [Users.email])
+                .returning(Users.id))
         result_obj = await db.execute(stmt)
-        user = result_obj.scalar_one_or_none()
+        user_id = result_obj.scalar_one_or_none()
     except Exception as e:
+        await db.rollback()
         logger.error(f"Db Error: {e.__class__.__name__}: {e}")
         raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
 
-    if user:
+    if user_id is None:
         logger.error("user already exist")
         raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, detail="user already exist, sign in")
-
-    to_add = Users(full_name= full_name, email= email, password_hash= password_hash, role= role)
-
-    try:
-        db.add(to_add)
-        await db.flush()
-    except Exception as e:
-        await db.rollback()
-        logger.error(f"Db Error: {e.__class__.__name__}: {e}")
-        raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
-    
-    try:
-        stmt = select(Users.id).where(Users.email == email)
-        result_obj = await db.execute(stmt)
-        user_id = result_obj.scalar_one_or_none()
-    except Exception as e:
-        logger.error(f"Db Error: {e.__class__.__name__}: {e}")
-        raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+    #register is unauthenticated so the middleware cannot mark it, send the new user's reads to the primary
+    await mark_recent_write(str(user_id))
     to_encode= {"sub": str(user_id), "role": role.value}
     access_token = await jwt_manager.create_access_token(to_encode)
     refresh_token = await jwt_manager.create_refresh_token(to_encode)
@@ -60,10 +51,9 @@ async def create_account(user_details: SignUp, db: db_dependency)-> dict:
     return to_return
 
 
-async def get_account_details(db: db_dependency, token: str = Depends(jwt_manager.validate_token))-> dict:
+async def get_account_details(db: db_dependency, auth: AuthContext)-> dict:
     logger.info("get account details")
-    data = await jwt_manager.decode_token(token)
-    user_id = data.get("sub")
+    user_id = auth.sub
     try:
         stmt = select(Users).where(Users.id == user_id)
         result_obj = await db.execute(stmt)
@@ -72,6 +62,11 @@ async def get_account_details(db: db_dependency, token: str = Depends(jwt_manage
         logger.error(f"Db Error: {e.__class__.__name__}: {e}")
         raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
 
+    #the replica can still be missing a user who just registered
+    if not user_obj:
+        logger.error("user not found")
+        raise HTTPException(status_code= status.HTTP_404_NOT_FOUND, detail="user not found")
+
     user = {
         "full_name": user_obj.full_name,
         "email": user_obj.email,
@@ -81,10 +76,9 @@ async def get_account_details(db: db_dependency, token: str = Depends(jwt_manage
 
     return user
 
-async def update_account(db: db_dependency, user_details: UpdateAccount, token: str = Depends(jwt_manager.validate_token))-> dict:
+async def update_account(db: db_dependency, user_details: UpdateAccount, auth: AuthContext)-> dict:
     logger.info("update account")
-    data = await jwt_manager.decode_token(token)
-    user_id = data.get("sub")
+    user_id = auth.sub
     try:
         stmt = select(Users).where(Users.id == user_id)
         result_obj = await db.execute(stmt)
@@ -101,7 +95,7 @@ async def update_account(db: db_dependency, user_details: UpdateAccount, token:
     new_full_name = user_details.full_name if user_details.full_name else existing_full_name
     new_email = user_details.email if user_details.email else existing_email
     new_role = user_details.role if user_details.role else existing_role
-    new_password_hash = pwd_context.hash(user_details.password) if user_details.password else existing_password_hash
+    new_password_hash = await password_manager.hash(user_details.password) if user_details.password else existing_password_hash
 
     try:
         stmt = update(Users).where(Users.id == user_id).values(full_name = new_full_name,
@@ -125,10 +119,11 @@ async def update_account(db: db_dependency, user_details: UpdateAccount, token:
     return to_return
 
 
-async def delete_account(db: db_dependency, token: str= Depends(jwt_manager.validate_token))-> dict:
+async def delete_account(db: db_dependency, auth: AuthContext)-> dict:
     logger.info("delete account")
-    data = await jwt_manager.decode_token(token)
-    user_id = data.get("sub")
+    user_id = auth.sub
+    #reviews go with the account through the cascade, uncount them on their services first
+    service_ids = await remove_reviews(db, Reviews.booking_id.in_(select(Bookings.id).where(Bookings.user_id == user_id)))
     try:
         stmt = delete(Users).where(Users.id == user_id)
         await db.execute(stmt)
@@ -138,17 +133,10 @@ async def delete_account(db: db_dependency, token: str= Depends(jwt_manager.vali
         logger.error(f"Db Error: {e.__class__.__name__}: {e}")
         raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
     
-    #blacklist token in redis
-    to_add = Blacklists(token= token)
-    try:
-        db.add(to_add)
-        await db.flush()
-    except Exception as e:
-        await db.rollback()
-        logger.error(f"Db Error: {e.__class__.__name__}: {e}")
-        raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+    #blacklist token until it expires
+    await token_blacklist.revoke(db, {auth.token: auth.exp})
     logger.info("account deleted")
-    return {"message": "account deleted"}
+    return {"message": "account deleted", "service_ids": service_ids}
 
 
 async def sign_in(db: db_dependency, details: SignIn) -> dict:
@@ -172,12 +160,14 @@ async def sign_in(db: db_dependency, details: SignIn) -> dict:
         raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, detail="email or password incorrect")
     
     #verify password
-    pass_verify = pwd_context.verify(user_password, user.password_hash)
+    pass_verify = await password_manager.verify(user_password, user.password_hash)
 
     if not pass_verify:
         logger.error("email or password incorrect")
         raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, detail="email or password incorrect")
     
+    #a freshly registered account may not be on the replica yet
+    await mark_recent_write(str(user.id))
     #create token
     user_details = {"sub": str(user.id), "role": user.role.value}
     access_token = await jwt_manager.create_access_token(user_details)
@@ -191,23 +181,17 @@ async def sign_in(db: db_dependency, details: SignIn) -> dict:
     logger.info("sign in successful")
     return to_return
 
-async def sign_out(db: db_dependency,refresh_token:RefreshToken, access_token: str= Depends(jwt_manager.validate_token))-> bool:
+async def sign_out(db: db_dependency,refresh_token:RefreshToken, auth: AuthContext)-> bool:
     logger.info("sign out")
-    #blacklist token by adding it to the blacklisted tokens in postgres to simulate redis blacklisting
-    access_to_add = Blacklists(token= access_token)
-    refresh_to_add = Blacklists(token= refresh_token.refresh_token)
-    try:
-        db.add(access_to_add)
-        db.add(refresh_to_add)
-        await db.flush()
-    except IntegrityError as i:
-        await db.rollback()
-        logger.error(f"Db Error: {i.__class__.__name__}: {i}")
+    #blacklist both tokens until they expire
+    to_revoke = {
+        auth.token: auth.exp,
+        refresh_token.refresh_token: await jwt_manager.get_token_exp(refresh_token.refresh_token)
+    }
+    revoked = await token_blacklist.revoke(db, to_revoke)
+    if not revoked:
+        logger.error("tokens already blacklisted")
         return {"message": "user already signed out"}
-    except Exception as e:
-        await db.rollback()
-        logger.error(f"Db Error: {e.__class__.__name__}: {e}")
-        raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
     logger.info("sign out successful")
     return {"message": "user signed out"}
 
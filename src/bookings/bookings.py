@@ -1,21 +1,96 @@
+import os
+import uuid
 from fastapi import HTTPException, status, Query
-from sqlalchemy import select, update, delete, desc, and_
+from sqlalchemy import select, update, delete, desc, and_, tuple_, union_all, literal, func
+from sqlalchemy.dialects.postgresql import insert
 from typing import Optional, List
+from uuid import UUID
 from datetime import datetime, timezone
-from schemas.bookings.bookings import CreateBooking, UpdateBooking, CreateBookingResponseModel
+from dotenv import load_dotenv
+from redis.exceptions import RedisError
+from schemas.bookings.bookings import CreateBooking, UpdateBooking, CreateBookingResponseModel, HoldBooking
 from database.config import db_dependency
-from database.models import Bookings, Users, Services
-from shared import StatusEnum, RoleEnum, UpdateBookingAction
-from utils.manager import jwt_manager, token_dependency, check_if_user
+from database.errors import is_booking_overlap
+from database.models import Bookings, Users, Services, Reviews
+from shared import StatusEnum, RoleEnum, UpdateBookingAction, IsActiveEnum
+from src.bookings.locks import service_locks
+from src.bookings.holds import slot_holds, HOLD_DEFAULT_SECONDS, HOLD_MAX_SECONDS
+from src.reviews.ratings import remove_reviews
+from utils.manager import AuthContext, check_if_user
+from utils.pagination import encode_cursor, decode_cursor
 from utils.logger import get_logger
 
+load_dotenv()
+
 logger = get_logger("booking")
 
-async def create_booking(db: db_dependency, token: str, booking_details: CreateBooking) -> List[CreateBookingResponseModel]:
+BOOKINGS_PAGE_SIZE = int(os.getenv("BOOKINGS_PAGE_SIZE", "50"))
+BOOKINGS_PAGE_MAX = int(os.getenv("BOOKINGS_PAGE_MAX", "200"))
+BOOKINGS_BULK_MAX = int(os.getenv("BOOKINGS_BULK_MAX", "500"))
+
+async def _check_hold(booking_details: CreateBooking, token_user_id: str) -> None:
+    try:
+        hold = await slot_holds.get(booking_details.service_id, booking_details.hold_id)
+    except RedisError as e:
+        logger.error(f"Redis Error: {e.__class__.__name__}: {e}")
+        raise HTTPException(status_code= status.HTTP_503_SERVICE_UNAVAILABLE, detail="holds are unavailable, book without hold_id")
+    if hold is None:
+        logger.error("hold not found or expired")
+        raise HTTPException(status_code= status.HTTP_409_CONFLICT, detail="hold expired or not found, hold the slot again")
+    if hold["user_id"] != token_user_id:
+        logger.error("user not authorized")
+        raise HTTPException(status_code= status.HTTP_403_FORBIDDEN, detail="you can only use a hold you created")
+    #the booking must fit inside the held range
+    if int(booking_details.start_time.timestamp() * 1000) < hold["start_ms"] or int(booking_details.end_time.timestamp() * 1000) > hold["end_ms"]:
+        logger.error("invalid request parameter")
+        raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, detail="start_time and end_time must be within the held range")
+
+async def hold_booking(db: db_dependency, auth: AuthContext, details: HoldBooking):
+    logger.info("hold booking")
+    await check_if_user(auth)
+    ttl_seconds = details.ttl_seconds or HOLD_DEFAULT_SECONDS
+    if ttl_seconds > HOLD_MAX_SECONDS:
+        logger.error("invalid request parameter")
+        raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, detail=f"ttl_seconds cannot exceed {HOLD_MAX_SECONDS}")
+    #only free ranges of an existing, active service can be held
+    try:
+        service_stmt = select(Services.is_active).where(Services.id == details.service_id)
+        service_result_obj = await db.execute(service_stmt)
+        is_active = service_result_obj.scalar_one_or_none()
+        overlap_stmt = (select(Bookings.id)
+                        .where(Bookings.service_id == details.service_id,
+                               Bookings.status != StatusEnum.CANCELLED,
+                               func.tstzrange(Bookings.start_time, Bookings.end_time).op("&&")(func.tstzrange(details.start_time, details.end_time)))
+                        .limit(1))
+        overlap_result_obj = await db.execute(overlap_stmt)
+        overlapping = overlap_result_obj.scalar_one_or_none()
+    except Exception as e:
+        logger.error(f"Db Error: {e.__class__.__name__}: {e}")
+        raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+    if is_active is None:
+        logger.error("invalid service id")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail= "invalid service_id")
+    if is_active != IsActiveEnum.TRUE:
+        logger.error("service is not active")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail= "service is not active")
+    if overlapping is not None:
+        logger.error("requested time overlaps an existing booking")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail= "Requested service is already booked for this time, pick another slot")
+
+    try:
+        hold = await slot_holds.hold(details.service_id, auth.sub, details.start_time, details.end_time, ttl_seconds)
+    except RedisError as e:
+        logger.error(f"Redis Error: {e.__class__.__name__}: {e}")
+        raise HTTPException(status_code= status.HTTP_503_SERVICE_UNAVAILABLE, detail="holds are unavailable, book without hold_id")
+    if hold is None:
+        logger.error("requested time is held by another user")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail= "Requested time is being booked by someone else, pick another slot")
+    logger.info("booking hold created")
+    return {"message": "slot held", **hold}
+
+async def create_booking(db: db_dependency, auth: AuthContext, booking_details: CreateBooking) -> List[CreateBookingResponseModel]:
     logger.info("create booking")
-    #validate the token
-    await jwt_manager.validate_token(db, token)
-    await check_if_user(db, token)
+    await check_if_user(auth)
     booking_user_id = booking_details.user_id
     booking_service_id = booking_details.service_id
     booking_start_time = booking_details.start_time
@@ -23,8 +98,7 @@ async def create_booking(db: db_dependency, token: str, booking_details: CreateB
     booking_status = booking_details.status
 
     #check if booking_user_id is the same as the id in token(enforces same user creating the resource)
-    decoded_token = await jwt_manager.decode_token(token)
-    token_user_id = decoded_token.get("sub")
+    token_user_id = auth.sub
     if token_user_id != str(booking_user_id):
         logger.error("user not authorized")
         raise HTTPException(status_code= status.HTTP_403_FORBIDDEN, detail="only authorized users are allowed to create this resource")
@@ -55,59 +129,46 @@ async def create_booking(db: db_dependency, token: str, booking_details: CreateB
         logger.error("invalid service id")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail= "invalid service_id")
 
-    #check if the service is still active
-    try:
-        check_stmt = select(Bookings).where(Bookings.service_id == booking_service_id).order_by(desc(Bookings.created_at)).limit(1)
-        result_obj= await db.execute(check_stmt)
-        last_service_booking = result_obj.scalar_one_or_none()
-    except Exception as e:
-        logger.error(f"Db Error: {e.__class__.__name__}: {e}")
-        raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
-    
-    # check if expired
-    if last_service_booking is not None and last_service_booking.end_time < datetime.now(tz=timezone.utc):
-        new_status = None
-        
-        if last_service_booking.status == StatusEnum.PENDING.value:
-            new_status = StatusEnum.CANCELLED.value
-        elif last_service_booking.status not in (StatusEnum.CANCELLED.value, StatusEnum.COMPLETED.value):
-            new_status = StatusEnum.COMPLETED.value
-        
-        if new_status:
+    if booking_details.hold_id is not None:
+        #the hold was only granted for a free range, converting it needs no further conflict check
+        await _check_hold(booking_details, token_user_id)
+    else:
+        #ranges other users are holding at checkout cannot be booked until the hold is used or runs out
+        held = await slot_holds.conflicts([(booking_service_id, booking_start_time, booking_end_time)], token_user_id)
+        if held[0]:
+            logger.error("requested time is held by another user")
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail= "Requested time is being booked by someone else, pick another slot")
+        if service_locks.enabled:
+            #serialized mode: bookings of this service queue on an advisory lock, so the check below cannot race
+            await service_locks.acquire(db, booking_service_id)
             try:
-                update_stmt = (update(Bookings).where(Bookings.service_id == booking_service_id).values(status=new_status))
-                await db.execute(update_stmt)
-                await db.commit()
+                overlap_stmt = (select(Bookings.id)
+                                .where(Bookings.service_id == booking_service_id,
+                                       Bookings.status != StatusEnum.CANCELLED,
+                                       func.tstzrange(Bookings.start_time, Bookings.end_time).op("&&")(func.tstzrange(booking_start_time, booking_end_time)))
+                                .limit(1))
+                overlap_result_obj = await db.execute(overlap_stmt)
+                overlapping = overlap_result_obj.scalar_one_or_none()
             except Exception as e:
                 await db.rollback()
                 logger.error(f"Db Error: {e.__class__.__name__}: {e}")
-                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
-    
-    #check if it is confirmed i.e another user is still using the service
-    if last_service_booking is not None and last_service_booking == StatusEnum.CONFIRMED.value:
-        logger.error("requested service is in use by another user")
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail= "Requested service is in use, try again later")
-    
-    #since the service is active, it can be booked
-    to_add = Bookings(user_id= booking_user_id, service_id= booking_service_id, start_time = booking_start_time, end_time= booking_end_time, status= booking_status)
+                raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+            if overlapping is not None:
+                logger.error("requested time overlaps an existing booking")
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail= "Requested service is already booked for this time, pick another slot")
+
+    #overlapping bookings are rejected by the bookings_no_overlap exclusion constraint on insert
     try:
-        db.add(to_add)
-        await db.flush()
+        stmt = (insert(Bookings)
+                .values(user_id= booking_user_id, service_id= booking_service_id, start_time = booking_start_time, end_time= booking_end_time, status= booking_status)
+                .returning(Bookings))
+        result_cls = await db.execute(stmt)
+        result_obj = result_cls.scalar_one()
     except Exception as e:
         await db.rollback()
-        logger.error(f"Db Error: {e.__class__.__name__}: {e}")
-        raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
-    #get all booking details
-    try:
-        stmt = select(Bookings).where((Bookings.user_id == booking_user_id) &
-                                      (Bookings.service_id == booking_service_id) &
-                                      (Bookings.start_time == booking_start_time) &
-                                      (Bookings.end_time == booking_end_time) &
-                                      (Bookings.status == booking_status)
-                                      )
-        details_result_cls = await db.execute(stmt)
-        result_obj = details_result_cls.scalar_one_or_none()
-    except Exception as e:
+        if is_booking_overlap(e):
+            logger.error("requested time overlaps an existing booking")
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail= "Requested service is already booked for this time, pick another slot")
         logger.error(f"Db Error: {e.__class__.__name__}: {e}")
         raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
     to_return = {
@@ -118,84 +179,157 @@ async def create_booking(db: db_dependency, token: str, booking_details: CreateB
         "start_time": result_obj.start_time,
         "end_time": result_obj.end_time,
         "status": result_obj.status,
-        "created_at": result_obj.created_at
+        "created_at": result_obj.created_at,
+        #released by the route once the booking is committed, a failed commit must not lose the hold
+        "hold_id": booking_details.hold_id
         } 
     logger.info("booking created")
     return to_return
 
+async def create_bookings_bulk(db: db_dependency, auth: AuthContext, bookings_details: List[CreateBooking]):
+    logger.info("create bookings in bulk")
+    await check_if_user(auth)
+    #holds are converted one at a time by POST /bookings, a batch has no per item hold check
+    held_indexes = [index for index, details in enumerate(bookings_details) if details.hold_id is not None]
+    if held_indexes:
+        logger.error("invalid request parameter")
+        raise HTTPException(status_code= status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"hold_id is not supported in bulk bookings (items {held_indexes}), book held slots with POST /bookings")
+    token_user_id = auth.sub
+    errors = []
+    candidates = []
+    for index, details in enumerate(bookings_details):
+        #same rule as create_booking, users only book for themselves
+        if str(details.user_id) != token_user_id:
+            errors.append({"index": index, "detail": "only authorized users are allowed to create this resource"})
+            continue
+        candidates.append((index, details))
+
+    #check every referenced user and service in one query
+    user_ids = {details.user_id for _, details in candidates}
+    service_ids = {details.service_id for _, details in candidates}
+    try:
+        exists_stmt = union_all(select(Users.id, literal("user").label("kind")).where(Users.id.in_(user_ids)),
+                                select(Services.id, literal("service").label("kind")).where(Services.id.in_(service_ids)))
+        exists_result_obj = await db.execute(exists_stmt)
+        existing = {(kind, found_id) for found_id, kind in exists_result_obj.all()}
+    except Exception as e:
+        logger.error(f"Db Error: {e.__class__.__name__}: {e}")
+        raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+
+    #ranges held by other users are refused, checked for the whole batch in one redis round trip
+    held = await slot_holds.conflicts([(details.service_id, details.start_time, details.end_time) for _, details in candidates], token_user_id)
+
+    to_insert = {}
+    for (index, details), is_held in zip(candidates, held):
+        if ("user", details.user_id) not in existing:
+            errors.append({"index": index, "detail": "invalid user_id"})
+        elif ("service", details.service_id) not in existing:
+            errors.append({"index": index, "detail": "invalid service_id"})
+        elif is_held:
+            errors.append({"index": index, "detail": "Requested time is being booked by someone else, pick another slot"})
+        else:
+            #ids are generated here so returned rows can be matched back to their position in the batch
+            to_insert[uuid.uuid4()] = index
+
+    created = []
+    if to_insert:
+        rows = [{"id": booking_id,
+                 "user_id": bookings_details[index].user_id,
+                 "service_id": bookings_details[index].service_id,
+                 "start_time": bookings_details[index].start_time,
+                 "end_time": bookings_details[index].end_time,
+                 "status": bookings_details[index].status} for booking_id, index in to_insert.items()]
+        #DO NOTHING without a target also covers the bookings_no_overlap exclusion constraint,
+        #so overlapping items (with existing bookings or each other) are skipped instead of failing the batch
+        try:
+            stmt = insert(Bookings).values(rows).on_conflict_do_nothing().returning(Bookings)
+            result_cls = await db.execute(stmt)
+            inserted = {booking.id: booking for booking in result_cls.scalars().all()}
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Db Error: {e.__class__.__name__}: {e}")
+            raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+        for booking_id, index in to_insert.items():
+            booking = inserted.get(booking_id)
+            if booking is None:
+                errors.append({"index": index, "detail": "Requested service is already booked for this time, pick another slot"})
+                continue
+            created.append({
+                "message": "booking created",
+                "id": booking.id,
+                "user_id": booking.user_id,
+                "service_id": booking.service_id,
+                "start_time": booking.start_time,
+                "end_time": booking.end_time,
+                "status": booking.status,
+                "created_at": booking.created_at
+            })
+
+    errors.sort(key= lambda error: error["index"])
+    logger.info(f"bulk booking finished, {len(created)} created, {len(errors)} rejected")
+    return {"created": created, "errors": errors}
+
+def booking_filters(bookings_status: Optional[StatusEnum], bookings_from: Optional[datetime], bookings_to: Optional[datetime]) -> list:
+    #admin listing filters, shared by GET /bookings and the export
+    filters = []
+    if bookings_status is not None:
+        filters.append(Bookings.status == bookings_status)
+    if bookings_from is not None:
+        filters.append(Bookings.start_time > bookings_from)
+    if bookings_to is not None:
+        filters.append(Bookings.end_time < bookings_to)
+    return filters
+
 async def get_bookings(db: db_dependency,
-                       token: str,
+                       auth: AuthContext,
                        bookings_status: Optional[StatusEnum] = Query(None),
                        bookings_from: Optional[datetime] = Query(None),
-                       bookings_to: Optional[datetime] = Query(None)):
+                       bookings_to: Optional[datetime] = Query(None),
+                       limit: int = BOOKINGS_PAGE_SIZE,
+                       cursor: Optional[str] = None):
     logger.info("getting bookings")
-    #validate token
-    await jwt_manager.validate_token(db, token)
-    #check user_role
-    token_role = await jwt_manager.check_role(db, token)
-    #if role = user path
+    token_role = auth.role
+    filters = []
+    #if role = user path, only the user's own bookings
     if token_role == RoleEnum.USER.value:
         #get user_id
-        user_details: dict = await jwt_manager.decode_token(token)
-        user_id = user_details.get("sub", None)
+        user_id = auth.sub
         if not user_id:
             logger.error("invalid user id")
             raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, detail="invalid user_id")
-        #query all bookings with the user_id in db
-        try:
-            user_bookings_stmt = select(Bookings).where(Bookings.user_id == user_id).order_by(desc(Bookings.created_at))
-            user_bookings_cls = await db.execute(user_bookings_stmt)
-            user_bookings_obj = user_bookings_cls.scalars().all()
-        except Exception as e:
-            logger.error(f"Db Error: {e.__class__.__name__}: {e}")
-            raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
-        #return the resulting booking objects
-        logger.info("get bookings request successful")
-        return user_bookings_obj
-    #if role = admin path
-    if token_role == RoleEnum.ADMIN.value:
-        try:
-            all_booking_stmt = select(Bookings)
-        except Exception as e:
-            logger.error(f"Db Error: {e.__class__.__name__}: {e}")
-            raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
-        
-        filters = []
-        if bookings_status is not None:
-            filters.append(Bookings.status == bookings_status)
-        if bookings_from is not None:
-            filters.append(Bookings.start_time > bookings_from)
-        if bookings_to is not None:
-            filters.append(Bookings.end_time < bookings_to)
-        
-        if filters:
-            try:
-                all_booking_stmt = all_booking_stmt.where(and_(*filters)).order_by(desc(Bookings.created_at))
-                all_booking_cls = await db.execute(all_booking_stmt)
-                all_booking_obj = all_booking_cls.scalars().all()
-            except Exception as e:
-                logger.error(f"Db Error: {e.__class__.__name__}: {e}")
-                raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
-            logger.info("get bookings request successful")
-            return all_booking_obj
-        
-        if not filters:
-            try:
-                all_booking_stmt = select(Bookings).order_by(desc(Bookings.created_at))
-                all_booking_cls = await db.execute(all_booking_stmt)
-                all_booking_obj = all_booking_cls.scalars().all()
-            except Exception as e:
-                logger.error(f"Db Error: {e.__class__.__name__}: {e}")
-                raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
-            logger.info("get bookings request successful")
-            
-            return all_booking_obj
+        filters.append(Bookings.user_id == user_id)
+    #if role = admin path, every booking matching the filters
+    elif token_role == RoleEnum.ADMIN.value:
+        filters.extend(booking_filters(bookings_status, bookings_from, bookings_to))
+    else:
+        logger.error("unauthorized user")
+        raise HTTPException(status_code= status.HTTP_403_FORBIDDEN, detail="you do not have the permission to access this resource")
+
+    #keyset pagination, newest first. the cursor is the (created_at, id) of the last row already sent
+    if cursor is not None:
+        cursor_created_at, cursor_id = decode_cursor(cursor, (datetime.fromisoformat, UUID))
+        filters.append(tuple_(Bookings.created_at, Bookings.id) < tuple_(cursor_created_at, cursor_id))
+
+    try:
+        bookings_stmt = (select(Bookings)
+                         .where(and_(*filters))
+                         .order_by(desc(Bookings.created_at), desc(Bookings.id))
+                         .limit(limit + 1))
+        bookings_cls = await db.execute(bookings_stmt)
+        bookings_obj = bookings_cls.scalars().all()
+    except Exception as e:
+        logger.error(f"Db Error: {e.__class__.__name__}: {e}")
+        raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+
+    #one extra row tells us whether there is another page
+    items = bookings_obj[:limit]
+    next_cursor = encode_cursor((items[-1].created_at, items[-1].id)) if len(bookings_obj) > limit else None
+    logger.info("get bookings request successful")
+    return {"items": items, "next_cursor": next_cursor}
     
-async def get_bookings_by_id(db: db_dependency, token: token_dependency, id: str):
+async def get_bookings_by_id(db: db_dependency, auth: AuthContext, id: str):
     logger.info("getting bookings by id")
-    #validate token
-    await jwt_manager.validate_token(db, token)
-    token_role = await jwt_manager.check_role(db, token)
+    token_role = auth.role
     if token_role == RoleEnum.ADMIN.value:
         #retrieve booking by id
         try:
@@ -219,8 +353,7 @@ async def get_bookings_by_id(db: db_dependency, token: token_dependency, id: str
         return to_return
     elif token_role == RoleEnum.USER.value:
         #get user_id
-        user_details: dict = await jwt_manager.decode_token(token)
-        user_id = user_details.get("sub", None)
+        user_id = auth.sub
         if not user_id:
             logger.error("invalid user id")
             raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, detail="invalid user_id")
@@ -252,14 +385,11 @@ async def get_bookings_by_id(db: db_dependency, token: token_dependency, id: str
         logger.error("unauthorized user")
         raise HTTPException(status_code= status.HTTP_403_FORBIDDEN, detail="you do not have the permission to access this resource")
 
-async def update_booking(db: db_dependency, token: str, id: str, preferences: UpdateBooking):
+async def update_booking(db: db_dependency, auth: AuthContext, id: str, preferences: UpdateBooking):
     logger.info("update booking")
-    #validate token
-    await jwt_manager.validate_token(db, token)
     #check user role and user_id
-    token_role = await jwt_manager.check_role(db, token)
-    token_user_details = await jwt_manager.decode_token(token)
-    token_user_id = token_user_details.get("sub", None)
+    token_role = auth.role
+    token_user_id = auth.sub
     #retrieve the booking details from db
     try:
         retrieve_stmt = select(Bookings).where(Bookings.id == id)
@@ -281,7 +411,7 @@ async def update_booking(db: db_dependency, token: str, id: str, preferences: Up
             logger.error("invalid request parameter")
             raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, detail="booking status has to be pending or confirmed to perform action")
         #for cancel action
-        if preferences.action not in (UpdateBookingAction.CANCEL.value, UpdateBookingAction.RESCHEDULE.value):
+        if preferences.action not in (UpdateBookingAction.CANCEL, UpdateBookingAction.RESCHEDULE):
             logger.error("invalid request parameter")
             raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, detail="specify the right action you want to carry out on the resource")
         if preferences.action.value == UpdateBookingAction.CANCEL.value:
@@ -294,7 +424,7 @@ async def update_booking(db: db_dependency, token: str, id: str, preferences: Up
                 logger.error(f"Db Error: {e.__class__.__name__}: {e}")
                 raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
             logger.info("booking cancelled, update successful")
-            return {"message": "booking cancelled"}
+            return {"message": "booking cancelled", "service_id": retrieve_data.service_id}
         #for reschedule action
         elif preferences.action.value == UpdateBookingAction.RESCHEDULE.value:
             if preferences.start_time is None or preferences.end_time is None:
@@ -305,11 +435,15 @@ async def update_booking(db: db_dependency, token: str, id: str, preferences: Up
                 await db.execute(update_stmt2)
                 await db.flush()
             except Exception as e:
+                await db.rollback()
+                if is_booking_overlap(e):
+                    logger.error("requested time overlaps an existing booking")
+                    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail= "Requested service is already booked for this time, pick another slot")
                 logger.error(f"Db Error: {e.__class__.__name__}: {e}")
                 raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
             logger.info("booking rescheduled, update successful")
             
-            return {"message": "booking rescheduled"}
+            return {"message": "booking rescheduled", "service_id": retrieve_data.service_id}
     #admin path    
     if token_role == RoleEnum.ADMIN.value:
         #check if update_status_to is None
@@ -321,15 +455,18 @@ async def update_booking(db: db_dependency, token: str, id: str, preferences: Up
             await db.execute(admin_update_stmt)
             await db.flush()
         except Exception as e:
+            await db.rollback()
+            #moving a cancelled booking back to an active status can collide with a newer booking
+            if is_booking_overlap(e):
+                logger.error("booking overlaps an existing booking")
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail= "booking overlaps another booking of this service")
             logger.error(f"Db Error: {e.__class__.__name__}: {e}")
             raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
         logger.info("booking status updated")
-        return {"Message": "booking status updated"}        
+        return {"Message": "booking status updated", "service_id": retrieve_data.service_id}        
     
-async def delete_booking(db: db_dependency, token: str, id: str):
+async def delete_booking(db: db_dependency, auth: AuthContext, id: str):
     logger.info("delete booking")
-    #validate token
-    await jwt_manager.validate_token(db, token)
     #retrieve the boking details
     try:
         booking_stmt = select(Bookings).where(Bookings.id == id)
@@ -339,11 +476,10 @@ async def delete_booking(db: db_dependency, token: str, id: str):
         logger.error(f"Db Error: {e.__class__.__name__}: {e}")
         raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
     
-    token_role = await jwt_manager.check_role(db, token)
+    token_role = auth.role
 
     #user delete path
-    token_user_details = await jwt_manager.decode_token(token)
-    token_user_id = token_user_details.get("sub", None)
+    token_user_id = auth.sub
     if not token_user_id:
         logger.error("invalid user id")
         raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, details= "invalid user_id")
@@ -361,12 +497,14 @@ async def delete_booking(db: db_dependency, token: str, id: str):
                 logger.error(f"Db Error: {e.__class__.__name__}: {e}")
                 raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
             logger.info("booking deleted")
-            return {"message": f"booking with id {id} deleted"}
+            return {"message": f"booking with id {id} deleted", "service_id": result.service_id}
         else:
             logger.error("user not authorized")
             raise HTTPException(status_code= status.HTTP_403_FORBIDDEN, detail="you can only delete a booking you created")
     #admin delete path
     if token_role == RoleEnum.ADMIN.value:
+        #the review would go with the booking through the cascade, uncount it on the service first
+        service_ids = await remove_reviews(db, Reviews.booking_id == id)
         try:
             del_booking_stmt = delete(Bookings).where(Bookings.id == id)
             await db.execute(del_booking_stmt)
@@ -377,4 +515,4 @@ async def delete_booking(db: db_dependency, token: str, id: str):
             raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
         logger.info("booking deleted")
         
-        return {"message": f"booking with id {id} deleted"}
\ No newline at end of file
+        return {"message": f"booking with id {id} deleted", "service_id": result.service_id if result is not None else None, "service_ids": service_ids}
\ No newline at end of file
@@ -0,0 +1,84 @@
+import os
+import asyncio
+import argparse
+from datetime import datetime, timezone
+from sqlalchemy import select, update, case, literal
+from dotenv import load_dotenv
+from database.config import Session, engine
+from database.models import Bookings
+from shared import StatusEnum
+from utils.logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("booking expiry")
+
+BOOKING_EXPIRY_INTERVAL_SECONDS = int(os.getenv("BOOKING_EXPIRY_INTERVAL_SECONDS", "60"))   #0 disables the in-app scheduler
+BOOKING_EXPIRY_BATCH_SIZE = int(os.getenv("BOOKING_EXPIRY_BATCH_SIZE", "500"))
+
+#bookings in these statuses still need a terminal status once their end_time passes
+ACTIVE_STATUSES = (StatusEnum.PENDING, StatusEnum.CONFIRMED)
+
+
+async def expire_bookings(batch_size: int = BOOKING_EXPIRY_BATCH_SIZE) -> int:
+    """Move bookings that have ended to their terminal status, one short transaction per batch.
+
+    Pending bookings become cancelled, confirmed ones completed. Rows locked by another
+    worker (or a request) are skipped and picked up on a later run.
+    """
+    logger.info("expire ended bookings")
+    total = 0
+    while True:
+        now = datetime.now(tz= timezone.utc)
+        #served by the partial ix_bookings_active_end_time index, oldest first
+        batch = (select(Bookings.id)
+                 .where(Bookings.status.in_(ACTIVE_STATUSES), Bookings.end_time < now)
+                 .order_by(Bookings.end_time)
+                 .limit(batch_size)
+                 .with_for_update(skip_locked= True)
+                 .scalar_subquery())
+        new_status = case((Bookings.status == StatusEnum.PENDING, literal(StatusEnum.CANCELLED, Bookings.status.type)),
+                          else_= literal(StatusEnum.COMPLETED, Bookings.status.type))
+        stmt = (update(Bookings)
+                .where(Bookings.id.in_(batch))
+                .values(status= new_status)
+                .execution_options(synchronize_session= False))
+        async with Session() as db:
+            result_obj = await db.execute(stmt)
+            await db.commit()
+        total += result_obj.rowcount
+        if result_obj.rowcount < batch_size:
+            break
+        #let request handlers in between batches
+        await asyncio.sleep(0)
+    logger.info(f"expired {total} bookings")
+    return total
+
+
+async def _run(once: bool, interval: int, batch_size: int) -> None:
+    try:
+        while True:
+            try:
+                await expire_bookings(batch_size)
+            except Exception as e:
+                if once:
+                    raise
+                logger.error(f"booking expiry Error: {e.__class__.__name__}: {e}")
+            if once:
+                return
+            await asyncio.sleep(interval)
+    finally:
+        await engine.dispose()
+
+def main() -> None:
+    #standalone worker: python -m src.bookings.expiry [--once]
+    parser = argparse.ArgumentParser(description= "Move ended bookings to their terminal status")
+    parser.add_argument("--once", action= "store_true", help= "run a single pass and exit")
+    parser.add_argument("--interval", type= int, default= BOOKING_EXPIRY_INTERVAL_SECONDS or 60, help= "seconds between passes")
+    parser.add_argument("--batch-size", type= int, default= BOOKING_EXPIRY_BATCH_SIZE, help= "rows updated per transaction")
+    args = parser.parse_args()
+    asyncio.run(_run(args.once, args.interval, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import os
+import io
+import csv
+import json
+from typing import AsyncIterator, Optional
+from datetime import datetime
+from sqlalchemy import select, and_
+from dotenv import load_dotenv
+from database.config import ReadSession
+from database.models import Bookings
+from shared import StatusEnum, ExportFormat
+from src.bookings.bookings import booking_filters
+from utils.manager import AuthContext, check_if_admin
+from utils.logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("booking export")
+
+BOOKINGS_EXPORT_BATCH_SIZE = int(os.getenv("BOOKINGS_EXPORT_BATCH_SIZE", "1000"))
+
+EXPORT_COLUMNS = ("id", "user_id", "service_id", "start_time", "end_time", "status", "created_at")
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv"
+}
+
+
+def _to_record(row) -> dict:
+    return {
+        "id": str(row.id),
+        "user_id": str(row.user_id),
+        "service_id": str(row.service_id),
+        "start_time": row.start_time.isoformat(),
+        "end_time": row.end_time.isoformat(),
+        "status": row.status.value,
+        "created_at": row.created_at.isoformat()
+    }
+
+def _format_chunk(records: list, export_format: ExportFormat) -> str:
+    if export_format == ExportFormat.NDJSON:
+        return "".join(json.dumps(record) + "\n" for record in records)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames= EXPORT_COLUMNS)
+    writer.writerows(records)
+    return buffer.getvalue()
+
+async def _stream_bookings(export_format: ExportFormat, filters: list) -> AsyncIterator[str]:
+    if export_format == ExportFormat.CSV:
+        yield ",".join(EXPORT_COLUMNS) + "\r\n"
+    stmt = (select(*(getattr(Bookings, column) for column in EXPORT_COLUMNS))
+            .where(and_(*filters))
+            .order_by(Bookings.created_at, Bookings.id)
+            .execution_options(yield_per= BOOKINGS_EXPORT_BATCH_SIZE))
+    total = 0
+    #the response outlives the request's dependencies, so the stream owns its session.
+    #a server side cursor keeps only one batch of rows in memory at a time
+    async with ReadSession() as db:
+        try:
+            result = await db.stream(stmt)
+            async for partition in result.partitions():
+                yield _format_chunk([_to_record(row) for row in partition], export_format)
+                total += len(partition)
+        except Exception as e:
+            #headers are already sent, all we can do is cut the stream short
+            logger.error(f"Db Error: {e.__class__.__name__}: {e}")
+            raise
+    logger.info(f"bookings export finished, {total} rows")
+
+async def export_bookings(auth: AuthContext,
+                          export_format: ExportFormat = ExportFormat.NDJSON,
+                          bookings_status: Optional[StatusEnum] = None,
+                          bookings_from: Optional[datetime] = None,
+                          bookings_to: Optional[datetime] = None) -> AsyncIterator[str]:
+    logger.info("export bookings")
+    await check_if_admin(auth)
+    filters = booking_filters(bookings_status, bookings_from, bookings_to)
+    return _stream_bookings(export_format, filters)
@@ -0,0 +1,133 @@
+import os
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import datetime, timezone
+from uuid import UUID
+from redis.exceptions import RedisError
+from dotenv import load_dotenv
+from database.config import redis_client, redis_pipeline
+from utils.logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("booking holds")
+
+HOLD_DEFAULT_SECONDS = int(os.getenv("HOLD_DEFAULT_SECONDS", "120"))
+HOLD_MAX_SECONDS = int(os.getenv("HOLD_MAX_SECONDS", "600"))
+
+#drops expired holds, then adds the new one unless it overlaps a live hold. all in one atomic step.
+#KEYS[1] sorted set hold_id -> expiry (ms), KEYS[2] hash hold_id -> "start:end:user_id" (ms)
+#ARGV: now, hold_id, start, end, expires_at, user_id
+_HOLD_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+for _, hold_id in ipairs(expired) do redis.call('HDEL', KEYS[2], hold_id) end
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+local start, finish = tonumber(ARGV[3]), tonumber(ARGV[4])
+local holds = redis.call('HGETALL', KEYS[2])
+for i = 1, #holds, 2 do
+    local hold_start, hold_end = string.match(holds[i + 1], '^(%d+):(%d+):')
+    if tonumber(hold_start) < finish and start < tonumber(hold_end) then return 0 end
+end
+redis.call('ZADD', KEYS[1], ARGV[5], ARGV[2])
+redis.call('HSET', KEYS[2], ARGV[2], ARGV[3] .. ':' .. ARGV[4] .. ':' .. ARGV[6])
+local last = redis.call('ZRANGE', KEYS[1], -1, -1, 'WITHSCORES')
+redis.call('PEXPIREAT', KEYS[1], last[2])
+redis.call('PEXPIREAT', KEYS[2], last[2])
+return 1
+"""
+
+
+def _ms(value: datetime) -> int:
+    return int(value.timestamp() * 1000)
+
+def _keys(service_id: UUID) -> Tuple[str, str]:
+    #the hash tag keeps both keys of a service on one cluster slot, as the script needs
+    return f"holds:{{{service_id}}}", f"holds:{{{service_id}}}:ranges"
+
+
+class SlotHolds():
+    """Short-lived reservations of a service time range, kept only in Redis.
+
+    A hold is granted atomically by a Lua script when it overlaps no live hold of the same
+    service. Expired holds are dropped lazily by the next hold on that service, and the keys
+    themselves expire with the last hold. A booking created with a hold_id skips the conflict
+    checks and converts the hold; other bookings of the same range are refused while it lives.
+    Postgres stays the source of truth, the exclusion constraint still guards every insert.
+    """
+
+    def __init__(self) -> None:
+        self._script = redis_client.register_script(_HOLD_SCRIPT)
+
+    async def hold(self, service_id: UUID, user_id: str, start_time: datetime, end_time: datetime, ttl_seconds: int) -> Optional[dict]:
+        """Hold a range for ttl_seconds, None if it overlaps another live hold."""
+        now = datetime.now(tz= timezone.utc)
+        hold_id = uuid.uuid4()
+        expires_at = _ms(now) + ttl_seconds * 1000
+        granted = await self._script(keys= _keys(service_id),
+                                     args= [_ms(now), str(hold_id), _ms(start_time), _ms(end_time), expires_at, user_id])
+        if not granted:
+            return None
+        return {
+            "hold_id": hold_id,
+            "service_id": service_id,
+            "start_time": start_time,
+            "end_time": end_time,
+            "expires_at": datetime.fromtimestamp(expires_at / 1000, tz= timezone.utc)
+        }
+
+    async def get(self, service_id: UUID, hold_id: UUID) -> Optional[dict]:
+        """The live hold with this id, None if it expired, was used or never existed."""
+        zset_key, ranges_key = _keys(service_id)
+        async with redis_pipeline(transaction= True) as pipe:
+            pipe.zscore(zset_key, str(hold_id))
+            pipe.hget(ranges_key, str(hold_id))
+            expires_at, held_range = await pipe.execute()
+        if expires_at is None or held_range is None or expires_at <= _ms(datetime.now(tz= timezone.utc)):
+            return None
+        start, end, user_id = held_range.decode().split(":", 2)
+        return {"start_ms": int(start), "end_ms": int(end), "user_id": user_id}
+
+    async def release(self, service_id: UUID, hold_id: UUID) -> None:
+        zset_key, ranges_key = _keys(service_id)
+        try:
+            async with redis_pipeline(transaction= True) as pipe:
+                pipe.zrem(zset_key, str(hold_id))
+                pipe.hdel(ranges_key, str(hold_id))
+                await pipe.execute()
+        except RedisError as e:
+            #the hold runs out on its own
+            logger.error(f"Redis Error: {e.__class__.__name__}: {e}")
+
+    async def conflicts(self, requests: Iterable[Tuple[UUID, datetime, datetime]], user_id: str) -> List[bool]:
+        """For each (service_id, start, end), whether a live hold of another user overlaps it.
+
+        One round trip for all services. Redis errors are logged and treated as no holds,
+        the exclusion constraint still rejects real overlaps.
+        """
+        requests = list(requests)
+        service_ids = list({service_id for service_id, _, _ in requests})
+        if not service_ids:
+            return []
+        try:
+            async with redis_pipeline() as pipe:
+                for service_id in service_ids:
+                    zset_key, ranges_key = _keys(service_id)
+                    pipe.zrangebyscore(zset_key, _ms(datetime.now(tz= timezone.utc)), "+inf")
+                    pipe.hgetall(ranges_key)
+                results = await pipe.execute()
+        except RedisError as e:
+            logger.error(f"Redis Error: {e.__class__.__name__}: {e}")
+            return [False] * len(requests)
+
+        live: Dict[UUID, List[Tuple[int, int]]] = {}
+        for index, service_id in enumerate(service_ids):
+            live_ids, held_ranges = set(results[2 * index]), results[2 * index + 1]
+            live[service_id] = []
+            for hold_id, held_range in held_ranges.items():
+                start, end, holder = held_range.decode().split(":", 2)
+                if hold_id in live_ids and holder != user_id:
+                    live[service_id].append((int(start), int(end)))
+        return [any(start < _ms(end_time) and _ms(start_time) < end for start, end in live[service_id])
+                for service_id, start_time, end_time in requests]
+
+slot_holds = SlotHolds()
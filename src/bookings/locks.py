@@ -0,0 +1,80 @@
+import os
+import time
+from collections import OrderedDict
+from uuid import UUID
+from fastapi import HTTPException, status
+from sqlalchemy import select, func
+from dotenv import load_dotenv
+from database.config import db_dependency
+from database.errors import get_sqlstate, LOCK_NOT_AVAILABLE
+from utils.metrics import WaitMetrics
+from utils.logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("booking locks")
+
+BOOKING_SERIALIZE = os.getenv("BOOKING_SERIALIZE", "false").lower() == "true"
+BOOKING_LOCK_TIMEOUT_MS = int(os.getenv("BOOKING_LOCK_TIMEOUT_MS", "2000"))
+BOOKING_LOCK_METRICS_MAX_SERVICES = int(os.getenv("BOOKING_LOCK_METRICS_MAX_SERVICES", "1000"))
+
+
+class ServiceLocks():
+    """Per-service transaction advisory locks for the booking path.
+
+    With BOOKING_SERIALIZE enabled, create_booking takes pg_advisory_xact_lock on a hash of
+    the service id before checking for overlaps and inserting, so concurrent bookings of one
+    service queue up instead of racing and aborting. The lock is released when the request's
+    transaction ends. Waiting longer than BOOKING_LOCK_TIMEOUT_MS fails fast with 409.
+
+    Lock waits are recorded per service (per worker process), keeping only the most recently
+    booked BOOKING_LOCK_METRICS_MAX_SERVICES services.
+    """
+
+    def __init__(self, enabled: bool = BOOKING_SERIALIZE, timeout_ms: int = BOOKING_LOCK_TIMEOUT_MS, max_services: int = BOOKING_LOCK_METRICS_MAX_SERVICES) -> None:
+        self.enabled = enabled
+        self.timeout_ms = timeout_ms
+        self.max_services = max_services
+        self._metrics: "OrderedDict[str, WaitMetrics]" = OrderedDict()
+
+    def _metrics_for(self, service_id: str) -> WaitMetrics:
+        metrics = self._metrics.get(service_id)
+        if metrics is None:
+            metrics = self._metrics[service_id] = WaitMetrics("acquisitions", window= 200)
+            if len(self._metrics) > self.max_services:
+                self._metrics.popitem(last= False)
+        else:
+            self._metrics.move_to_end(service_id)
+        return metrics
+
+    async def acquire(self, db: db_dependency, service_id: UUID) -> None:
+        """Block until this transaction holds the service's lock, 409 after the lock timeout."""
+        key = str(service_id)
+        metrics = self._metrics_for(key)
+        start = time.perf_counter()
+        try:
+            #lock_timeout is transaction local, it only bounds waits inside this request
+            await db.execute(select(func.set_config("lock_timeout", f"{self.timeout_ms}ms", True)))
+            await db.execute(select(func.pg_advisory_xact_lock(func.hashtextextended(key, 0))))
+        except Exception as e:
+            await db.rollback()
+            if get_sqlstate(e) == LOCK_NOT_AVAILABLE:
+                metrics.timeouts += 1
+                metrics.record(time.perf_counter() - start)
+                logger.error(f"timed out waiting for the booking lock of service {key}")
+                raise HTTPException(status_code= status.HTTP_409_CONFLICT, detail= "Requested service is busy, try again")
+            logger.error(f"Db Error: {e.__class__.__name__}: {e}")
+            raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+        metrics.record(time.perf_counter() - start)
+
+    def stats(self, top: int = 20) -> dict:
+        services = sorted(self._metrics.items(), key= lambda item: item[1].total_wait, reverse= True)[:top]
+        return {
+            "enabled": self.enabled,
+            "lock_timeout_ms": self.timeout_ms,
+            "tracked_services": len(self._metrics),
+            #most contended first
+            "services": [{"service_id": service_id, **metrics.stats()} for service_id, metrics in services]
+        }
+
+service_locks = ServiceLocks()
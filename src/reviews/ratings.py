@@ -0,0 +1,89 @@
+from typing import List, Optional
+from uuid import UUID
+from fastapi import HTTPException, status
+from sqlalchemy import select, update, delete, func
+from database.config import db_dependency
+from database.models import Services, Reviews
+from utils.logger import get_logger
+
+logger = get_logger("ratings")
+
+#per star counters on services
+RATING_COLUMNS = {1: "rating_1", 2: "rating_2", 3: "rating_3", 4: "rating_4", 5: "rating_5"}
+
+
+async def _apply(db: db_dependency, stmt) -> Optional[UUID]:
+    try:
+        result_obj = await db.execute(stmt)
+        service_id = result_obj.scalar_one_or_none()
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Db Error: {e.__class__.__name__}: {e}")
+        raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+    return service_id
+
+async def add_rating(db: db_dependency, service_id: UUID, rating: int) -> Optional[UUID]:
+    """Count a new review of the service. Returns the service id."""
+    #relative updates, concurrent reviews of one service serialize on its row instead of losing counts
+    stmt = (update(Services)
+            .where(Services.id == service_id)
+            .values({Services.rating_count: Services.rating_count + 1,
+                     Services.rating_sum: Services.rating_sum + rating,
+                     getattr(Services, RATING_COLUMNS[rating]): getattr(Services, RATING_COLUMNS[rating]) + 1})
+            .returning(Services.id))
+    return await _apply(db, stmt)
+
+async def change_rating(db: db_dependency, service_id: UUID, old_rating: int, new_rating: int) -> Optional[UUID]:
+    """Move one review of the service from old_rating to new_rating. Returns the service id."""
+    values = {Services.rating_sum: Services.rating_sum + (new_rating - old_rating)}
+    if old_rating != new_rating:
+        values[getattr(Services, RATING_COLUMNS[old_rating])] = getattr(Services, RATING_COLUMNS[old_rating]) - 1
+        values[getattr(Services, RATING_COLUMNS[new_rating])] = getattr(Services, RATING_COLUMNS[new_rating]) + 1
+    stmt = update(Services).where(Services.id == service_id).values(values).returning(Services.id)
+    return await _apply(db, stmt)
+
+async def remove_reviews(db: db_dependency, *review_filters) -> List[UUID]:
+    """Delete the reviews matching review_filters and uncount them. Returns the affected service ids.
+
+    One statement, the delete feeds the update through a CTE, so a review deleted twice
+    concurrently is only uncounted once and deleting many reviews (a booking, an account)
+    costs no extra round trips.
+    """
+    removed = (delete(Reviews)
+               .where(*review_filters)
+               .returning(Reviews.service_id, Reviews.rating)
+               .cte("removed"))
+    totals = (select(removed.c.service_id,
+                     func.count().label("count"),
+                     func.sum(removed.c.rating).label("sum"),
+                     *(func.count().filter(removed.c.rating == star).label(column) for star, column in RATING_COLUMNS.items()))
+              .group_by(removed.c.service_id)
+              .subquery())
+    values = {Services.rating_count: Services.rating_count - totals.c.count,
+              Services.rating_sum: Services.rating_sum - totals.c.sum}
+    for column in RATING_COLUMNS.values():
+        values[getattr(Services, column)] = getattr(Services, column) - totals.c[column]
+    stmt = (update(Services)
+            .where(Services.id == totals.c.service_id)
+            .values(values)
+            .returning(Services.id)
+            .add_cte(removed)
+            #nothing in the session to keep in step, and the orm cannot evaluate an update ... from a cte
+            .execution_options(synchronize_session= False))
+    try:
+        result_obj = await db.execute(stmt)
+        service_ids = result_obj.scalars().all()
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Db Error: {e.__class__.__name__}: {e}")
+        raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+    return service_ids
+
+def rating_summary(service) -> dict:
+    #aggregates as returned with a service
+    return {
+        "rating_count": service.rating_count,
+        "rating_sum": service.rating_sum,
+        "rating_average": round(service.rating_sum / service.rating_count, 2) if service.rating_count else None,
+        "rating_histogram": {str(star): getattr(service, column) for star, column in RATING_COLUMNS.items()}
+    }
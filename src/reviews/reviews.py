@@ -1,17 +1,28 @@
+import os
+from typing import Optional
+from uuid import UUID
+from datetime import datetime
 from fastapi import HTTPException, status
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, insert, update, and_, desc, tuple_
+from dotenv import load_dotenv
 from schemas.reviews.reviews import CreateReview, CreateReviewResponseModel, UpdateReview, UpdateReviewResponseModel
 from database.config import db_dependency
-from utils.manager import jwt_manager, if_user_dependency
+from utils.manager import AuthContext
 from database.models import Bookings, Reviews
+from src.reviews.ratings import add_rating, change_rating, remove_reviews
 from shared import StatusEnum, RoleEnum
+from utils.pagination import encode_cursor, decode_cursor
 from utils.logger import get_logger
 
+load_dotenv()
+
 logger = get_logger("review")
-async def create_review(db: db_dependency, token: if_user_dependency, details: CreateReview) -> CreateReviewResponseModel:
-    validated_token = await jwt_manager.validate_token(db, token)
-    token_details: dict = await jwt_manager.decode_token(validated_token)
-    token_user_id = token_details.get("sub")
+
+REVIEWS_PAGE_SIZE = int(os.getenv("REVIEWS_PAGE_SIZE", "20"))
+REVIEWS_PAGE_MAX = int(os.getenv("REVIEWS_PAGE_MAX", "100"))
+
+async def create_review(db: db_dependency, auth: AuthContext, details: CreateReview) -> CreateReviewResponseModel:
+    token_user_id = auth.sub
     if not token_user_id:
         logger.info("invalid user")
         raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, detail= "invalid user")
@@ -49,71 +60,92 @@ async def create_review(db: db_dependency, token: if_user_dependency, details: C
         logger.error("booking review already existed")
         raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, detail="booking review already exist")
     
-    #add review to database
-    to_add = Reviews(booking_id = user_booking_id, rating= details.rating, comment= details.comment)
+    #add review to database and read it back in the same statement
     try:
-        db.add(to_add)
-        await db.flush()
-    except Exception as e:
-        logger.error(f"Db Error: {e.__class__.__name__}: {e}")
-        raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
-    
-    #get review details from db to return to user
-    try:
-        stmt3 = select(Reviews).where(Reviews.booking_id == user_booking_id and Reviews.rating == details.rating and Reviews.comment == details.comment)
+        stmt3 = insert(Reviews).values(booking_id = user_booking_id, service_id= result1.service_id, rating= details.rating, comment= details.comment).returning(Reviews)
         result3_obj = await db.execute(stmt3)
-        result3 = result3_obj.scalar_one_or_none()
+        result3 = result3_obj.scalar_one()
     except Exception as e:
+        await db.rollback()
         logger.error(f"Db Error: {e.__class__.__name__}: {e}")
         raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+    #count it on the service in the same transaction
+    service_id = await add_rating(db, result3.service_id, result3.rating)
     
     to_return = {
         "id": result3.id,
         "booking_id": result3.booking_id,
         "rating": result3.rating,
         "comment": result3.comment,
-        "created_at": result3.created_at
+        "created_at": result3.created_at,
+        "service_id": service_id
     }
     logger.info("review created")
     return to_return
 
-async def get_reviews_for_service(db: db_dependency, token: str, id: str):
+async def get_reviews_for_service(db: db_dependency,
+                                  auth: AuthContext,
+                                  id: str,
+                                  min_rating: Optional[int] = None,
+                                  limit: int = REVIEWS_PAGE_SIZE,
+                                  cursor: Optional[str] = None):
     logger.info("get review for service")
-    await jwt_manager.validate_token(db, token)
+    filters = [Reviews.service_id == id]
+    if min_rating is not None:
+        filters.append(Reviews.rating >= min_rating)
+    #keyset pagination, newest first. the cursor is the (created_at, id) of the last row already sent
+    if cursor is not None:
+        cursor_created_at, cursor_id = decode_cursor(cursor, (datetime.fromisoformat, UUID))
+        filters.append(tuple_(Reviews.created_at, Reviews.id) < tuple_(cursor_created_at, cursor_id))
 
+    #the page's keys come from ix_reviews_service_id_created_at_id alone, read in index order and
+    #stopping after limit + 1 entries. only those rows are then fetched in full
+    page_keys = (select(Reviews.id)
+                 .where(and_(*filters))
+                 .order_by(desc(Reviews.created_at), desc(Reviews.id))
+                 .limit(limit + 1)
+                 .subquery())
     try:
-        stmt1 = select(Reviews).join(Bookings, Reviews.booking_id == Bookings.id).where(Bookings.service_id == id)
+        stmt1 = (select(Reviews)
+                 .join(page_keys, Reviews.id == page_keys.c.id)
+                 .order_by(desc(Reviews.created_at), desc(Reviews.id)))
         stmt1_result_cls = await db.execute(stmt1)
         stmt1_result_obj = stmt1_result_cls.scalars().all()
     except Exception as e:
         logger.error(f"Db Error: {e.__class__.__name__}: {e}")
         raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
     
-    if not stmt1_result_obj:
+    #a later page can run out, only an empty first page means there is nothing to show
+    if not stmt1_result_obj and cursor is None:
         logger.error("review not found")
         raise HTTPException(status_code= status.HTTP_404_NOT_FOUND, detail="review not found")
-    logger.error("get review for service request completed")
-    return stmt1_result_obj
+    #one extra row tells us whether there is another page
+    items = stmt1_result_obj[:limit]
+    next_cursor = encode_cursor((items[-1].created_at, items[-1].id)) if len(stmt1_result_obj) > limit else None
+    logger.info("get review for service request completed")
+    return {"items": items, "next_cursor": next_cursor}
 
-async def update_review(db: db_dependency, token: str, id: str, details: UpdateReview) -> UpdateReviewResponseModel:
+async def update_review(db: db_dependency, auth: AuthContext, id: str, details: UpdateReview) -> UpdateReviewResponseModel:
     logger.info("update review")
-    validated_token = await jwt_manager.validate_token(db, token)
-    token_details: dict = await jwt_manager.decode_token(validated_token)
-    token_user_id = token_details.get("sub")
+    token_user_id = auth.sub
     if not token_user_id:
         logger.error("invalid user")
         raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, detail= "invalid user")
     try:
-        stmt1 = select(Reviews, Bookings.user_id).join(Bookings, Reviews.booking_id == Bookings.id).where(Reviews.id == id)
+        #lock the review so concurrent edits apply their rating change to the service one after another
+        stmt1 = select(Reviews, Bookings.user_id).join(Bookings, Reviews.booking_id == Bookings.id).where(Reviews.id == id).with_for_update(of= Reviews)
         stmt1_result_cls = await db.execute(stmt1)
         stmt1_result_obj = stmt1_result_cls.one_or_none()
     except Exception as e:
         logger.error(f"Db Error: {e.__class__.__name__}: {e}")
         raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
     
-    if stmt1_result_obj:
-        review = stmt1_result_obj[0]
-        user_id = stmt1_result_obj[1]
+    if stmt1_result_obj is None:
+        logger.error("review not found")
+        raise HTTPException(status_code= status.HTTP_404_NOT_FOUND, detail="review not found")
+    review = stmt1_result_obj[0]
+    user_id = stmt1_result_obj[1]
+    old_rating = review.rating
 
     if str(user_id) != token_user_id:
         logger.error("user not authorized")
@@ -123,48 +155,37 @@ async def update_review(db: db_dependency, token: str, id: str, details: UpdateR
     new_comment = details.comment if details.comment else review.comment
 
     try:
-        stmt2= (update(Reviews).where(Reviews.id == id).values(rating= new_rating, comment= new_comment))
-        await db.execute(stmt2)
-        await db.flush()
+        #the review is already in the session from the ownership check, populate_existing makes RETURNING overwrite it
+        stmt2= (update(Reviews).where(Reviews.id == id).values(rating= new_rating, comment= new_comment).returning(Reviews)
+                .execution_options(populate_existing= True))
+        stmt2_result_obj = await db.execute(stmt2)
+        stmt3_result = stmt2_result_obj.scalar_one()
     except Exception as e:
         await db.rollback()
         logger.error(f"Db Error: {e.__class__.__name__}: {e}")
         raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
-    
-    try:
-        stmt3 = select(Reviews).where(Reviews.id == id)
-        stmt3_result_obj = await db.execute(stmt3)
-        stmt3_result = stmt3_result_obj.scalar_one_or_none()
-    except Exception as e:
-        logger.error(f"Db Error: {e.__class__.__name__}: {e}")
-        raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+    service_id = await change_rating(db, stmt3_result.service_id, old_rating, stmt3_result.rating)
 
     to_return = {
         "id": stmt3_result.id,
         "booking_id": str(stmt3_result.booking_id),
         "rating": stmt3_result.rating,
         "comment": stmt3_result.comment,
-        "created_at": stmt3_result.created_at
+        "created_at": stmt3_result.created_at,
+        "service_id": service_id
     }
     logger.error("review updated")
     return to_return
 
-async def delete_review(db:db_dependency, token: str, id: str):
+async def delete_review(db:db_dependency, auth: AuthContext, id: str):
     logger.info("delete review")
-    validated_token = await jwt_manager.validate_token(db, token)
-    role = await jwt_manager.check_role(db, validated_token)
+    role = auth.role
 
     if role not in (RoleEnum.ADMIN.value, RoleEnum.USER.value):
         logger.error("user not authenticated")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="you're not allowed to perform this action")
     
-    try:
-        stmt = delete(Reviews).where(Reviews.id == id)
-        await db.execute(stmt)
-        await db.flush()
-    except Exception as e:
-        await db.rollback()
-        logger.error(f"Db Error: {e.__class__.__name__}: {e}")
-        raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+    #deletes the review and uncounts it on the service in one statement
+    service_ids = await remove_reviews(db, Reviews.id == id)
     logger.info("review deleted")
-    return {"message": "Review deleted"}
\ No newline at end of file
+    return {"message": "Review deleted", "service_id": service_ids[0] if service_ids else None}
\ No newline at end of file
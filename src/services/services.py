@@ -1,42 +1,51 @@
+import os
+import json
+import hashlib
 from fastapi import status, HTTPException, Query
 from decimal import Decimal
 from typing import Union, Optional
 from uuid import UUID
-from sqlalchemy import select, update, delete, and_
-from sqlalchemy.orm.exc import MultipleResultsFound
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, insert, update, delete, and_, or_, desc, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
 from database.config import db_dependency
-from database.models import Services
-from utils.manager import jwt_manager, token_dependency, check_if_admin
+from database.models import Services, Bookings
+from utils.manager import AuthContext, check_if_admin
 from schemas.services.services import CreateService, UpdateService
-from shared import IsActiveEnum
+from shared import IsActiveEnum, StatusEnum
+from utils.cache import response_cache
+from src.reviews.ratings import rating_summary
+from utils.pagination import encode_cursor, decode_cursor
 from utils.logger import get_logger
 
+load_dotenv()
+
 logger = get_logger("service")
 
+AVAILABILITY_CACHE_SECONDS = int(os.getenv("AVAILABILITY_CACHE_SECONDS", "15"))
+AVAILABILITY_MAX_WINDOW_DAYS = int(os.getenv("AVAILABILITY_MAX_WINDOW_DAYS", "31"))
+SERVICE_CACHE_SECONDS = int(os.getenv("SERVICE_CACHE_SECONDS", "300"))
+SEARCH_SIMILARITY_THRESHOLD = float(os.getenv("SEARCH_SIMILARITY_THRESHOLD", "0.3"))
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+SEARCH_PAGE_MAX = int(os.getenv("SEARCH_PAGE_MAX", "100"))
+AVAILABILITY_KEY_PREFIX = "availability:"
+SERVICE_DETAIL_KEY_PREFIX = "services:detail:"
+SERVICE_QUERY_KEY_PREFIX = "services:query:"
+SERVICE_SEARCH_KEY_PREFIX = "services:search:"
+#every cached catalog listing, dropped on any service write
+SERVICE_CATALOG_TAG = "services:catalog"
+
 
-async def create_service(db: db_dependency, token: str, details: CreateService):
+async def create_service(db: db_dependency, auth: AuthContext, details: CreateService):
     logger.info("create service")
-    #validate token
-    await jwt_manager.validate_token(db= db,token= token)
-    await check_if_admin(db, token)
-    to_add = Services(**details.model_dump())
-    try:
-        db.add(to_add)
-        await db.flush()
-    except Exception as e:
-        await db.rollback()
-        logger.error(f"Db Error: {e.__class__.__name__}: {e}")
-        raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
-    
-    #get the service detail from db
+    await check_if_admin(auth)
     try:
-        stmt = select(Services).where((Services.title == details.title) & (Services.description == details.description) & (Services.price == details.price))
+        stmt = insert(Services).values(**details.model_dump()).returning(Services)
         result_cls = await db.execute(stmt)
-        result_obj = result_cls.scalar_one_or_none()
-    except MultipleResultsFound as m:
-        logger.error(f"Idempotency Error: {m.__class__.__name__}: {m}")
-        raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, detail="idempotency error")
+        result_obj = result_cls.scalar_one()
     except Exception as e:
+        await db.rollback()
         logger.error(f"Db Error: {e.__class__.__name__}: {e}")
         raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
     
@@ -52,44 +61,70 @@ async def create_service(db: db_dependency, token: str, details: CreateService):
         "created_at": result_obj.created_at
     }
 
-async def get_service_by_id(db: db_dependency, token: token_dependency, id: Union[UUID, str]):
-    logger.info("get service by id")
-    #validate token
-    await jwt_manager.validate_token(db=db, token= str(token))
-    #search service db using id
-    try:
-        stmt= select(Services).where(Services.id == id)
-        result_cls = await db.execute(stmt)
-        result_obj = result_cls.scalar_one_or_none()
-    except Exception as e:
-        logger.error(f"Db Error: {e.__class__.__name__}: {e}")
-        raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
-    
-    if not result_obj:
-        logger.error("service not found")
-        raise HTTPException(status_code= status.HTTP_404_NOT_FOUND, detail="service not found")
-    logger.info("get service by id request successful")
+def _service_to_dict(service: Services) -> dict:
     return {
-        "id": result_obj.id,
-        "title": result_obj.title,
-        "description": result_obj.description,
-        "price": result_obj.price,
-        "duration_mins": result_obj.duration_mins,
-        "is_active": result_obj.is_active,
-        "created_at": result_obj.created_at
+        "id": service.id,
+        "title": service.title,
+        "description": service.description,
+        "price": service.price,
+        "duration_mins": service.duration_mins,
+        "is_active": service.is_active,
+        "created_at": service.created_at,
+        **rating_summary(service)
     }
 
+def _normalize_id(id: Union[UUID, str]) -> str:
+    #the same service is cached under one key however the client spelled its uuid
+    try:
+        return str(UUID(str(id)))
+    except ValueError:
+        return str(id)
+
+async def invalidate_service_cache(*ids: Union[UUID, str], availability: bool = True) -> None:
+    #call after the write is committed, otherwise a concurrent read can cache the old row again
+    keys, tags = [], [SERVICE_CATALOG_TAG]
+    for id in ids:
+        keys.append(f"{SERVICE_DETAIL_KEY_PREFIX}{_normalize_id(id)}")
+        #availability depends on duration_mins and is_active, review writes leave it alone
+        if availability:
+            tags.append(f"{AVAILABILITY_KEY_PREFIX}{_normalize_id(id)}")
+    await response_cache.invalidate(keys= keys, tags= tags)
+
+async def invalidate_availability_cache(*ids: Union[UUID, str]) -> None:
+    #booking writes change which slots are free, the service itself and the catalog stay the same
+    await response_cache.invalidate(tags= [f"{AVAILABILITY_KEY_PREFIX}{_normalize_id(id)}" for id in ids])
+
+async def get_service_by_id(db: db_dependency, auth: AuthContext, id: Union[UUID, str]):
+    logger.info("get service by id")
+
+    async def load_service(db: AsyncSession):
+        #search service db using id
+        try:
+            stmt= select(Services).where(Services.id == id)
+            result_cls = await db.execute(stmt)
+            result_obj = result_cls.scalar_one_or_none()
+        except Exception as e:
+            logger.error(f"Db Error: {e.__class__.__name__}: {e}")
+            raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+        
+        if not result_obj:
+            logger.error("service not found")
+            raise HTTPException(status_code= status.HTTP_404_NOT_FOUND, detail="service not found")
+        return _service_to_dict(result_obj)
+
+    result = await response_cache.get_or_load(db, f"{SERVICE_DETAIL_KEY_PREFIX}{_normalize_id(id)}", load_service, ttl= SERVICE_CACHE_SECONDS)
+    logger.info("get service by id request successful")
+    return result
+
 async def get_services_by_query(db: db_dependency,
-                                token: token_dependency,
+                                auth: AuthContext,
                                 q: Optional[str] = Query(None),
                                 price_min: Optional[Decimal] = Query(None),
                                 price_max: Optional[Decimal] = Query(None),
-                                active: Optional[IsActiveEnum] = Query(None)):
+                                active: Optional[IsActiveEnum] = Query(None),
+                                threshold: float = SEARCH_SIMILARITY_THRESHOLD):
     
     logger.info("get service by query")
-    #validate_token
-    await jwt_manager.validate_token(db,token)
-
     try:
         stmt = select(Services)
     except Exception as e:
@@ -97,9 +132,14 @@ async def get_services_by_query(db: db_dependency,
         raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
     
     filters = []
-
+    
     if q is not None:
-        filters.append(Services.title.ilike(f"%{q}%"))
+        #substring or trigram similarity match, all three served by the gin trigram indexes.
+        #`%` compares against pg_trgm.similarity_threshold, set per transaction below
+        filters.append(or_(Services.title.ilike(f"%{q}%"),
+                           Services.title.op("%")(q),
+                           Services.description.op("%")(q)))
+        stmt = stmt.order_by(desc(func.greatest(func.similarity(Services.title, q), func.coalesce(func.similarity(Services.description, q), 0))), Services.id)
     if price_min is not None:
         filters.append(Services.price >= price_min)
     if price_max is not None:
@@ -109,23 +149,91 @@ async def get_services_by_query(db: db_dependency,
     
     if filters:
         stmt = stmt.where(and_(*filters))
-    
-    try:
-        result_cls = await db.execute(stmt)
-        result = result_cls.scalars().all()
-    except Exception as e:
-        logger.error(f"Db Error: {e.__class__.__name__}: {e}")
-        raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+
+    async def load_services(db: AsyncSession):
+        try:
+            if q is not None:
+                await db.execute(select(func.set_config("pg_trgm.similarity_threshold", str(threshold), True)))
+            result_cls = await db.execute(stmt)
+            result = result_cls.scalars().all()
+        except Exception as e:
+            logger.error(f"Db Error: {e.__class__.__name__}: {e}")
+            raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+        return [_service_to_dict(service) for service in result]
+
+    #equivalent parameter sets share an entry: ilike ignores case, decimals compare by value
+    params = {
+        "q": q.lower() if q is not None else None,
+        "price_min": str(price_min.normalize()) if price_min is not None else None,
+        "price_max": str(price_max.normalize()) if price_max is not None else None,
+        "active": active.value if active is not None else None,
+        "threshold": threshold if q is not None else None
+    }
+    key = SERVICE_QUERY_KEY_PREFIX + hashlib.sha256(json.dumps(params, sort_keys= True).encode()).hexdigest()
+    result = await response_cache.get_or_load(db, key, load_services, ttl= SERVICE_CACHE_SECONDS, tags= [SERVICE_CATALOG_TAG])
     logger.info("get service by query request successful")
     
     return result
 
 
-async def update_service(db: db_dependency, token: str, id: str, details: UpdateService):
+async def search_services(db: db_dependency,
+                          auth: AuthContext,
+                          q: str,
+                          price_min: Optional[Decimal] = None,
+                          price_max: Optional[Decimal] = None,
+                          active: Optional[IsActiveEnum] = None,
+                          limit: int = SEARCH_PAGE_SIZE,
+                          cursor: Optional[str] = None):
+    logger.info("search services")
+    #websearch syntax: "quoted phrases", OR, -excluded words
+    ts_query = func.websearch_to_tsquery("english", q)
+    rank = func.ts_rank(Services.search_vector, ts_query)
+    filters = [Services.search_vector.op("@@")(ts_query)]
+    if price_min is not None:
+        filters.append(Services.price >= price_min)
+    if price_max is not None:
+        filters.append(Services.price <= price_max)
+    if active is not None:
+        filters.append(Services.is_active == active)
+    #keyset pagination, best match first. the cursor is the (rank, id) of the last row already sent
+    if cursor is not None:
+        cursor_rank, cursor_id = decode_cursor(cursor, (float, UUID))
+        filters.append(tuple_(rank, Services.id) < tuple_(cursor_rank, cursor_id))
+
+    async def load_page(db: AsyncSession):
+        try:
+            stmt = (select(Services, rank.label("rank"))
+                    .where(and_(*filters))
+                    .order_by(desc(rank), desc(Services.id))
+                    .limit(limit + 1))
+            result_cls = await db.execute(stmt)
+            rows = result_cls.all()
+        except Exception as e:
+            logger.error(f"Db Error: {e.__class__.__name__}: {e}")
+            raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+        #one extra row tells us whether there is another page
+        page = rows[:limit]
+        return {
+            "items": [{**_service_to_dict(service), "rank": service_rank} for service, service_rank in page],
+            "next_cursor": encode_cursor((page[-1].rank, page[-1].Services.id)) if len(rows) > limit else None
+        }
+
+    params = {
+        "q": q,
+        "price_min": str(price_min.normalize()) if price_min is not None else None,
+        "price_max": str(price_max.normalize()) if price_max is not None else None,
+        "active": active.value if active is not None else None,
+        "limit": limit,
+        "cursor": cursor
+    }
+    key = SERVICE_SEARCH_KEY_PREFIX + hashlib.sha256(json.dumps(params, sort_keys= True).encode()).hexdigest()
+    result = await response_cache.get_or_load(db, key, load_page, ttl= SERVICE_CACHE_SECONDS, tags= [SERVICE_CATALOG_TAG])
+    logger.info("search services request successful")
+    return result
+
+async def update_service(db: db_dependency, auth: AuthContext, id: str, details: UpdateService):
     logger.info("update service")
-    #validate token
-    await jwt_manager.validate_token(db, token)
-    await check_if_admin(db, token)
+    await check_if_admin(auth)
     values = {}
 
     if details.title is not None:
@@ -137,23 +245,22 @@ async def update_service(db: db_dependency, token: str, id: str, details: Update
     if details.duration_mins is not None:
         values["duration_mins"] = details.duration_mins
     
-    if values:
-        try:
-            stmt = (update(Services).where(Services.id == id).values(**values).execution_options(synchronize_session="fetch"))
-            await db.execute(stmt)
-            await db.flush()
-        except Exception as e:
-            await db.rollback()
-            logger.error(f"Db Error: {e.__class__.__name__}: {e}")
-            raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
-    
     try:
-        select_stmt = select(Services).where(Services.id == id)
-        result_cls = await db.execute(select_stmt)
+        if values:
+            stmt = update(Services).where(Services.id == id).values(**values).returning(Services)
+        else:
+            #nothing to change, just read the current row
+            stmt = select(Services).where(Services.id == id)
+        result_cls = await db.execute(stmt)
         result_obj = result_cls.scalar_one_or_none()
     except Exception as e:
+        await db.rollback()
         logger.error(f"Db Error: {e.__class__.__name__}: {e}")
         raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+
+    if result_obj is None:
+        logger.error("service not found")
+        raise HTTPException(status_code= status.HTTP_404_NOT_FOUND, detail="service not found")
     
     to_return = {
         "message": "update successful",
@@ -168,11 +275,9 @@ async def update_service(db: db_dependency, token: str, id: str, details: Update
     logger.info("service updated")
     return to_return
 
-async def delete_service(db: db_dependency, token: str, id: str):
+async def delete_service(db: db_dependency, auth: AuthContext, id: str):
     logger.info("delete service")
-    #validate token
-    await jwt_manager.validate_token(db, token)
-    await check_if_admin(db, token)
+    await check_if_admin(auth)
     #delete service using id
     try:
         stmt= delete(Services).where(Services.id == id)
@@ -183,4 +288,72 @@ async def delete_service(db: db_dependency, token: str, id: str):
         logger.error(f"Db Error: {e.__class__.__name__}: {e}")
         raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
     logger.info("service deleted")
-    return{"message": "service deleted"}
\ No newline at end of file
+    return{"message": "service deleted"}
+
+async def get_service_availability(db: db_dependency,
+                                   auth: AuthContext,
+                                   id: UUID,
+                                   window_start: Optional[datetime] = None,
+                                   window_end: Optional[datetime] = None):
+    logger.info("get service availability")
+    #whole minutes keep the cache key stable for clients that leave `from` out
+    now = datetime.now(tz= timezone.utc).replace(second= 0, microsecond= 0)
+    window_start = max(window_start.astimezone(timezone.utc), now) if window_start else now
+    window_end = window_end.astimezone(timezone.utc) if window_end else window_start + timedelta(days= 1)
+    if window_end <= window_start:
+        logger.error("invalid request parameter")
+        raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, detail="`to` must be after `from` and in the future")
+    if window_end - window_start > timedelta(days= AVAILABILITY_MAX_WINDOW_DAYS):
+        logger.error("invalid request parameter")
+        raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, detail=f"availability window cannot exceed {AVAILABILITY_MAX_WINDOW_DAYS} days")
+
+    cache_key = f"{AVAILABILITY_KEY_PREFIX}{id}:{int(window_start.timestamp())}:{int(window_end.timestamp())}"
+
+    async def load_availability(db: AsyncSession):
+        try:
+            service_stmt = select(Services.duration_mins, Services.is_active).where(Services.id == id)
+            service_result_obj = await db.execute(service_stmt)
+            service = service_result_obj.one_or_none()
+        except Exception as e:
+            logger.error(f"Db Error: {e.__class__.__name__}: {e}")
+            raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+        if service is None:
+            logger.error("service not found")
+            raise HTTPException(status_code= status.HTTP_404_NOT_FOUND, detail="service not found")
+
+        slots = []
+        if service.is_active == IsActiveEnum.TRUE and service.duration_mins > 0:
+            #same predicate as the bookings_no_overlap constraint so its gist index serves the lookup
+            try:
+                bookings_stmt = (select(Bookings.start_time, Bookings.end_time)
+                                 .where(Bookings.service_id == id,
+                                        Bookings.status != StatusEnum.CANCELLED,
+                                        func.tstzrange(Bookings.start_time, Bookings.end_time).op("&&")(func.tstzrange(window_start, window_end)))
+                                 .order_by(Bookings.start_time))
+                bookings_result_obj = await db.execute(bookings_stmt)
+                busy = bookings_result_obj.all()
+            except Exception as e:
+                logger.error(f"Db Error: {e.__class__.__name__}: {e}")
+                raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+
+            #single pass over the busy ranges, filling each gap with back to back slots
+            duration = timedelta(minutes= service.duration_mins)
+            cursor = window_start
+            for busy_start, busy_end in [*busy, (window_end, window_end)]:
+                while cursor + duration <= min(busy_start, window_end):
+                    slots.append({"start_time": cursor.isoformat(), "end_time": (cursor + duration).isoformat()})
+                    cursor += duration
+                cursor = max(cursor, busy_end)
+
+        to_return = {
+            "service_id": str(id),
+            "duration_mins": service.duration_mins,
+            "window_start": window_start.isoformat(),
+            "window_end": window_end.isoformat(),
+            "slots": slots
+        }
+        return to_return
+
+    result = await response_cache.get_or_load(db, cache_key, load_availability, ttl= AVAILABILITY_CACHE_SECONDS, tags= [f"{AVAILABILITY_KEY_PREFIX}{id}"])
+    logger.info("get service availability request successful")
+    return result
@@ -0,0 +1,118 @@
+import os
+import time
+import itertools
+import uuid
+from datetime import datetime, timedelta, timezone
+import pytest
+
+#the app reads its settings at import time, so they are set before anything from it is imported.
+#the suite needs a disposable postgres database, every table in it is dropped and recreated
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+os.environ["DEV_DB_URL"] = TEST_DATABASE_URL or "postgresql+asyncpg://localhost/bookit_test"
+os.environ.pop("DEV_DB_REPLICA_URL", None)
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "5")
+os.environ.setdefault("REFRESH_TOKEN_EXPIRE_MINUTES", "60")
+#every read goes to the database under test
+os.environ["CACHE_ENABLED"] = "false"
+
+import fakeredis
+from sqlalchemy import text
+import database.config
+import utils.cache
+import utils.blacklist
+import utils.idempotency
+import src.bookings.holds
+from database.config import Base, Session, engine
+from database.models import Users, Services, Bookings
+from utils.manager import AuthContext
+from shared import RoleEnum, StatusEnum
+
+
+def pytest_collection_modifyitems(config, items):
+    if TEST_DATABASE_URL:
+        return
+    #only tests that touch the database need one, the rest always run
+    skip = pytest.mark.skip(reason= "set TEST_DATABASE_URL to a disposable postgres database to run these tests")
+    for item in items:
+        if "schema" in getattr(item, "fixturenames", ()):
+            item.add_marker(skip)
+
+@pytest.fixture(scope= "session")
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+async def fake_redis(monkeypatch):
+    #an in-memory redis (lua included) in place of the shared client, for every module that imported it
+    client = fakeredis.FakeAsyncRedis()
+    for module in (database.config, utils.cache, utils.blacklist, utils.idempotency, src.bookings.holds):
+        monkeypatch.setattr(module, "redis_client", client)
+    yield client
+    await client.aclose()
+
+@pytest.fixture(scope= "session")
+async def schema():
+    async with engine.begin() as conn:
+        #bookings_no_overlap needs btree_gist, the services trigram indexes need pg_trgm
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+@pytest.fixture
+async def db(schema):
+    async with Session() as session:
+        yield session
+    async with engine.begin() as conn:
+        await conn.execute(text("TRUNCATE reviews, bookings, services, users, blacklists CASCADE"))
+
+@pytest.fixture
+def make_user(db):
+    async def make(role: RoleEnum = RoleEnum.USER) -> Users:
+        user = Users(full_name= "Test User", email= f"{uuid.uuid4().hex}@example.com", password_hash= "not-a-hash", role= role)
+        db.add(user)
+        await db.commit()
+        return user
+    return make
+
+@pytest.fixture
+def make_service(db):
+    async def make(title: str = "Haircut", description: str = "A classic cut", duration_mins: int = 60) -> Services:
+        service = Services(title= title, description= description, price= 25, duration_mins= duration_mins)
+        db.add(service)
+        await db.commit()
+        return service
+    return make
+
+@pytest.fixture
+def make_booking(db):
+    slots = itertools.count(1)
+
+    async def make(user: Users, service: Services, start_time: datetime = None, status: StatusEnum = StatusEnum.COMPLETED, created_at: datetime = None) -> Bookings:
+        #written directly, so past and completed bookings can be set up without going through the api rules.
+        #default slots are back to back in the past so they never overlap
+        start_time = start_time or datetime.now(tz= timezone.utc) - timedelta(days= 1, hours= 2 * next(slots))
+        booking = Bookings(user_id= user.id, service_id= service.id, start_time= start_time, end_time= start_time + timedelta(minutes= service.duration_mins), status= status)
+        if created_at is not None:
+            booking.created_at = created_at
+        db.add(booking)
+        await db.commit()
+        return booking
+    return make
+
+def auth_for(user: Users) -> AuthContext:
+    return AuthContext(token= f"test-token-{uuid.uuid4().hex}",
+                       sub= str(user.id),
+                       role= user.role.value,
+                       type= "access",
+                       exp= int(time.time()) + 300)
+
+@pytest.fixture
+def auth():
+    return auth_for
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+import src.services.services
+from routes.bookings.bookings import create_booking_router, create_bookings_bulk_router, update_booking_router, delete_booking_router
+from schemas.bookings.bookings import CreateBooking, UpdateBooking
+from src.services.services import get_service_availability
+from utils.cache import ResponseCache
+from shared import RoleEnum, StatusEnum, UpdateBookingAction
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def window(fake_redis, monkeypatch):
+    #availability goes through a real (fake redis backed) cache here, the rest of the suite runs uncached
+    monkeypatch.setattr(src.services.services, "response_cache", ResponseCache(enabled= True))
+    start = (datetime.now(tz= timezone.utc) + timedelta(days= 1)).replace(minute= 0, second= 0, microsecond= 0)
+    return start, start + timedelta(hours= 4)
+
+async def free_slots(db, auth, user, service, window) -> list:
+    result = await get_service_availability(db, auth(user), service.id, *window)
+    return [slot["start_time"] for slot in result["slots"]]
+
+def booking(user, service, start: datetime) -> CreateBooking:
+    return CreateBooking(user_id= user.id, service_id= service.id, start_time= start, end_time= start + timedelta(minutes= service.duration_mins), status= StatusEnum.PENDING)
+
+
+async def test_booking_writes_refresh_cached_availability(db, auth, make_user, make_service, window):
+    user, admin, service = await make_user(), await make_user(RoleEnum.ADMIN), await make_service()
+    start = window[0]
+    assert len(await free_slots(db, auth, user, service, window)) == 4
+
+    created = await create_booking_router(db, auth(user), booking(user, service, start))
+    assert start.isoformat() not in await free_slots(db, auth, user, service, window)
+
+    await update_booking_router(db, auth(user), str(created["id"]), UpdateBooking(action= UpdateBookingAction.CANCEL))
+    assert start.isoformat() in await free_slots(db, auth, user, service, window)
+
+    await update_booking_router(db, auth(admin), str(created["id"]), UpdateBooking(status= StatusEnum.CONFIRMED))
+    assert start.isoformat() not in await free_slots(db, auth, user, service, window)
+
+    await delete_booking_router(db, auth(user), str(created["id"]))
+    assert len(await free_slots(db, auth, user, service, window)) == 4
+
+async def test_bulk_booking_refreshes_cached_availability(db, auth, make_user, make_service, window):
+    user, service = await make_user(), await make_service()
+    assert len(await free_slots(db, auth, user, service, window)) == 4
+
+    await create_bookings_bulk_router(db, auth(user), [booking(user, service, window[0] + timedelta(hours= hour)) for hour in (1, 2)])
+
+    assert len(await free_slots(db, auth, user, service, window)) == 2
@@ -0,0 +1,189 @@
+import time
+import pytest
+from redis.exceptions import ConnectionError
+from sqlalchemy import select
+import utils.blacklist
+from database.models import Blacklists
+from utils.blacklist import TokenBlacklist, BLACKLIST_KEY_PREFIX, BLACKLIST_PG_PENDING_KEY
+from utils.token_cache import hash_token
+
+pytestmark = pytest.mark.anyio
+
+
+class StubDb():
+    """Stands in for the request session, answers the postgres lookup and counts it."""
+
+    def __init__(self, blacklisted: bool = False) -> None:
+        self.blacklisted = blacklisted
+        self.queries = 0
+
+    async def execute(self, stmt):
+        self.queries += 1
+        return self
+
+    def scalar_one_or_none(self):
+        return "token" if self.blacklisted else None
+
+    def scalars(self):
+        #the fallback insert, every token is new
+        return self
+
+    def all(self):
+        return ["token"]
+
+
+async def test_redis_hit_is_revoked(fake_redis):
+    blacklist, db = TokenBlacklist(filter_enabled= False), StubDb()
+    await blacklist.revoke(db, {"token": int(time.time()) + 60})
+
+    assert await blacklist.is_revoked(db, "token")
+    assert db.queries == 0
+
+async def test_redis_miss_is_final(fake_redis):
+    blacklist, db = TokenBlacklist(pg_fallback= True, filter_enabled= False), StubDb(blacklisted= True)
+
+    assert not await blacklist.is_revoked(db, "token")
+    assert db.queries == 0
+
+async def test_miss_checks_postgres_while_a_fallback_write_is_pending(fake_redis):
+    #another worker revoked in postgres during an outage and has not copied it back yet
+    blacklist, db = TokenBlacklist(pg_fallback= True, filter_enabled= False), StubDb(blacklisted= True)
+    await fake_redis.incr(BLACKLIST_PG_PENDING_KEY)
+
+    assert await blacklist.is_revoked(db, "token")
+    assert db.queries == 1
+
+async def test_miss_checks_postgres_after_this_worker_fell_back(fake_redis, monkeypatch):
+    blacklist, db = TokenBlacklist(pg_fallback= True, filter_enabled= False), StubDb(blacklisted= True)
+    async def down(*args):
+        raise ConnectionError("redis is down")
+    monkeypatch.setattr(blacklist, "_redis_revoke", down)
+    monkeypatch.setattr(fake_redis, "incr", down)
+    await blacklist.revoke(db, {"token": int(time.time()) + 60})
+
+    assert await blacklist.is_revoked(db, "token")
+
+async def test_redis_error_checks_postgres(fake_redis, monkeypatch):
+    blacklist, db = TokenBlacklist(pg_fallback= True, filter_enabled= False), StubDb(blacklisted= True)
+    def down(*args, **kwargs):
+        raise ConnectionError("redis is down")
+    monkeypatch.setattr(fake_redis, "pipeline", down)
+
+    assert await blacklist.is_revoked(db, "token")
+    assert db.queries == 1
+
+async def test_restore_copies_fallback_writes_and_clears_the_marker(db, fake_redis, monkeypatch):
+    blacklist = TokenBlacklist(pg_fallback= True, filter_enabled= False)
+    redis_revoke = blacklist._redis_revoke
+    async def down(*args):
+        raise ConnectionError("redis is down")
+    monkeypatch.setattr(blacklist, "_redis_revoke", down)
+    await blacklist.revoke(db, {"token": int(time.time()) + 60})
+    await db.commit()
+    assert (await db.execute(select(Blacklists.token))).scalars().all() == ["token"]
+    monkeypatch.setattr(blacklist, "_redis_revoke", redis_revoke)
+
+    await blacklist.restore_pg_revocations()
+    assert await fake_redis.exists(BLACKLIST_KEY_PREFIX + hash_token("token"))
+    #kept for one more interval in case a fallback write had not committed yet
+    assert await fake_redis.exists(BLACKLIST_PG_PENDING_KEY)
+
+    await blacklist.restore_pg_revocations()
+    assert not await fake_redis.exists(BLACKLIST_PG_PENDING_KEY)
+    assert not await blacklist.is_revoked(db, "other-token")
+
+
+def exp() -> int:
+    return int(time.time()) + 60
+
+async def workers(count: int = 2) -> list:
+    #one blacklist per app worker, sharing redis
+    blacklists = [TokenBlacklist(pg_fallback= False) for _ in range(count)]
+    for blacklist in blacklists:
+        await blacklist.rebuild_filter()
+    return blacklists
+
+async def test_filter_is_only_used_with_the_redis_backend(fake_redis):
+    assert TokenBlacklist(backend= "redis").filter_enabled
+    assert not TokenBlacklist(backend= "postgres").filter_enabled
+
+async def test_rebuild_loads_revocations_from_redis(fake_redis):
+    first, = await workers(1)
+    await first.revoke(StubDb(), {"token": exp()})
+
+    second, = await workers(1)
+
+    assert hash_token("token") in second._filter
+    assert second.filter_stats()["generation"] == 1
+    assert await second.is_revoked(StubDb(), "token")
+
+async def test_filter_miss_skips_redis(fake_redis, monkeypatch):
+    blacklist, = await workers(1)
+    def down(*args, **kwargs):
+        raise ConnectionError("redis is down")
+    monkeypatch.setattr(fake_redis, "pipeline", down)
+
+    assert not await blacklist.is_revoked(StubDb(), "token")
+
+async def test_sync_picks_up_other_workers_revocations(fake_redis):
+    first, second = await workers()
+    await first.revoke(StubDb(), {"token-1": exp()})
+    await first.revoke(StubDb(), {"token-2": exp(), "token-3": exp()})
+    #not in the second worker's filter yet, so it is let through until the next sync
+    assert not await second.is_revoked(StubDb(), "token-1")
+
+    await second.sync_filter()
+
+    assert second.filter_stats()["generation"] == 3
+    for token in ("token-1", "token-2", "token-3"):
+        assert await second.is_revoked(StubDb(), token)
+
+async def test_sync_adds_only_what_was_missed(fake_redis):
+    first, second = await workers()
+    await first.revoke(StubDb(), {"token-1": exp()})
+    await second.sync_filter()
+    entries = second.filter_stats()["entries"]
+
+    await first.revoke(StubDb(), {"token-2": exp()})
+    await second.sync_filter()
+
+    assert second.filter_stats()["entries"] == entries + 1
+    assert hash_token("token-2") in second._filter
+
+async def test_sync_rebuilds_when_the_recent_list_no_longer_covers_the_gap(fake_redis, monkeypatch):
+    monkeypatch.setattr(utils.blacklist, "BLACKLIST_RECENT_MAX", 2)
+    first, second = await workers()
+    for i in range(3):
+        await first.revoke(StubDb(), {f"token-{i}": exp()})
+    assert await fake_redis.llen(utils.blacklist.BLACKLIST_RECENT_KEY) == 2
+
+    await second.sync_filter()
+
+    assert second.filter_stats()["generation"] == 3
+    assert all(hash_token(f"token-{i}") in second._filter for i in range(3))
+
+async def test_failed_sync_drops_the_filter_until_the_next_rebuild(fake_redis, monkeypatch):
+    blacklist, = await workers(1)
+    def down(*args, **kwargs):
+        raise ConnectionError("redis is down")
+    monkeypatch.setattr(fake_redis, "pipeline", down)
+
+    await blacklist.sync_filter()
+
+    assert blacklist._filter is None
+    assert not blacklist.filter_stats()["active"]
+
+async def test_revocations_during_a_rebuild_reach_the_new_filter(fake_redis, monkeypatch):
+    blacklist, = await workers(1)
+    redis_scan = blacklist._redis_scan
+    async def scan_then_revoke():
+        result = await redis_scan()
+        #lands after the store was read, only the pending list carries it into the new filter
+        await blacklist.revoke(StubDb(), {"token": exp()})
+        return result
+    monkeypatch.setattr(blacklist, "_redis_scan", scan_then_revoke)
+
+    await blacklist.rebuild_filter()
+
+    assert hash_token("token") in blacklist._filter
+    assert blacklist._rebuild_pending is None
@@ -0,0 +1,40 @@
+import math
+from utils.bloom import BloomFilter
+from utils.token_cache import hash_token
+
+
+def test_sized_for_capacity_and_error_rate():
+    bloom = BloomFilter(capacity= 1000, error_rate= 0.01)
+
+    #m = -n ln p / ln(2)^2 bits and k = m / n ln 2 hashes
+    assert bloom.size == math.ceil(-1000 * math.log(0.01) / math.log(2) ** 2) == 9586
+    assert bloom.hash_count == 7
+    assert len(bloom._bits) == (bloom.size + 7) // 8
+
+def test_tiny_capacity_still_works():
+    bloom = BloomFilter(capacity= 0, error_rate= 0.5)
+    bloom.add(hash_token("token"))
+
+    assert bloom.capacity == 1
+    assert hash_token("token") in bloom
+
+def test_added_keys_are_always_members():
+    bloom = BloomFilter(capacity= 5000, error_rate= 0.01)
+    keys = [hash_token(f"revoked-{i}") for i in range(5000)]
+    bloom.update(keys)
+
+    assert all(key in bloom for key in keys)
+    assert bloom.count == 5000
+
+def test_false_positive_rate_stays_near_target():
+    bloom = BloomFilter(capacity= 5000, error_rate= 0.01)
+    bloom.update(hash_token(f"revoked-{i}") for i in range(5000))
+
+    false_positives = sum(hash_token(f"valid-{i}") in bloom for i in range(20000))
+
+    assert false_positives / 20000 < 0.02
+
+def test_empty_filter_has_no_members():
+    bloom = BloomFilter(capacity= 100, error_rate= 0.01)
+
+    assert not any(hash_token(f"token-{i}") in bloom for i in range(1000))
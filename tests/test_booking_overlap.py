@@ -0,0 +1,100 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import insert
+from database.config import Session
+from database.errors import is_booking_overlap
+from database.models import Users, Bookings
+from schemas.bookings.bookings import CreateBooking, UpdateBooking
+from src.bookings.bookings import create_booking, update_booking
+from shared import RoleEnum, StatusEnum, UpdateBookingAction
+
+pytestmark = pytest.mark.anyio
+
+
+def slot(hours_from_now: int, duration_mins: int = 60) -> tuple:
+    start = datetime.now(tz= timezone.utc).replace(microsecond= 0) + timedelta(days= 1, hours= hours_from_now)
+    return start, start + timedelta(minutes= duration_mins)
+
+async def book(db, auth, user, service, start, end) -> dict:
+    result = await create_booking(db, auth(user), CreateBooking(user_id= user.id, service_id= service.id, start_time= start, end_time= end, status= StatusEnum.PENDING))
+    await db.commit()
+    return result
+
+
+async def test_create_into_booked_slot_is_409(db, auth, make_user, make_service):
+    first, second, service = await make_user(), await make_user(), await make_service()
+    start, end = slot(1)
+    await book(db, auth, first, service, start, end)
+
+    with pytest.raises(HTTPException) as exc:
+        await book(db, auth, second, service, start + timedelta(minutes= 30), end + timedelta(minutes= 30))
+    assert exc.value.status_code == 409
+
+async def test_adjacent_and_other_service_slots_are_free(db, auth, make_user, make_service):
+    user, service, other = await make_user(), await make_service(), await make_service(title= "Shave")
+    start, end = slot(1)
+    await book(db, auth, user, service, start, end)
+
+    #ranges are half open, a booking may start when the previous one ends
+    await book(db, auth, user, service, end, end + timedelta(hours= 1))
+    await book(db, auth, user, other, start, end)
+
+async def test_concurrent_creates_of_one_slot_book_it_once(db, auth, make_user, make_service):
+    users, service = [await make_user() for _ in range(2)], await make_service()
+    start, end = slot(2)
+
+    async def attempt(user):
+        async with Session() as session:
+            try:
+                await book(session, auth, user, service, start, end)
+            except HTTPException as e:
+                return e.status_code
+            return 201
+    assert sorted(await asyncio.gather(*(attempt(user) for user in users))) == [201, 409]
+
+async def test_reschedule_into_booked_slot_is_409(db, auth, make_user, make_service):
+    user, service = await make_user(), await make_service()
+    taken_start, taken_end = slot(3)
+    await book(db, auth, user, service, taken_start, taken_end)
+    moving = await book(db, auth, user, service, *slot(6))
+
+    with pytest.raises(HTTPException) as exc:
+        await update_booking(db, auth(user), str(moving["id"]), UpdateBooking(action= UpdateBookingAction.RESCHEDULE, start_time= taken_start, end_time= taken_end))
+    assert exc.value.status_code == 409
+
+async def test_cancelled_booking_frees_its_slot(db, auth, make_user, make_service):
+    first, second, service = await make_user(), await make_user(), await make_service()
+    start, end = slot(7)
+    cancelled = await book(db, auth, first, service, start, end)
+
+    await update_booking(db, auth(first), str(cancelled["id"]), UpdateBooking(action= UpdateBookingAction.CANCEL))
+    await db.commit()
+    await book(db, auth, second, service, start, end)
+
+async def test_reactivating_cancelled_booking_into_taken_slot_is_409(db, auth, make_user, make_service, make_booking):
+    user, admin, service = await make_user(), await make_user(RoleEnum.ADMIN), await make_service()
+    start, end = slot(4)
+    cancelled = await make_booking(user, service, start_time= start, status= StatusEnum.CANCELLED)
+    await book(db, auth, user, service, start, end)
+
+    with pytest.raises(HTTPException) as exc:
+        await update_booking(db, auth(admin), str(cancelled.id), UpdateBooking(status= StatusEnum.CONFIRMED))
+    assert exc.value.status_code == 409
+
+async def test_is_booking_overlap_matches_only_the_exclusion_violation(db, make_user, make_service, make_booking):
+    user, service = await make_user(), await make_service()
+    start, end = slot(5)
+    await make_booking(user, service, start_time= start, status= StatusEnum.PENDING)
+
+    with pytest.raises(Exception) as overlap:
+        await db.execute(insert(Bookings).values(user_id= user.id, service_id= service.id, start_time= start, end_time= end, status= StatusEnum.PENDING))
+    await db.rollback()
+    assert is_booking_overlap(overlap.value)
+
+    #a unique violation is a different integrity error
+    with pytest.raises(Exception) as duplicate:
+        await db.execute(insert(Users).values(full_name= user.full_name, email= user.email, password_hash= "not-a-hash", role= RoleEnum.USER))
+    await db.rollback()
+    assert not is_booking_overlap(duplicate.value)
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi import HTTPException
+from src.bookings.bookings import get_bookings
+from shared import RoleEnum, StatusEnum
+
+pytestmark = pytest.mark.anyio
+
+
+async def all_pages(db, auth, limit: int, **filters) -> list:
+    filters = {"bookings_status": None, "bookings_from": None, "bookings_to": None, **filters}
+    pages, cursor = [], None
+    while True:
+        page = await get_bookings(db, auth, **filters, limit= limit, cursor= cursor)
+        pages.append(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+async def test_admin_pages_cover_every_booking_once(db, auth, make_user, make_service, make_booking):
+    user, admin, service = await make_user(), await make_user(RoleEnum.ADMIN), await make_service()
+    #groups of bookings created in the same instant, the id breaks the tie
+    now = datetime.now(tz= timezone.utc)
+    bookings = [await make_booking(user, service, created_at= now - timedelta(minutes= i // 3)) for i in range(10)]
+
+    pages = await all_pages(db, auth(admin), limit= 4)
+
+    assert [len(page) for page in pages] == [4, 4, 2]
+    seen = [booking.id for page in pages for booking in page]
+    assert sorted(seen) == sorted(booking.id for booking in bookings)
+    keys = [(booking.created_at, booking.id) for page in pages for booking in page]
+    assert keys == sorted(keys, reverse= True)
+
+async def test_exact_last_page_has_no_cursor(db, auth, make_user, make_service, make_booking):
+    user, admin, service = await make_user(), await make_user(RoleEnum.ADMIN), await make_service()
+    for _ in range(4):
+        await make_booking(user, service)
+
+    pages = await all_pages(db, auth(admin), limit= 2)
+
+    assert [len(page) for page in pages] == [2, 2]
+
+async def test_user_pages_only_their_bookings(db, auth, make_user, make_service, make_booking):
+    user, other, service = await make_user(), await make_user(), await make_service()
+    own = [await make_booking(user, service) for _ in range(3)]
+    await make_booking(other, service)
+
+    pages = await all_pages(db, auth(user), limit= 2)
+
+    assert sorted(booking.id for page in pages for booking in page) == sorted(booking.id for booking in own)
+
+async def test_cursor_keeps_the_status_filter(db, auth, make_user, make_service, make_booking):
+    user, admin, service = await make_user(), await make_user(RoleEnum.ADMIN), await make_service()
+    for i in range(6):
+        await make_booking(user, service, status= StatusEnum.CANCELLED if i % 2 else StatusEnum.COMPLETED)
+
+    pages = await all_pages(db, auth(admin), limit= 2, bookings_status= StatusEnum.CANCELLED)
+
+    assert [len(page) for page in pages] == [2, 1]
+    assert all(booking.status == StatusEnum.CANCELLED for page in pages for booking in page)
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "WyJ4Il0", "WyIyMDI2LTAxLTAxVDAwOjAwOjAwIiwgIngiXQ"])
+async def test_invalid_cursor_is_400(db, auth, make_user, cursor):
+    admin = await make_user(RoleEnum.ADMIN)
+
+    with pytest.raises(HTTPException) as exc:
+        await get_bookings(db, auth(admin), None, None, None, limit= 2, cursor= cursor)
+    assert exc.value.status_code == 400
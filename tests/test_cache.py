@@ -0,0 +1,58 @@
+import time
+import pytest
+from fastapi import HTTPException
+from utils.cache import ResponseCache, CACHE_KEY_PREFIX, CACHE_LOCK_PREFIX, CACHE_TAG_PREFIX
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_miss_loads_once_then_hits(fake_redis):
+    cache = ResponseCache(enabled= True)
+    calls = []
+
+    async def loader(db):
+        calls.append(db)
+        return {"id": 1}
+
+    assert await cache.get_or_load(None, "service:1", loader, ttl= 60, tags= ["catalog"]) == {"id": 1}
+    assert await cache.get_or_load(None, "service:1", loader, ttl= 60, tags= ["catalog"]) == {"id": 1}
+    assert len(calls) == 1
+    assert await fake_redis.smembers(CACHE_TAG_PREFIX + "catalog") == {b"service:1"}
+    assert not await fake_redis.exists(CACHE_LOCK_PREFIX + "service:1")
+
+async def test_failed_load_releases_the_lock(fake_redis):
+    cache = ResponseCache(enabled= True)
+
+    async def loader(db):
+        raise HTTPException(status_code= 404, detail= "service not found")
+
+    with pytest.raises(HTTPException):
+        await cache.get_or_load(None, "service:missing", loader, ttl= 60)
+    assert not await fake_redis.exists(CACHE_LOCK_PREFIX + "service:missing")
+
+    #a repeat of the bad request fails as fast as the first one, without waiting for the lock
+    started = time.monotonic()
+    with pytest.raises(HTTPException) as exc:
+        await cache.get_or_load(None, "service:missing", loader, ttl= 60)
+    assert exc.value.status_code == 404
+    assert time.monotonic() - started < 0.5
+    assert not await fake_redis.exists(CACHE_KEY_PREFIX + "service:missing")
+
+async def test_unlock_leaves_a_lock_taken_by_another_worker(fake_redis):
+    cache = ResponseCache(enabled= True)
+    await fake_redis.set(CACHE_LOCK_PREFIX + "service:1", "their-token")
+
+    await cache._unlock(CACHE_LOCK_PREFIX + "service:1", "our-token")
+
+    assert await fake_redis.get(CACHE_LOCK_PREFIX + "service:1") == b"their-token"
+
+async def test_invalidate_tag_drops_its_keys(fake_redis):
+    cache = ResponseCache(enabled= True)
+
+    async def loader(db):
+        return {"id": 1}
+    await cache.get_or_load(None, "service:1", loader, ttl= 60, tags= ["catalog"])
+
+    await cache.invalidate(tags= ["catalog"])
+
+    assert not await fake_redis.exists(CACHE_KEY_PREFIX + "service:1", CACHE_TAG_PREFIX + "catalog")
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi import HTTPException
+import routes.bookings.bookings
+import src.bookings.bookings
+from routes.bookings.bookings import create_booking_router
+from schemas.bookings.bookings import CreateBooking
+from src.bookings.bookings import create_bookings_bulk
+from src.bookings.holds import SlotHolds
+from shared import StatusEnum
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def holds(fake_redis, monkeypatch):
+    #built after the client is swapped, its script is registered on the fake redis
+    holds = SlotHolds()
+    monkeypatch.setattr(src.bookings.bookings, "slot_holds", holds)
+    monkeypatch.setattr(routes.bookings.bookings, "slot_holds", holds)
+    return holds
+
+async def held_booking(holds, user, service) -> CreateBooking:
+    start = datetime.now(tz= timezone.utc) + timedelta(days= 1)
+    end = start + timedelta(minutes= service.duration_mins)
+    hold = await holds.hold(service.id, str(user.id), start, end, ttl_seconds= 60)
+    return CreateBooking(user_id= user.id, service_id= service.id, start_time= start, end_time= end, status= StatusEnum.PENDING, hold_id= hold["hold_id"])
+
+
+async def test_hold_is_released_after_the_booking_commits(db, auth, holds, make_user, make_service):
+    user, service = await make_user(), await make_service()
+    details = await held_booking(holds, user, service)
+
+    result = await create_booking_router(db, auth(user), details)
+
+    assert "hold_id" not in result
+    assert await holds.get(service.id, details.hold_id) is None
+
+async def test_hold_survives_a_failed_commit(db, auth, holds, make_user, make_service, monkeypatch):
+    user, service = await make_user(), await make_service()
+    details = await held_booking(holds, user, service)
+    async def commit():
+        raise ConnectionError("connection lost")
+    monkeypatch.setattr(db, "commit", commit)
+
+    with pytest.raises(ConnectionError):
+        await create_booking_router(db, auth(user), details)
+
+    await db.rollback()
+    assert await holds.get(details.service_id, details.hold_id) is not None
+
+async def test_bulk_refuses_items_with_a_hold(db, auth, holds, make_user, make_service):
+    user, service = await make_user(), await make_service()
+    held = await held_booking(holds, user, service)
+    plain = held.model_copy(update= {"hold_id": None, "start_time": held.start_time + timedelta(hours= 2), "end_time": held.end_time + timedelta(hours= 2)})
+
+    with pytest.raises(HTTPException) as exc:
+        await create_bookings_bulk(db, auth(user), [plain, held])
+    assert exc.value.status_code == 422
+    assert "[1]" in exc.value.detail
@@ -0,0 +1,95 @@
+import uuid
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from utils.idempotency import IdempotencyStore
+from utils.manager import jwt_manager
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def app(fake_redis):
+    app = FastAPI()
+    app.state.calls = 0
+    app.middleware("http")(IdempotencyStore().middleware)
+
+    @app.post("/bookings", status_code= 201)
+    async def create(body: dict):
+        app.state.calls += 1
+        if body.get("fail"):
+            return JSONResponse(status_code= 409, content= {"detail": "slot taken"})
+        return {"call": app.state.calls}
+
+    @app.post("/auth/register", status_code= 201)
+    async def register(body: dict):
+        app.state.calls += 1
+        return {"call": app.state.calls}
+    return app
+
+@pytest.fixture
+async def client(app):
+    async with httpx.AsyncClient(transport= httpx.ASGITransport(app= app), base_url= "http://test") as client:
+        yield client
+
+async def bearer(sub: str) -> dict:
+    return {"Authorization": f"Bearer {await jwt_manager.create_access_token({'sub': sub, 'role': 'USER'})}"}
+
+
+async def test_retry_replays_without_authenticating_again(app, client, monkeypatch):
+    async def authenticate(*args):
+        raise AssertionError("the replay lookup must not check the blacklist")
+    monkeypatch.setattr(jwt_manager, "authenticate", authenticate)
+    headers = {**await bearer("user-1"), "Idempotency-Key": "key-1"}
+
+    first = await client.post("/bookings", json= {"slot": 1}, headers= headers)
+    #a refreshed token of the same user still replays
+    second = await client.post("/bookings", json= {"slot": 1}, headers= {**await bearer("user-1"), "Idempotency-Key": "key-1"})
+
+    assert first.status_code == second.status_code == 201
+    assert second.json() == first.json()
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert app.state.calls == 1
+
+async def test_keys_are_scoped_by_user(app, client):
+    for sub in ("user-1", "user-2"):
+        response = await client.post("/bookings", json= {"slot": 1}, headers= {**await bearer(sub), "Idempotency-Key": "key-1"})
+        assert "Idempotent-Replayed" not in response.headers
+    assert app.state.calls == 2
+
+async def test_invalid_token_skips_idempotency(app, client):
+    headers = {"Authorization": "Bearer not-a-token", "Idempotency-Key": "key-1"}
+    await client.post("/bookings", json= {"slot": 1}, headers= headers)
+    await client.post("/bookings", json= {"slot": 1}, headers= headers)
+
+    assert app.state.calls == 2
+
+async def test_key_reused_with_another_body_is_422(app, client):
+    headers = {**await bearer("user-1"), "Idempotency-Key": "key-1"}
+    await client.post("/bookings", json= {"slot": 1}, headers= headers)
+
+    response = await client.post("/bookings", json= {"slot": 2}, headers= headers)
+
+    assert response.status_code == 422
+    assert app.state.calls == 1
+
+async def test_error_responses_are_not_stored(app, client):
+    headers = {**await bearer("user-1"), "Idempotency-Key": "key-1"}
+    first = await client.post("/bookings", json= {"fail": True}, headers= headers)
+    second = await client.post("/bookings", json= {"fail": True}, headers= headers)
+
+    assert first.status_code == second.status_code == 409
+    assert "Idempotent-Replayed" not in second.headers
+    assert app.state.calls == 2
+
+async def test_anonymous_clients_with_the_same_key_do_not_collide(app, client):
+    key = {"Idempotency-Key": str(uuid.uuid4())}
+    first = await client.post("/auth/register", json= {"email": "a@example.com"}, headers= key)
+    other = await client.post("/auth/register", json= {"email": "b@example.com"}, headers= key)
+    retry = await client.post("/auth/register", json= {"email": "a@example.com"}, headers= key)
+
+    assert first.status_code == other.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert app.state.calls == 2
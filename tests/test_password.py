@@ -0,0 +1,42 @@
+import time
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from utils.password import PasswordManager
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def manager():
+    manager = PasswordManager(executor_type= "thread", workers= 1, max_queue= 1)
+    yield manager
+    manager.shutdown()
+
+
+async def test_hash_and_verify(manager):
+    password_hash = await manager.hash("correct horse")
+
+    assert await manager.verify("correct horse", password_hash)
+    assert not await manager.verify("wrong horse", password_hash)
+
+async def test_full_queue_is_turned_away_at_once(manager):
+    release = threading.Event()
+    #one job on the single worker, one waiting in the queue
+    jobs = [asyncio.ensure_future(manager._run(release.wait, 5)) for _ in range(2)]
+    await asyncio.sleep(0)
+    assert manager._in_flight == 2
+
+    started = time.monotonic()
+    with pytest.raises(HTTPException) as exc:
+        await manager.hash("password")
+    assert exc.value.status_code == 503
+    assert exc.value.headers == {"Retry-After": "1"}
+    assert time.monotonic() - started < 0.5
+
+    release.set()
+    assert await asyncio.gather(*jobs) == [True, True]
+    assert manager._in_flight == 0
+    #room again once the pool drains
+    assert await manager.hash("password")
@@ -0,0 +1,122 @@
+import asyncio
+import pytest
+from sqlalchemy import select, func
+from database.config import Session
+from database.models import Services, Reviews
+from schemas.reviews.reviews import CreateReview, UpdateReview
+from src.reviews.reviews import create_review, update_review, delete_review
+from src.bookings.bookings import delete_booking
+from src.auth.auth import delete_account
+from shared import RoleEnum
+
+pytestmark = pytest.mark.anyio
+
+
+async def stored(db, service_id) -> dict:
+    #columns, not the entity, so the session's identity map cannot hand back stale values
+    row = (await db.execute(select(Services.rating_count, Services.rating_sum, Services.rating_1, Services.rating_2,
+                                   Services.rating_3, Services.rating_4, Services.rating_5)
+                            .where(Services.id == service_id))).one()
+    return dict(row._mapping)
+
+async def recomputed(db, service_id) -> dict:
+    row = (await db.execute(select(func.count().label("rating_count"),
+                                   func.coalesce(func.sum(Reviews.rating), 0).label("rating_sum"),
+                                   *(func.count().filter(Reviews.rating == star).label(f"rating_{star}") for star in range(1, 6)))
+                            .where(Reviews.service_id == service_id))).one()
+    return dict(row._mapping)
+
+async def review(db, auth, user, booking, rating: int) -> dict:
+    result = await create_review(db, auth(user), CreateReview(booking_id= str(booking.id), rating= rating, comment= "test"))
+    await db.commit()
+    return result
+
+
+async def test_create_counts_review(db, auth, make_user, make_service, make_booking):
+    user, service = await make_user(), await make_service()
+    await review(db, auth, user, await make_booking(user, service), 5)
+    await review(db, auth, user, await make_booking(user, service), 3)
+
+    assert await stored(db, service.id) == {"rating_count": 2, "rating_sum": 8, "rating_1": 0, "rating_2": 0, "rating_3": 1, "rating_4": 0, "rating_5": 1}
+
+async def test_concurrent_creates_lose_no_counts(db, auth, make_user, make_service, make_booking):
+    user, service = await make_user(), await make_service()
+    bookings = [await make_booking(user, service) for _ in range(5)]
+
+    async def create(booking):
+        async with Session() as session:
+            await review(session, auth, user, booking, 4)
+    await asyncio.gather(*(create(booking) for booking in bookings))
+
+    assert (await stored(db, service.id))["rating_count"] == 5
+    assert await stored(db, service.id) == await recomputed(db, service.id)
+
+async def test_update_moves_histogram(db, auth, make_user, make_service, make_booking):
+    user, service = await make_user(), await make_service()
+    created = await review(db, auth, user, await make_booking(user, service), 5)
+
+    await update_review(db, auth(user), str(created["id"]), UpdateReview(rating= 2, comment= None))
+    await db.commit()
+
+    assert await stored(db, service.id) == {"rating_count": 1, "rating_sum": 2, "rating_1": 0, "rating_2": 1, "rating_3": 0, "rating_4": 0, "rating_5": 0}
+
+async def test_update_to_same_rating_changes_nothing(db, auth, make_user, make_service, make_booking):
+    user, service = await make_user(), await make_service()
+    created = await review(db, auth, user, await make_booking(user, service), 4)
+
+    await update_review(db, auth(user), str(created["id"]), UpdateReview(rating= 4, comment= "edited"))
+    await db.commit()
+
+    assert await stored(db, service.id) == await recomputed(db, service.id)
+
+async def test_delete_uncounts_review(db, auth, make_user, make_service, make_booking):
+    user, service = await make_user(), await make_service()
+    kept = await review(db, auth, user, await make_booking(user, service), 1)
+    removed = await review(db, auth, user, await make_booking(user, service), 5)
+
+    result = await delete_review(db, auth(user), str(removed["id"]))
+    await db.commit()
+
+    assert result["service_id"] == service.id
+    assert await stored(db, service.id) == {"rating_count": 1, "rating_sum": 1, "rating_1": 1, "rating_2": 0, "rating_3": 0, "rating_4": 0, "rating_5": 0}
+    assert kept["id"] in (await db.execute(select(Reviews.id))).scalars().all()
+
+async def test_concurrent_deletes_uncount_once(db, auth, make_user, make_service, make_booking):
+    user, service = await make_user(), await make_service()
+    await review(db, auth, user, await make_booking(user, service), 3)
+    created = await review(db, auth, user, await make_booking(user, service), 5)
+
+    async def delete(session):
+        await delete_review(session, auth(user), str(created["id"]))
+        await session.commit()
+    async with Session() as first, Session() as second:
+        await asyncio.gather(delete(first), delete(second))
+
+    assert await stored(db, service.id) == {"rating_count": 1, "rating_sum": 3, "rating_1": 0, "rating_2": 0, "rating_3": 1, "rating_4": 0, "rating_5": 0}
+
+async def test_admin_booking_delete_uncounts_its_review(db, auth, make_user, make_service, make_booking):
+    user, admin, service = await make_user(), await make_user(RoleEnum.ADMIN), await make_service()
+    booking = await make_booking(user, service)
+    await review(db, auth, user, booking, 2)
+    await review(db, auth, user, await make_booking(user, service), 4)
+
+    result = await delete_booking(db, auth(admin), str(booking.id))
+    await db.commit()
+
+    assert result["service_ids"] == [service.id]
+    assert await stored(db, service.id) == {"rating_count": 1, "rating_sum": 4, "rating_1": 0, "rating_2": 0, "rating_3": 0, "rating_4": 1, "rating_5": 0}
+
+async def test_account_delete_uncounts_reviews_on_every_service(db, auth, make_user, make_service, make_booking):
+    leaving, staying = await make_user(), await make_user()
+    first, second = await make_service(), await make_service(title= "Shave")
+    await review(db, auth, leaving, await make_booking(leaving, first), 1)
+    await review(db, auth, leaving, await make_booking(leaving, second), 2)
+    await review(db, auth, leaving, await make_booking(leaving, second), 3)
+    await review(db, auth, staying, await make_booking(staying, second), 5)
+
+    result = await delete_account(db, auth(leaving))
+    await db.commit()
+
+    assert sorted(result["service_ids"]) == sorted([first.id, second.id])
+    assert await stored(db, first.id) == {"rating_count": 0, "rating_sum": 0, "rating_1": 0, "rating_2": 0, "rating_3": 0, "rating_4": 0, "rating_5": 0}
+    assert await stored(db, second.id) == {"rating_count": 1, "rating_sum": 5, "rating_1": 0, "rating_2": 0, "rating_3": 0, "rating_4": 0, "rating_5": 1}
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi import HTTPException
+from database.models import Reviews
+from src.reviews.reviews import get_reviews_for_service
+from utils.pagination import encode_cursor
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def make_review(db):
+    async def make(booking, rating: int, created_at: datetime) -> Reviews:
+        #written directly so several reviews can share a created_at
+        review = Reviews(booking_id= booking.id, service_id= booking.service_id, rating= rating, comment= "test", created_at= created_at)
+        db.add(review)
+        await db.commit()
+        return review
+    return make
+
+async def all_pages(db, auth, service_id, limit: int, min_rating: int = None) -> list:
+    pages, cursor = [], None
+    while True:
+        page = await get_reviews_for_service(db, auth, str(service_id), min_rating= min_rating, limit= limit, cursor= cursor)
+        pages.append(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+async def test_pages_cover_the_service_reviews_once(db, auth, make_user, make_service, make_booking, make_review):
+    user, service, other = await make_user(), await make_service(), await make_service(title= "Shave")
+    now = datetime.now(tz= timezone.utc)
+    #pairs of reviews written in the same instant, the id breaks the tie
+    reviews = [await make_review(await make_booking(user, service), 1 + i % 5, now - timedelta(minutes= i // 2)) for i in range(7)]
+    await make_review(await make_booking(user, other), 5, now)
+
+    pages = await all_pages(db, auth(user), service.id, limit= 3)
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    keys = [(review.created_at, review.id) for page in pages for review in page]
+    assert keys == sorted(keys, reverse= True)
+    assert sorted(key[1] for key in keys) == sorted(review.id for review in reviews)
+
+async def test_min_rating_applies_on_every_page(db, auth, make_user, make_service, make_booking, make_review):
+    user, service = await make_user(), await make_service()
+    now = datetime.now(tz= timezone.utc)
+    for i in range(8):
+        await make_review(await make_booking(user, service), 5 if i % 2 else 2, now - timedelta(minutes= i))
+
+    pages = await all_pages(db, auth(user), service.id, limit= 3, min_rating= 4)
+
+    assert [len(page) for page in pages] == [3, 1]
+    assert all(review.rating == 5 for page in pages for review in page)
+
+async def test_service_without_reviews_is_404(db, auth, make_user, make_service):
+    user, service = await make_user(), await make_service()
+
+    with pytest.raises(HTTPException) as exc:
+        await get_reviews_for_service(db, auth(user), str(service.id), limit= 3)
+    assert exc.value.status_code == 404
+
+async def test_page_past_the_last_review_is_empty(db, auth, make_user, make_service, make_booking, make_review):
+    user, service = await make_user(), await make_service()
+    review = await make_review(await make_booking(user, service), 4, datetime.now(tz= timezone.utc))
+
+    #the cursor of the only review, as if it had been followed by another page
+    page = await get_reviews_for_service(db, auth(user), str(service.id), limit= 3, cursor= encode_cursor((review.created_at, review.id)))
+
+    assert page == {"items": [], "next_cursor": None}
+
+async def test_invalid_cursor_is_400(db, auth, make_user, make_service):
+    user, service = await make_user(), await make_service()
+
+    with pytest.raises(HTTPException) as exc:
+        await get_reviews_for_service(db, auth(user), str(service.id), limit= 3, cursor= "WyJ4Il0")
+    assert exc.value.status_code == 400
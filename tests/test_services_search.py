@@ -0,0 +1,46 @@
+import pytest
+from fastapi import HTTPException
+from src.services.services import search_services
+
+pytestmark = pytest.mark.anyio
+
+
+async def all_pages(db, auth, q: str, limit: int) -> list:
+    pages, cursor = [], None
+    while True:
+        page = await search_services(db, auth, q, limit= limit, cursor= cursor)
+        pages.append(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+async def test_pages_over_equal_ranks_return_every_match_once(db, auth, make_user, make_service):
+    user = await make_user()
+    #identical text ranks identically, only the id orders these
+    same = [await make_service(title= "Beard trim", description= "Trim and shape the beard") for _ in range(5)]
+    await make_service(title= "Haircut", description= "A classic cut")
+
+    pages = await all_pages(db, auth(user), "beard", limit= 2)
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sorted(item["id"] for page in pages for item in page) == sorted(service.id for service in same)
+
+async def test_pages_follow_rank_then_id(db, auth, make_user, make_service):
+    user = await make_user()
+    for i in range(3):
+        await make_service(title= f"Beard trim {i}", description= "Beard oil and a beard trim")
+        await make_service(title= f"Shave {i}", description= "Hot towel shave, beard line up")
+
+    pages = await all_pages(db, auth(user), "beard", limit= 4)
+    keys = [(item["rank"], item["id"]) for page in pages for item in page]
+
+    assert len(keys) == len(set(keys)) == 6
+    assert keys == sorted(keys, reverse= True)
+
+async def test_invalid_cursor_is_400(db, auth, make_user):
+    user = await make_user()
+
+    with pytest.raises(HTTPException) as exc:
+        await search_services(db, auth(user), "beard", limit= 2, cursor= "WyJoaWdoIiwgIngiXQ")
+    assert exc.value.status_code == 400
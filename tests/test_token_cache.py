@@ -0,0 +1,85 @@
+import time
+import pytest
+from utils.blacklist import TokenBlacklist
+from utils.manager import jwt_manager
+from utils.token_cache import TokenCache, token_cache
+
+
+def claims(sub: str, ttl: int = 60) -> dict:
+    return {"sub": sub, "exp": int(time.time()) + ttl}
+
+
+def test_hit_returns_the_stored_claims():
+    cache = TokenCache(maxsize= 10)
+    cache.set("token", claims("user-1"))
+
+    assert cache.get("token")["sub"] == "user-1"
+    assert cache.get("other") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_expired_entry_is_dropped_on_read():
+    cache = TokenCache(maxsize= 10)
+    cache.set("token", claims("user-1", ttl= -1))
+
+    assert cache.get("token") is None
+    assert cache.stats()["size"] == 0
+    assert (cache.misses, cache.evictions) == (1, 1)
+
+def test_claims_without_exp_are_not_cached():
+    cache = TokenCache(maxsize= 10)
+    cache.set("token", {"sub": "user-1"})
+
+    assert cache.get("token") is None
+
+def test_size_bound_evicts_least_recently_used():
+    cache = TokenCache(maxsize= 2)
+    cache.set("first", claims("user-1"))
+    cache.set("second", claims("user-2"))
+    #reading first makes second the oldest entry
+    cache.get("first")
+
+    cache.set("third", claims("user-3"))
+
+    assert cache.get("second") is None
+    assert cache.get("first") is not None
+    assert cache.get("third") is not None
+    assert cache.stats()["size"] == 2
+    assert cache.evictions == 1
+
+def test_zero_maxsize_disables_the_cache():
+    cache = TokenCache(maxsize= 0)
+    cache.set("token", claims("user-1"))
+
+    assert cache.get("token") is None
+
+def test_invalidate_drops_the_token():
+    cache = TokenCache(maxsize= 10)
+    cache.set("token", claims("user-1"))
+
+    cache.invalidate("token")
+    cache.invalidate("never-cached")
+
+    assert cache.get("token") is None
+
+def test_stats_rates():
+    cache = TokenCache(maxsize= 10)
+    assert cache.stats()["hit_rate"] == 0.0
+    cache.set("token", claims("user-1"))
+    for _ in range(3):
+        cache.get("token")
+    cache.get("other")
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (3, 1)
+    assert stats["hit_rate"] == 0.75
+    assert stats["miss_rate"] == 0.25
+
+@pytest.mark.anyio
+async def test_revoke_drops_the_token_from_the_shared_cache(fake_redis):
+    token = await jwt_manager.create_access_token({"sub": "user-1", "role": "USER"})
+    await jwt_manager.decode_token(token)
+    assert token_cache.get(token) is not None
+
+    await TokenBlacklist(pg_fallback= False).revoke(None, {token: int(time.time()) + 60})
+
+    assert token_cache.get(token) is None
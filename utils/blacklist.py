@@ -0,0 +1,309 @@
+import os
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from fastapi import HTTPException, status
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from redis.exceptions import RedisError
+from dotenv import load_dotenv
+from database.config import Session, db_dependency, redis_client, redis_pipeline
+from database.models import Blacklists
+from utils.bloom import BloomFilter
+from utils.token_cache import hash_token, token_cache
+from utils.logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("blacklist")
+
+BLACKLIST_BACKEND = os.getenv("BLACKLIST_BACKEND", "redis")   #redis or postgres
+BLACKLIST_PG_FALLBACK = os.getenv("BLACKLIST_PG_FALLBACK", "true").lower() == "true"
+BLACKLIST_PURGE_INTERVAL_SECONDS = int(os.getenv("BLACKLIST_PURGE_INTERVAL_SECONDS", "300"))
+BLACKLIST_PURGE_BATCH_SIZE = int(os.getenv("BLACKLIST_PURGE_BATCH_SIZE", "1000"))
+BLACKLIST_FILTER_ENABLED = os.getenv("BLACKLIST_FILTER_ENABLED", "true").lower() == "true"
+BLACKLIST_FILTER_CAPACITY = int(os.getenv("BLACKLIST_FILTER_CAPACITY", "100000"))
+BLACKLIST_FILTER_ERROR_RATE = float(os.getenv("BLACKLIST_FILTER_ERROR_RATE", "0.01"))
+BLACKLIST_FILTER_REBUILD_SECONDS = int(os.getenv("BLACKLIST_FILTER_REBUILD_SECONDS", "600"))
+BLACKLIST_FILTER_SYNC_SECONDS = float(os.getenv("BLACKLIST_FILTER_SYNC_SECONDS", "1"))
+BLACKLIST_RECENT_MAX = int(os.getenv("BLACKLIST_RECENT_MAX", "1000"))
+BLACKLIST_RESTORE_INTERVAL_SECONDS = float(os.getenv("BLACKLIST_RESTORE_INTERVAL_SECONDS", "5"))
+BLACKLIST_KEY_PREFIX = "blacklist:"
+#every revocation is also pushed here so other workers can add it to their filter without a rebuild
+BLACKLIST_RECENT_KEY = "blacklist-meta:recent"
+BLACKLIST_GENERATION_KEY = "blacklist-meta:generation"
+#bumped by every fallback write to postgres, removed once those rows are copied back to redis
+BLACKLIST_PG_PENDING_KEY = "blacklist-meta:pg-pending"
+
+#deletes the pending marker only if no fallback write bumped it since it was read
+#KEYS[1] marker key, ARGV[1] value read before the copy
+_CLEAR_PENDING_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+
+class TokenBlacklist():
+    """Stores revoked tokens until they expire.
+
+    Redis is the primary store, each revoked token is kept under its hash with a TTL equal
+    to the token's remaining lifetime so nothing has to be cleaned up. When BLACKLIST_BACKEND
+    is "postgres", or Redis is unreachable and BLACKLIST_PG_FALLBACK is enabled, the
+    `blacklists` table is used instead. A Redis miss is final, Postgres is only read when
+    Redis fails or while revocations written there during an outage are not yet back in
+    Redis. Those are marked by a Redis counter (and a flag on the worker that wrote them,
+    since the counter may not be reachable at the time), and `restore_pg_revocations`
+    copies them back and clears the marker.
+
+    In front of the store sits a Bloom filter of revoked token hashes. Tokens the filter has
+    never seen are accepted without a lookup; only possible matches go to the store. Each
+    worker rebuilds its filter from the store periodically and, between rebuilds, pulls
+    revocations made by other workers from a capped Redis list. Whenever the filter cannot be
+    trusted (not built yet, or a sync failed) every lookup goes to the store. The filter is
+    only used with the Redis backend: the Postgres-only backend has no shared list to sync
+    from, so other workers' revocations would be missed until the next rebuild.
+    """
+
+    def __init__(self, backend: str = BLACKLIST_BACKEND, pg_fallback: bool = BLACKLIST_PG_FALLBACK, filter_enabled: bool = BLACKLIST_FILTER_ENABLED) -> None:
+        self.backend = backend
+        self.pg_fallback = pg_fallback
+        self.filter_enabled = filter_enabled and backend == "redis"
+        self._filter: Optional[BloomFilter] = None
+        self._generation = 0
+        #this worker wrote revocations to postgres that may not be in redis yet
+        self._pg_pending = False
+        #marker value seen by the previous restore
+        self._restored_marker: Optional[bytes] = None
+        self._clear_pending_script = redis_client.register_script(_CLEAR_PENDING_SCRIPT)
+        #revocations made while a rebuild is reading the store, replayed into the new filter
+        self._rebuild_pending: Optional[List[str]] = None
+        self._rebuild_lock = asyncio.Lock()
+
+    async def revoke(self, db: db_dependency, tokens: Dict[str, int]) -> bool:
+        """Blacklist every token in `tokens` (token -> exp timestamp).
+
+        Returns False if any of the tokens was already blacklisted.
+        """
+        logger.info("revoke tokens")
+        for token in tokens:
+            token_cache.invalidate(token)
+        now = int(datetime.now(tz= timezone.utc).timestamp())
+        #tokens that are already past exp are rejected by the jwt check, no need to store them
+        to_revoke = {token: exp for token, exp in tokens.items() if exp - now > 0}
+        if not to_revoke:
+            return True
+        key_hashes = [hash_token(token) for token in to_revoke]
+        if self._filter is not None:
+            self._filter.update(key_hashes)
+        if self._rebuild_pending is not None:
+            self._rebuild_pending.extend(key_hashes)
+
+        if self.backend == "redis":
+            try:
+                results = await self._redis_revoke(to_revoke, now)
+                logger.info("tokens revoked in redis")
+                return all(results[:len(to_revoke)])
+            except RedisError as e:
+                logger.error(f"Redis Error: {e.__class__.__name__}: {e}")
+                if not self.pg_fallback:
+                    raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+                logger.info("falling back to postgres blacklist")
+
+        revoked = await self._pg_revoke(db, to_revoke)
+        if self.backend == "redis":
+            await self._mark_pg_pending()
+        return revoked
+
+    async def is_revoked(self, db: db_dependency, token: str) -> bool:
+        key_hash = hash_token(token)
+        if self._filter is not None and key_hash not in self._filter:
+            return False
+
+        if self.backend == "redis":
+            try:
+                async with redis_pipeline() as pipe:
+                    pipe.exists(BLACKLIST_KEY_PREFIX + key_hash)
+                    pipe.exists(BLACKLIST_PG_PENDING_KEY)
+                    revoked, pg_pending = await pipe.execute()
+                if revoked:
+                    return True
+                #a miss is final unless revocations made while redis was down are still only in postgres
+                if not (self.pg_fallback and (pg_pending or self._pg_pending)):
+                    return False
+            except RedisError as e:
+                logger.error(f"Redis Error: {e.__class__.__name__}: {e}")
+                if not self.pg_fallback:
+                    raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+                logger.info("falling back to postgres blacklist")
+
+        try:
+            stmt = select(Blacklists.token).where(Blacklists.token == token)
+            result_obj = await db.execute(stmt)
+            blacklisted = result_obj.scalar_one_or_none()
+        except Exception as e:
+            logger.error(f"Db Error: {e.__class__.__name__}: {e}")
+            raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+        return blacklisted is not None
+
+    async def _redis_revoke(self, tokens: Dict[str, int], now: int) -> list:
+        #one round trip for all tokens, NX tells us whether the token was already revoked.
+        #MULTI keeps the generation counter in step with the recent list for filter syncs
+        key_hashes = [hash_token(token) for token in tokens]
+        async with redis_pipeline(transaction= True) as pipe:
+            for key_hash, exp in zip(key_hashes, tokens.values()):
+                pipe.set(BLACKLIST_KEY_PREFIX + key_hash, 1, ex= exp - now, nx= True)
+            pipe.lpush(BLACKLIST_RECENT_KEY, *key_hashes)
+            pipe.ltrim(BLACKLIST_RECENT_KEY, 0, BLACKLIST_RECENT_MAX - 1)
+            pipe.incrby(BLACKLIST_GENERATION_KEY, len(key_hashes))
+            return await pipe.execute()
+
+    async def _pg_revoke(self, db: db_dependency, tokens: Dict[str, int]) -> bool:
+        try:
+            stmt = (insert(Blacklists)
+                    .values([{"token": token, "expires_at": datetime.fromtimestamp(exp, tz= timezone.utc)} for token, exp in tokens.items()])
+                    .on_conflict_do_nothing()
+                    .returning(Blacklists.token))
+            result_obj = await db.execute(stmt)
+            inserted = result_obj.scalars().all()
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Db Error: {e.__class__.__name__}: {e}")
+            raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
+        logger.info("tokens revoked in postgres")
+        return len(inserted) == len(tokens)
+
+    async def _mark_pg_pending(self) -> None:
+        self._pg_pending = True
+        try:
+            await redis_client.incr(BLACKLIST_PG_PENDING_KEY)
+        except RedisError as e:
+            #redis is likely still down, this worker's flag covers it until the restore runs
+            logger.error(f"Redis Error: {e.__class__.__name__}: {e}")
+
+    async def restore_pg_revocations(self, batch_size: int = BLACKLIST_PURGE_BATCH_SIZE) -> None:
+        """Copy revocations written to Postgres during a Redis outage back to Redis."""
+        if self.backend != "redis" or not self.pg_fallback:
+            return
+        try:
+            marker = await redis_client.get(BLACKLIST_PG_PENDING_KEY)
+            if marker is None and not self._pg_pending:
+                return
+            logger.info("restore postgres revocations to redis")
+            #cleared first, a fallback write during the copy sets it again
+            self._pg_pending = False
+            async with Session() as db:
+                result_obj = await db.execute(select(Blacklists.token, Blacklists.expires_at).where(Blacklists.expires_at > datetime.now(tz= timezone.utc)))
+                rows = result_obj.all()
+            now = int(datetime.now(tz= timezone.utc).timestamp())
+            tokens = {token: int(expires_at.timestamp()) for token, expires_at in rows if int(expires_at.timestamp()) - now > 0}
+            items = list(tokens.items())
+            for start in range(0, len(items), batch_size):
+                await self._redis_revoke(dict(items[start:start + batch_size]), now)
+            #fallback writes bump the marker before their transaction commits, so it is only cleared
+            #once it has not moved for a whole interval and everything it counts has been copied
+            if marker is not None and marker == self._restored_marker:
+                await self._clear_pending_script(keys= [BLACKLIST_PG_PENDING_KEY], args= [marker])
+            self._restored_marker = marker
+        except Exception as e:
+            #lookups keep checking postgres, the next run tries again
+            self._pg_pending = True
+            logger.error(f"Restore Error: {e.__class__.__name__}: {e}")
+            return
+        logger.info(f"restored {len(tokens)} postgres revocations to redis")
+
+    async def purge_expired(self, batch_size: int = BLACKLIST_PURGE_BATCH_SIZE) -> int:
+        """Delete blacklist rows whose token has expired, one short transaction per batch."""
+        logger.info("purge expired blacklist rows")
+        total = 0
+        while True:
+            now = datetime.now(tz= timezone.utc)
+            #skip locked so concurrent purges on other workers never wait on each other
+            batch = (select(Blacklists.token)
+                     .where(Blacklists.expires_at < now)
+                     .limit(batch_size)
+                     .with_for_update(skip_locked= True)
+                     .scalar_subquery())
+            async with Session() as db:
+                result_obj = await db.execute(delete(Blacklists).where(Blacklists.token.in_(batch)))
+                await db.commit()
+            total += result_obj.rowcount
+            if result_obj.rowcount < batch_size:
+                break
+            #let request handlers in between batches
+            await asyncio.sleep(0)
+        logger.info(f"purged {total} expired blacklist rows")
+        return total
+
+    async def rebuild_filter(self) -> None:
+        """Build a fresh filter from the authoritative store and swap it in."""
+        if not self.filter_enabled:
+            return
+        async with self._rebuild_lock:
+            logger.info("rebuild blacklist filter")
+            self._rebuild_pending = []
+            try:
+                #read the generation first, anything revoked after it is picked up by the next sync
+                generation, key_hashes = await self._redis_scan()
+                if self.pg_fallback:
+                    async with Session() as db:
+                        result_obj = await db.execute(select(Blacklists.token).where(Blacklists.expires_at > datetime.now(tz= timezone.utc)))
+                        key_hashes.extend(hash_token(token) for token in result_obj.scalars())
+            except Exception as e:
+                #without a trustworthy filter every lookup goes to the store
+                self._rebuild_pending = None
+                self._filter = None
+                logger.error(f"Filter Error: {e.__class__.__name__}: {e}")
+                return
+
+            new_filter = BloomFilter(capacity= max(BLACKLIST_FILTER_CAPACITY, 2 * len(key_hashes)), error_rate= BLACKLIST_FILTER_ERROR_RATE)
+            new_filter.update(key_hashes)
+            #revocations on this worker that landed after the store was read, no await until the swap
+            new_filter.update(self._rebuild_pending)
+            self._rebuild_pending = None
+            self._filter = new_filter
+            self._generation = generation
+            logger.info(f"blacklist filter rebuilt with {len(key_hashes)} tokens")
+
+    async def sync_filter(self) -> None:
+        """Add revocations made by other workers since the last sync or rebuild."""
+        if not self.filter_enabled:
+            return
+        try:
+            generation, recent = await self._redis_recent()
+        except RedisError as e:
+            self._filter = None
+            logger.error(f"Redis Error: {e.__class__.__name__}: {e}")
+            return
+
+        missed = generation - self._generation
+        if self._filter is None or missed < 0 or missed > len(recent):
+            #too far behind (or redis was reset), the recent list no longer covers the gap
+            await self.rebuild_filter()
+            return
+        if missed:
+            self._filter.update(recent[:missed])
+            self._generation = generation
+
+    def filter_stats(self) -> dict:
+        return {
+            "enabled": self.filter_enabled,
+            "active": self._filter is not None,
+            "entries": self._filter.count if self._filter is not None else 0,
+            "capacity": self._filter.capacity if self._filter is not None else 0,
+            "error_rate": BLACKLIST_FILTER_ERROR_RATE,
+            "generation": self._generation
+        }
+
+    async def _redis_scan(self) -> tuple:
+        generation = int(await redis_client.get(BLACKLIST_GENERATION_KEY) or 0)
+        key_hashes = [key.decode()[len(BLACKLIST_KEY_PREFIX):] async for key in redis_client.scan_iter(match= BLACKLIST_KEY_PREFIX + "*", count= 1000)]
+        return generation, key_hashes
+
+    async def _redis_recent(self) -> tuple:
+        async with redis_pipeline(transaction= True) as pipe:
+            pipe.get(BLACKLIST_GENERATION_KEY)
+            pipe.lrange(BLACKLIST_RECENT_KEY, 0, BLACKLIST_RECENT_MAX - 1)
+            generation, recent = await pipe.execute()
+        return int(generation or 0), [key_hash.decode() for key_hash in recent]
+
+token_blacklist = TokenBlacklist()
@@ -0,0 +1,39 @@
+import math
+from typing import Iterable
+
+
+class BloomFilter():
+    """Fixed-size Bloom filter over hex sha256 digests.
+
+    Sized from the expected number of entries and the target false-positive rate. A miss means
+    the key was never added; a hit only means it might have been.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key_hash: str):
+        #the key is already a uniform digest, so two slices of it drive double hashing
+        digest = bytes.fromhex(key_hash)
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key_hash: str) -> None:
+        for position in self._positions(key_hash):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def update(self, key_hashes: Iterable[str]) -> None:
+        for key_hash in key_hashes:
+            self.add(key_hash)
+
+    def __contains__(self, key_hash: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key_hash))
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+from enum import Enum
+from decimal import Decimal
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable
+from redis.exceptions import RedisError
+from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.config import Session, redis_client, redis_pipeline
+from utils.logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("cache")
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_LOCK_MS = int(os.getenv("CACHE_LOCK_MS", "5000"))
+CACHE_LOCK_WAIT_SECONDS = float(os.getenv("CACHE_LOCK_WAIT_SECONDS", "2"))
+CACHE_POLL_SECONDS = 0.025
+CACHE_KEY_PREFIX = "cache:"
+CACHE_LOCK_PREFIX = "cache-lock:"
+CACHE_TAG_PREFIX = "cache-tag:"
+
+#deletes the lock only while it still holds our token, it may have expired and been taken by another worker
+#KEYS[1] lock key, ARGV[1] token
+_UNLOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (Decimal, uuid.UUID)):
+        #strings keep decimals exact, the response models parse them back
+        return str(value)
+    raise TypeError(f"{value.__class__.__name__} is not cacheable")
+
+
+class ResponseCache():
+    """Read-through cache of serialized response bodies in Redis.
+
+    `get_or_load` returns the cached body or runs the loader and stores its result. Entries
+    can be dropped by key or by tag: every key is added to a set per tag, and invalidating a
+    tag deletes all keys in it. On a miss only one loader runs per key: callers in the same
+    process share one task, and across processes a short Redis lock lets a single worker
+    load while the others wait for its result (and load themselves if it takes too long).
+    Redis errors never fail a request, the loader just runs uncached.
+
+    Loaders get the session to read from. Results that will be stored are loaded on their own
+    primary session: a lagging replica could otherwise put the pre-update row back right after
+    an invalidation, and the shared load must not depend on the session of the request that
+    happened to start it. Uncached loads use the caller's session.
+    """
+
+    def __init__(self, enabled: bool = CACHE_ENABLED) -> None:
+        self.enabled = enabled
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._unlock_script = redis_client.register_script(_UNLOCK_SCRIPT)
+
+    async def get_or_load(self, db: AsyncSession, key: str, loader: Callable[[AsyncSession], Awaitable[Any]], ttl: int, tags: Iterable[str] = ()) -> Any:
+        if not self.enabled or ttl <= 0:
+            return await loader(db)
+        try:
+            cached = await redis_client.get(CACHE_KEY_PREFIX + key)
+        except RedisError as e:
+            logger.error(f"Redis Error: {e.__class__.__name__}: {e}")
+            return await loader(db)
+        if cached is not None:
+            return json.loads(cached)
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader, ttl, list(tags)))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        #shield so one caller going away does not cancel the load for the others
+        return await asyncio.shield(task)
+
+    async def _load(self, key: str, loader: Callable[[AsyncSession], Awaitable[Any]], ttl: int, tags: list) -> Any:
+        lock_key = CACHE_LOCK_PREFIX + key
+        token = uuid.uuid4().hex
+        try:
+            locked = await redis_client.set(lock_key, token, nx= True, px= CACHE_LOCK_MS)
+            if not locked:
+                cached = await self._wait_for(key)
+                if cached is not None:
+                    return json.loads(cached)
+        except RedisError as e:
+            logger.error(f"Redis Error: {e.__class__.__name__}: {e}")
+            return await self._run(loader)
+
+        #the lock is released even when the loader fails (e.g. a 404), so the next caller does not wait it out
+        try:
+            value = await self._run(loader)
+            try:
+                body = json.dumps(value, default= _encode)
+                async with redis_pipeline(transaction= True) as pipe:
+                    pipe.set(CACHE_KEY_PREFIX + key, body, ex= ttl)
+                    for tag in tags:
+                        pipe.sadd(CACHE_TAG_PREFIX + tag, key)
+                        pipe.expire(CACHE_TAG_PREFIX + tag, ttl)
+                    await pipe.execute()
+            except (RedisError, TypeError) as e:
+                logger.error(f"Cache Error: {e.__class__.__name__}: {e}")
+            return value
+        finally:
+            if locked:
+                await self._unlock(lock_key, token)
+
+    async def _unlock(self, lock_key: str, token: str) -> None:
+        try:
+            await self._unlock_script(keys= [lock_key], args= [token])
+        except RedisError as e:
+            #the lock then runs out after CACHE_LOCK_MS
+            logger.error(f"Redis Error: {e.__class__.__name__}: {e}")
+
+    async def _run(self, loader: Callable[[AsyncSession], Awaitable[Any]]) -> Any:
+        async with Session() as db:
+            return await loader(db)
+
+    async def _wait_for(self, key: str):
+        #another worker holds the lock and is loading this key
+        deadline = time.monotonic() + CACHE_LOCK_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            await asyncio.sleep(CACHE_POLL_SECONDS)
+            cached = await redis_client.get(CACHE_KEY_PREFIX + key)
+            if cached is not None:
+                return cached
+        return None
+
+    async def invalidate(self, keys: Iterable[str] = (), tags: Iterable[str] = ()) -> None:
+        keys = [CACHE_KEY_PREFIX + key for key in keys]
+        tag_keys = [CACHE_TAG_PREFIX + tag for tag in tags]
+        try:
+            for tag_key in tag_keys:
+                keys.extend(CACHE_KEY_PREFIX + member.decode() for member in await redis_client.smembers(tag_key))
+            if keys or tag_keys:
+                await redis_client.delete(*keys, *tag_keys)
+        except RedisError as e:
+            #entries then live until their ttl
+            logger.error(f"Redis Error: {e.__class__.__name__}: {e}")
+
+response_cache = ResponseCache()
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import base64
+import asyncio
+import hashlib
+from typing import Optional
+from fastapi import HTTPException, Request, status
+from fastapi.responses import JSONResponse, Response
+from fastapi.security.utils import get_authorization_scheme_param
+from redis.exceptions import RedisError
+from dotenv import load_dotenv
+from database.config import redis_client
+from utils.manager import jwt_manager
+from utils.logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("idempotency")
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "30"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+IDEMPOTENCY_POLL_SECONDS = float(os.getenv("IDEMPOTENCY_POLL_SECONDS", "0.05"))
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_KEY_PREFIX = "idempotency:"
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+#POST endpoints that honour the Idempotency-Key header
+IDEMPOTENT_PATHS = {"/auth/register", "/bookings", "/bookings/bulk", "/reviews"}
+#of those, the ones that take no token. their keys are scoped by the request body instead of a user
+ANONYMOUS_PATHS = {"/auth/register"}
+ANONYMOUS_CALLER = "anonymous"
+#stored responses keep their content type, everything else is recomputed on replay
+STORED_HEADERS = ("content-type",)
+
+
+class IdempotencyStore():
+    """Remembers the first response to a POST sent with an Idempotency-Key.
+
+    The first request claims the key in Redis with SET NX and runs as usual. A successful
+    response is stored for IDEMPOTENCY_TTL_SECONDS and replayed to later requests with the
+    same key, caller and path without running the endpoint again. Error responses release
+    the key so a retry runs again. The caller is the user id from the token's verified claims
+    (signature and expiry only, from the token cache when possible), so a retry sent with a
+    refreshed access token still replays; revocation is left to the endpoint, which a replay
+    never reaches. Anonymous endpoints scope the key by the body, so clients that happen to
+    pick the same key do not collide. Duplicates that arrive while the first request is still
+    running wait for its response. A key reused with a different body is rejected. If Redis
+    is unreachable requests run without the guarantee.
+    """
+
+    def __init__(self, ttl: int = IDEMPOTENCY_TTL_SECONDS, lock_ttl: int = IDEMPOTENCY_LOCK_SECONDS) -> None:
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+
+    async def _caller(self, request: Request, fingerprint: str) -> Optional[str]:
+        #None when the token does not check out, the endpoint itself then rejects the request
+        if request.url.path in ANONYMOUS_PATHS:
+            return f"{ANONYMOUS_CALLER}:{fingerprint}"
+        scheme, token = get_authorization_scheme_param(request.headers.get("authorization"))
+        if scheme.lower() != "bearer" or not token:
+            return None
+        try:
+            claims = await jwt_manager.decode_token(token)
+        except HTTPException:
+            return None
+        if claims.get("type") != "access" or not claims.get("sub"):
+            return None
+        return claims["sub"]
+
+    def _redis_key(self, request: Request, caller: str, key: str) -> str:
+        return f"{IDEMPOTENCY_KEY_PREFIX}{caller}:{request.url.path}:{key}"
+
+    async def _claim(self, redis_key: str, fingerprint: str) -> bool:
+        record = json.dumps({"state": "in_progress", "fingerprint": fingerprint})
+        return bool(await redis_client.set(redis_key, record, nx= True, ex= self.lock_ttl))
+
+    async def _load(self, redis_key: str) -> Optional[dict]:
+        record = await redis_client.get(redis_key)
+        return json.loads(record) if record is not None else None
+
+    async def _store(self, redis_key: str, fingerprint: str, response: Response, body: bytes) -> None:
+        record = {
+            "state": "done",
+            "fingerprint": fingerprint,
+            "status_code": response.status_code,
+            "headers": {name: value for name, value in response.headers.items() if name in STORED_HEADERS},
+            "body": base64.b64encode(body).decode()
+        }
+        await redis_client.set(redis_key, json.dumps(record), ex= self.ttl)
+
+    def _replay(self, record: dict) -> Response:
+        headers = {**record["headers"], "Idempotent-Replayed": "true"}
+        return Response(content= base64.b64decode(record["body"]), status_code= record["status_code"], headers= headers)
+
+    async def _wait_for(self, redis_key: str, fingerprint: str) -> Response:
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            record = await self._load(redis_key)
+            if record is None:
+                #the first request failed and released the key, let the client retry
+                return JSONResponse(status_code= status.HTTP_409_CONFLICT, content= {"detail": "previous request with this Idempotency-Key failed, retry"})
+            if record["fingerprint"] != fingerprint:
+                return JSONResponse(status_code= status.HTTP_422_UNPROCESSABLE_ENTITY, content= {"detail": "Idempotency-Key was already used with a different request"})
+            if record["state"] == "done":
+                logger.info("idempotent response replayed")
+                return self._replay(record)
+            if time.monotonic() >= deadline:
+                return JSONResponse(status_code= status.HTTP_409_CONFLICT, content= {"detail": "a request with this Idempotency-Key is still in progress"})
+            await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+
+    async def middleware(self, request: Request, call_next):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None or request.method != "POST" or request.url.path not in IDEMPOTENT_PATHS:
+            return await call_next(request)
+        if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return JSONResponse(status_code= status.HTTP_400_BAD_REQUEST, content= {"detail": f"{IDEMPOTENCY_HEADER} must be 1 to {IDEMPOTENCY_KEY_MAX_LENGTH} characters"})
+
+        fingerprint = hashlib.sha256(await request.body()).hexdigest()
+        caller = await self._caller(request, fingerprint)
+        if caller is None:
+            return await call_next(request)
+        redis_key = self._redis_key(request, caller, key)
+        try:
+            claimed = await self._claim(redis_key, fingerprint)
+            if not claimed:
+                return await self._wait_for(redis_key, fingerprint)
+        except RedisError as e:
+            logger.error(f"Redis Error: {e.__class__.__name__}: {e}")
+            return await call_next(request)
+
+        try:
+            response = await call_next(request)
+            body = b"".join([chunk async for chunk in response.body_iterator])
+        except BaseException:
+            await self._release(redis_key)
+            raise
+        if response.status_code >= 400:
+            #errors are not final (a 401 before signing in again, a 409 slot that frees up), a retry runs the request again
+            await self._release(redis_key)
+        else:
+            try:
+                await self._store(redis_key, fingerprint, response, body)
+            except RedisError as e:
+                logger.error(f"Redis Error: {e.__class__.__name__}: {e}")
+        #raw headers keep repeated ones such as set-cookie
+        to_return = Response(content= body, status_code= response.status_code)
+        to_return.raw_headers = response.headers.raw
+        return to_return
+
+    async def _release(self, redis_key: str) -> None:
+        try:
+            await redis_client.delete(redis_key)
+        except RedisError as e:
+            logger.error(f"Redis Error: {e.__class__.__name__}: {e}")
+
+idempotency_store = IdempotencyStore()
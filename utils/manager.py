@@ -1,31 +1,39 @@
 import os
+from dataclasses import dataclass
 from datetime import datetime, timezone, timedelta
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, Request, status, Depends
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy import select
-from passlib.context import CryptContext
 from dotenv import load_dotenv
 from jose import jwt, JWTError, ExpiredSignatureError
 from jose.exceptions import JWTClaimsError, JWTError
-from typing import Annotated, Optional, Union
-from database.config import db_dependency
-from database.models import Blacklists
+from typing import Annotated, Union
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.config import Session, ReadSession, db_dependency, has_recent_write
 from shared import RoleEnum
+from utils.blacklist import token_blacklist
+from utils.token_cache import token_cache
 from utils.logger import get_logger
 
 load_dotenv()
 
 logger = get_logger("security")
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated= "auto")
 oauth2_scheme = OAuth2PasswordBearer("/auth/login")
-token_dependency = Annotated[str, Depends(oauth2_scheme)]
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 REFRESH_TOKEN_EXPIRE_MINUTES = int(os.getenv("REFRESH_TOKEN_EXPIRE_MINUTES"))
 
+@dataclass(frozen= True)
+class AuthContext():
+    """Claims of a validated access token, built once per request."""
+    token: str
+    sub: str
+    role: str
+    type: str
+    exp: int
+
 class JwtManager():
 
     def __init__(self) -> None:
@@ -52,6 +60,10 @@ class JwtManager():
     
     async def decode_token(self, token: str)-> Union[str, dict]:
         logger.info("decode token")
+        cached = token_cache.get(token)
+        if cached is not None:
+            logger.info("token decoded from cache")
+            return dict(cached)
         try:
              data = jwt.decode(token, key= SECRET_KEY, algorithms= [ALGORITHM])
         except JWTClaimsError as e:
@@ -65,9 +77,20 @@ class JwtManager():
         except JWTError as e:
             logger.error(f"jwt Error: {e.__class__.__name__}: {e}")
             raise HTTPException(status_code= status.HTTP_401_UNAUTHORIZED, detail="invalid token")
+        token_cache.set(token, data)
         logger.info("token decoded")
-        return data
+        return dict(data)
     
+    async def get_token_exp(self, token: str) -> int:
+        #signature is still verified, only the expiry check is skipped so revoked tokens can be stored until they expire
+        logger.info("get token expiry")
+        try:
+            data = jwt.decode(token, key= SECRET_KEY, algorithms= [ALGORITHM], options= {"verify_exp": False})
+        except JWTError as e:
+            logger.error(f"jwt Error: {e.__class__.__name__}: {e}")
+            raise HTTPException(status_code= status.HTTP_401_UNAUTHORIZED, detail="invalid token")
+        return int(data.get("exp", 0))
+
     async def create_refresh_token(self, user_details: dict) -> str: #sub and role as key value pairs in the dict
         logger.info("create refresh token")
         iat= datetime.now(tz=timezone.utc)
@@ -86,53 +109,29 @@ class JwtManager():
         logger.info("refresh token created")
         return token
 
-    async def validate_token(self, db: db_dependency, token: str) -> str:
+    async def authenticate(self, db: db_dependency, token: str) -> AuthContext:
         logger.info("validate token")
-        #check if user token is already blacklisted, hence logged out
-        try:
-            stmt = select(Blacklists.token).where(Blacklists.token == token)
-            result_obj = await db.execute(stmt)
-            user = result_obj.scalar_one_or_none()
-        except Exception as e:
-            logger.error(f"Db Error: {e.__class__.__name__}: {e}")
-            raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
-
-        if user:
-            logger.error("session expired, user previously logged out")
-            raise HTTPException(status_code= status.HTTP_401_UNAUTHORIZED, detail="session expired, sign in again")
-
-        try:
-            decoded = jwt.decode(token, key= SECRET_KEY, algorithms= [ALGORITHM])
-        except JWTClaimsError as e:
-            logger.error("invalid claims in token")
-            raise HTTPException(status_code= status.HTTP_401_UNAUTHORIZED, detail="invalid claims in token")
-        
-        except ExpiredSignatureError as e:
-            logger.error("token expired")
-            raise HTTPException(status_code= status.HTTP_401_UNAUTHORIZED, detail="token expired")
-        
-        except JWTError as e:
-            logger.error(f"jwt Error: {e.__class__.__name__}: {e}")
-            raise HTTPException(status_code= status.HTTP_401_UNAUTHORIZED, detail="invalid token")
+        #decode once, everything a request needs from the token is carried in the returned context
+        decoded = await self.decode_token(token)
         token_type = decoded.get("type")
         if token_type != "access":
             logger.error("invalid token type")
             raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, detail="invalid token type")
+        #check if user token is already blacklisted, hence logged out
+        if await token_blacklist.is_revoked(db, token):
+            logger.error("session expired, user previously logged out")
+            raise HTTPException(status_code= status.HTTP_401_UNAUTHORIZED, detail="session expired, sign in again")
         logger.info("token validated")
-        return token
-    
+        return AuthContext(token= token,
+                           sub= decoded.get("sub"),
+                           role= decoded.get("role"),
+                           type= token_type,
+                           exp= int(decoded.get("exp")))
+
     async def validate_refresh_token(self, db: db_dependency, token: str) -> str:
         logger.info("validate refresh token")
         #check if user token is already blacklisted, hence logged out
-        try:
-            stmt = select(Blacklists.token).where(Blacklists.token == token)
-            result_obj = await db.execute(stmt)
-            user = result_obj.scalar_one_or_none()
-        except Exception as e:
-            logger.error(f"Db Error: {e.__class__.__name__}: {e}")
-            raise HTTPException(status_code= status.HTTP_500_INTERNAL_SERVER_ERROR, detail="500 internal server error")
-
-        if user:
+        if await token_blacklist.is_revoked(db, token):
             logger.error("session expired, user previously logged out")
             raise HTTPException(status_code= status.HTTP_401_UNAUTHORIZED, detail="session expired, sign in again")
 
@@ -167,41 +166,40 @@ class JwtManager():
         logger.info("new access token generated")
         return token
     
-    async def check_role(self, db: db_dependency, token: str)-> Optional[str]:
-        logger.info("check user role")
+jwt_manager = JwtManager()
 
-        token = await self.validate_token(db, token)
-        
-        data = jwt.decode(token, key= SECRET_KEY, algorithms= [ALGORITHM])
-        user_role = data.get("role")
+async def get_auth_context(request: Request, db: db_dependency, token: Annotated[str, Depends(oauth2_scheme)]) -> AuthContext:
+    #fastapi caches dependencies per request, so the token is decoded and checked once no matter how many dependants
+    auth = await jwt_manager.authenticate(db, token)
+    #kept on the request so middleware can tell who made a write
+    request.state.auth = auth
+    return auth
 
-        match user_role:
-            case RoleEnum.USER.value:
-                logger.info("user role returned")
-                return RoleEnum.USER.value
-            case RoleEnum.ADMIN.value:
-                logger.info("user role returned")
-                return RoleEnum.ADMIN.value
+auth_dependency = Annotated[AuthContext, Depends(get_auth_context)]
 
-jwt_manager = JwtManager()
+async def get_read_db(auth: auth_dependency):
+    #read-only routes use the replica, unless this user wrote something moments ago
+    session_factory = Session if await has_recent_write(auth.sub) else ReadSession
+    async with session_factory() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
 
-async def check_if_user(db: db_dependency, token: token_dependency)-> bool:
+db_read_dependency = Annotated[AsyncSession, Depends(get_read_db)]
+
+async def check_if_user(auth: auth_dependency)-> bool:
     logger.info("check if user")
-    assigned_role = await jwt_manager.check_role(db, token)
-    if assigned_role != RoleEnum.USER.value:
+    if auth.role != RoleEnum.USER.value:
         logger.error("user not authorized")
         raise HTTPException(status_code= status.HTTP_403_FORBIDDEN, detail="you are not allowed to access this service")
     logger.info("user authorized")
     return True
 
-async def check_if_admin(db: db_dependency, token: token_dependency)-> bool:
+async def check_if_admin(auth: auth_dependency)-> bool:
     logger.info("check if admin")
-    assigned_role = await jwt_manager.check_role(db, token)
-    if assigned_role != RoleEnum.ADMIN.value:
+    if auth.role != RoleEnum.ADMIN.value:
         logger.error("user not authorized")
         raise HTTPException(status_code= status.HTTP_403_FORBIDDEN, detail="you are not allowed to access this service")
     logger.info("user authorized")
     return True
-
-if_user_dependency = Annotated[bool, Depends(check_if_user)]
-if_admin_dependency = Annotated[bool, Depends(check_if_admin)]
\ No newline at end of file
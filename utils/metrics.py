@@ -0,0 +1,34 @@
+from collections import deque
+
+
+class WaitMetrics():
+    """Counts and wait-time percentiles of something that has to wait, kept per worker process.
+
+    `label` names the counter in `stats()` ("checkouts" for the db pool, "acquisitions" for
+    booking locks). Percentiles come from the last `window` waits.
+    """
+
+    def __init__(self, label: str, window: int = 1000) -> None:
+        self.label = label
+        self.count = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._recent = deque(maxlen= window)
+
+    def record(self, wait: float) -> None:
+        self.count += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self._recent.append(wait)
+
+    def stats(self) -> dict:
+        recent = sorted(self._recent)
+        return {
+            self.label: self.count,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait / self.count * 1000, 3) if self.count else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "p50_wait_ms": round(recent[len(recent) // 2] * 1000, 3) if recent else 0.0,
+            "p95_wait_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000, 3) if recent else 0.0
+        }
@@ -0,0 +1,23 @@
+import json
+import base64
+import binascii
+from typing import Any, Callable, List, Sequence
+from datetime import datetime
+from fastapi import HTTPException, status
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Opaque cursor for the sort key of the last row on a page."""
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else str(value) for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, parsers: Sequence[Callable[[str], Any]]) -> List[Any]:
+    """Turn a cursor from `encode_cursor` back into typed sort key values, 400 if it was tampered with."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(parsers):
+            raise ValueError("cursor has the wrong shape")
+        return [parser(value) for parser, value in zip(parsers, values)]
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise HTTPException(status_code= status.HTTP_400_BAD_REQUEST, detail="invalid cursor")
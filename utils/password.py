@@ -0,0 +1,74 @@
+import os
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Optional
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from dotenv import load_dotenv
+from utils.logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("password")
+
+PASSWORD_EXECUTOR = os.getenv("PASSWORD_EXECUTOR", "thread")   #thread or process
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "4"))
+PASSWORD_MAX_QUEUE = int(os.getenv("PASSWORD_MAX_QUEUE", "32"))
+
+pwd_context = CryptContext(schemes=["argon2"], deprecated= "auto")
+
+
+#module level so they can be pickled into a process pool
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _verify(password: str, password_hash: str) -> bool:
+    return pwd_context.verify(password, password_hash)
+
+
+class PasswordManager():
+    """Runs argon2 hashing and verification off the event loop.
+
+    Work is handed to a bounded thread or process pool. Once `workers + max_queue` jobs are
+    in flight, new requests are turned away with a 503 instead of queueing behind a login storm.
+    """
+
+    def __init__(self, executor_type: str = PASSWORD_EXECUTOR, workers: int = PASSWORD_WORKERS, max_queue: int = PASSWORD_MAX_QUEUE) -> None:
+        self.executor_type = executor_type
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_type == "process":
+                self._executor = ProcessPoolExecutor(max_workers= self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers= self.workers, thread_name_prefix= "password")
+        return self._executor
+
+    async def _run(self, fn: Callable, *args):
+        #no await between the check and the increment, so this is safe on a single event loop
+        if self._in_flight >= self.workers + self.max_queue:
+            logger.error("password queue full")
+            raise HTTPException(status_code= status.HTTP_503_SERVICE_UNAVAILABLE, detail="server busy, try again shortly", headers= {"Retry-After": "1"})
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self._run(_verify, password, password_hash)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait= False, cancel_futures= True)
+            self._executor = None
+
+password_manager = PasswordManager()
@@ -0,0 +1,27 @@
+import asyncio
+from typing import Awaitable, Callable, List
+from utils.logger import get_logger
+
+logger = get_logger("tasks")
+
+
+async def _run_periodically(name: str, interval: float, job: Callable[[], Awaitable]) -> None:
+    while True:
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            #a failed run must not kill the loop, the next tick retries
+            logger.error(f"{name} Error: {e.__class__.__name__}: {e}")
+        await asyncio.sleep(interval)
+
+def start_periodic(name: str, interval: float, job: Callable[[], Awaitable]) -> asyncio.Task:
+    logger.info(f"starting periodic task: {name} every {interval}s")
+    return asyncio.create_task(_run_periodically(name, interval, job), name= name)
+
+async def stop_periodic(tasks: List[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions= True)
+    logger.info("periodic tasks stopped")
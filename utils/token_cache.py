@@ -0,0 +1,75 @@
+import os
+import hashlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TOKEN_CACHE_MAXSIZE = int(os.getenv("TOKEN_CACHE_MAXSIZE", "10000"))
+
+
+def hash_token(token: str) -> str:
+    #tokens are long, so redis keys and in-memory structures are keyed by a digest instead
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenCache():
+    """In-process LRU of verified token claims, keyed by the token hash.
+
+    Entries are dropped once their `exp` has passed or when the cache grows past `maxsize`,
+    so a cached token is never accepted for longer than the token itself is valid. The cache
+    is per worker; revocation is still enforced by the blacklist on every request.
+    """
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_MAXSIZE) -> None:
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, tuple[dict, int]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        key = hash_token(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        claims, exp = entry
+        if exp <= datetime.now(tz= timezone.utc).timestamp():
+            del self._entries[key]
+            self.evictions += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def set(self, token: str, claims: dict) -> None:
+        exp = claims.get("exp")
+        if self.maxsize <= 0 or not exp:
+            return
+        key = hash_token(token)
+        self._entries[key] = (claims, int(exp))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last= False)
+            self.evictions += 1
+
+    def invalidate(self, token: str) -> None:
+        self._entries.pop(hash_token(token), None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "miss_rate": self.misses / lookups if lookups else 0.0
+        }
+
+token_cache = TokenCache()